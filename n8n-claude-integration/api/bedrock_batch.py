@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Bedrock batch inference for large offline prompt sets
+Builds JSONL input from Claude4Client's prompt templates, submits one job per model
+through a pluggable backend, polls, and streams the output back as result dicts.
+Progress is kept in a manifest so an interrupted run resumes where it stopped.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterator
+
+from context_window import BATCH_DISCOUNT
+from claude_result import ClaudeResult, loads
+
+TERMINAL_STATUSES = {'Completed', 'PartiallyCompleted', 'Failed', 'Stopped', 'Expired'}
+
+
+class LocalBatchBackend:
+    """
+    File-based stand-in for Bedrock batch jobs
+
+    Jobs are recorded in ``<workdir>/jobs.json`` and executed on the first
+    status poll by calling ``invoke_model`` record by record on the given
+    runtime (a real bedrock-runtime client or fake_bedrock.FakeBedrockRuntime).
+    Output follows Bedrock's format: one ``{recordId, modelInput, modelOutput}``
+    or ``{recordId, modelInput, error}`` line per input record.
+    """
+
+    def __init__(self, workdir: str, bedrock_runtime):
+        self.workdir = workdir
+        self.bedrock_runtime = bedrock_runtime
+        os.makedirs(workdir, exist_ok=True)
+        self._jobs_path = os.path.join(workdir, 'jobs.json')
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self._jobs_path):
+            return {}
+        with open(self._jobs_path, encoding='utf-8') as jobs_file:
+            return json.load(jobs_file)
+
+    def _save(self, jobs: Dict[str, Dict[str, Any]]):
+        tmp_path = self._jobs_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as jobs_file:
+            json.dump(jobs, jobs_file, indent=2)
+        os.replace(tmp_path, self._jobs_path)
+
+    def submit(self, job_name: str, model_id: str, input_path: str) -> str:
+        job_id = f'local-{uuid.uuid4().hex[:12]}'
+        with self._lock:
+            jobs = self._load()
+            jobs[job_id] = {
+                'job_name': job_name,
+                'model_id': model_id,
+                'input_path': os.path.abspath(input_path),
+                'output_path': os.path.join(os.path.abspath(self.workdir), f'{job_id}.jsonl.out'),
+                'status': 'Submitted',
+            }
+            self._save(jobs)
+        return job_id
+
+    def find(self, job_name: str) -> Optional[str]:
+        """Id of the job submitted under ``job_name``, or None"""
+        with self._lock:
+            jobs = self._load()
+        return next((job_id for job_id, job in jobs.items() if job['job_name'] == job_name), None)
+
+    def status(self, job_id: str) -> str:
+        with self._lock:
+            job = self._load()[job_id]
+        if job['status'] not in TERMINAL_STATUSES:
+            self._run(job_id, job)
+            with self._lock:
+                job = self._load()[job_id]
+        return job['status']
+
+    def _run(self, job_id: str, job: Dict[str, Any]):
+        tmp_path = job['output_path'] + '.partial'
+        failures = 0
+        with open(job['input_path'], encoding='utf-8') as source, \
+                open(tmp_path, 'w', encoding='utf-8') as output:
+            for line in source:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                entry = {'recordId': record['recordId'], 'modelInput': record['modelInput']}
+                try:
+                    response = self.bedrock_runtime.invoke_model(
+                        modelId=job['model_id'],
+                        body=json.dumps(record['modelInput'])
+                    )
+                    entry['modelOutput'] = json.loads(response['body'].read())
+                except Exception as e:
+                    failures += 1
+                    entry['error'] = {'errorCode': type(e).__name__, 'errorMessage': str(e)}
+                output.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, job['output_path'])
+
+        with self._lock:
+            jobs = self._load()
+            jobs[job_id]['status'] = 'PartiallyCompleted' if failures else 'Completed'
+            self._save(jobs)
+
+    def fetch_output(self, job_id: str, destination: str) -> str:
+        with self._lock:
+            job = self._load()[job_id]
+        if os.path.abspath(destination) != job['output_path']:
+            with open(job['output_path'], 'rb') as source, open(destination, 'wb') as target:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+        return destination
+
+
+class BedrockBatchBackend:
+    """
+    Real Bedrock model invocation jobs (S3 in, S3 out)
+
+    Needs an S3 bucket/prefix the service role can read and write, and the
+    ARN of that role. Bedrock requires at least 100 records per job.
+    """
+
+    def __init__(self,
+                 bucket: str,
+                 role_arn: str,
+                 prefix: str = 'claude-batch',
+                 region: str = 'us-east-1',
+                 profile: Optional[str] = None):
+        import boto3
+
+        session = boto3.session.Session(profile_name=profile, region_name=region)
+        self.bedrock = session.client('bedrock')
+        self.s3 = session.client('s3')
+        self.bucket = bucket
+        self.role_arn = role_arn
+        self.prefix = prefix.strip('/')
+
+    def submit(self, job_name: str, model_id: str, input_path: str) -> str:
+        input_key = f'{self.prefix}/input/{job_name}/{os.path.basename(input_path)}'
+        self.s3.upload_file(input_path, self.bucket, input_key)
+        response = self.bedrock.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=model_id,
+            inputDataConfig={'s3InputDataConfig': {'s3Uri': f's3://{self.bucket}/{input_key}'}},
+            outputDataConfig={'s3OutputDataConfig': {'s3Uri': f's3://{self.bucket}/{self.prefix}/output/{job_name}/'}}
+        )
+        return response['jobArn']
+
+    def find(self, job_name: str) -> Optional[str]:
+        """ARN of the job submitted under ``job_name``, or None"""
+        paginator = self.bedrock.get_paginator('list_model_invocation_jobs')
+        for page in paginator.paginate(nameContains=job_name):
+            for summary in page.get('invocationJobSummaries', []):
+                if summary['jobName'] == job_name:
+                    return summary['jobArn']
+        return None
+
+    def status(self, job_id: str) -> str:
+        return self.bedrock.get_model_invocation_job(jobIdentifier=job_id)['status']
+
+    def fetch_output(self, job_id: str, destination: str) -> str:
+        job = self.bedrock.get_model_invocation_job(jobIdentifier=job_id)
+        output_uri = job['outputDataConfig']['s3OutputDataConfig']['s3Uri']
+        input_name = os.path.basename(job['inputDataConfig']['s3InputDataConfig']['s3Uri'])
+        # Bedrock writes <output prefix>/<job id>/<input file>.out
+        output_prefix = output_uri.split(f's3://{self.bucket}/', 1)[1].rstrip('/')
+        key = f"{output_prefix}/{job_id.rsplit('/', 1)[-1]}/{input_name}.out"
+        self.s3.download_file(self.bucket, key, destination)
+        return destination
+
+
+class BatchPipeline:
+    """
+    Bulk prompts through batch inference instead of one invoke_model each
+
+    Usage:
+        pipeline = BatchPipeline(client, LocalBatchBackend('batch-work', runtime), 'nightly-run')
+        for block in blocks:
+            pipeline.add('generate_code', description=block['descripcion'], record_id=block['id'])
+        for result in pipeline.run():
+            ...
+
+    Requests are built with Claude4Client.build_request, so prompts match the
+    interactive methods exactly, and records too large for their model are
+    refused by ``add``. ``estimate`` prices the queue before anything is
+    submitted. Everything (records, job ids, statuses) lives in ``state_dir``;
+    constructing a pipeline on an existing directory resumes it and never
+    resubmits a job that already has an id. A job's name is saved before it is
+    submitted, so a run interrupted mid-submit looks the job up by name
+    (``backend.find``) instead of creating a second one.
+    """
+
+    def __init__(self, client, backend, state_dir: str, job_prefix: str = 'claude-batch'):
+        self.client = client
+        self.backend = backend
+        self.state_dir = state_dir
+        self.job_prefix = job_prefix
+        os.makedirs(state_dir, exist_ok=True)
+        self._manifest_path = os.path.join(state_dir, 'manifest.json')
+        self.manifest = self._load_manifest()
+        self._record_ids = set(self._queued_ids())
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding='utf-8') as manifest_file:
+                return json.load(manifest_file)
+        return {'created': datetime.now().isoformat(), 'records': 0, 'sealed': False, 'jobs': {}}
+
+    def _save_manifest(self):
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _input_path(self, model_id: str) -> str:
+        safe_name = model_id.replace(':', '_').replace('/', '_')
+        return os.path.join(self.state_dir, f'input-{safe_name}.jsonl')
+
+    def _queued_ids(self) -> Iterator[str]:
+        for model_id in self.manifest['jobs']:
+            if os.path.exists(self._input_path(model_id)):
+                with open(self._input_path(model_id), encoding='utf-8') as input_file:
+                    for line in input_file:
+                        if line.strip():
+                            yield loads(line)['recordId']
+
+    def add(self, method: str, record_id: Optional[str] = None, **kwargs) -> str:
+        """Queue one request (same arguments as the client method); returns its record id"""
+
+        if self.manifest['sealed']:
+            raise RuntimeError('Batch already submitted; start a new state_dir for more records')
+
+        model_id, body = self.client.build_request(method, **kwargs)
+        record_id = record_id or f'r{self.manifest["records"]:08d}'
+        if record_id in self._record_ids:
+            # Output lines are matched back by recordId, so a repeat would be ambiguous
+            raise ValueError(f'Duplicate record id: {record_id}')
+
+        job = self.manifest['jobs'].setdefault(model_id, {'records': 0, 'job_id': None, 'status': 'Pending'})
+        with open(self._input_path(model_id), 'a', encoding='utf-8') as input_file:
+            input_file.write(json.dumps({'recordId': record_id, 'modelInput': body}) + '\n')
+        self._record_ids.add(record_id)
+        job['records'] += 1
+        self.manifest['records'] += 1
+        self._save_manifest()
+        return record_id
+
+    def estimate(self) -> Dict[str, Any]:
+        """Tokens and cost (at the batch discount) of the queued records, before submitting"""
+
+        def records():
+            for model_id in self.manifest['jobs']:
+                with open(self._input_path(model_id), encoding='utf-8') as input_file:
+                    for line in input_file:
+                        if line.strip():
+                            yield model_id, loads(line)['modelInput']
+
+        return self.client.packer.estimate_cost(records(), discount=BATCH_DISCOUNT)
+
+    def submit(self, max_cost_usd: Optional[float] = None) -> Dict[str, str]:
+        """
+        Submit one job per model that has no job id yet; returns {model_id: job_id}
+
+        With ``max_cost_usd``, nothing is submitted if the estimate's expected
+        cost exceeds it.
+        """
+
+        if max_cost_usd is not None and not self.manifest['sealed']:
+            estimate = self.estimate()
+            if estimate['expected_cost_usd'] > max_cost_usd:
+                raise RuntimeError(f"Batch estimated at ${estimate['expected_cost_usd']:.2f} "
+                                   f"(up to ${estimate['max_cost_usd']:.2f}), over the ${max_cost_usd:.2f} limit")
+
+        self.manifest['sealed'] = True
+        for model_id, job in self.manifest['jobs'].items():
+            if job['job_id'] is not None:
+                continue
+            if job.get('job_name'):
+                # Interrupted between submitting and saving the id: adopt the job if it exists
+                job['job_id'] = self.backend.find(job['job_name'])
+            else:
+                job['job_name'] = f"{self.job_prefix}-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+                job['status'] = 'Submitting'
+                self._save_manifest()
+            if job['job_id'] is None:
+                job['job_id'] = self.backend.submit(job['job_name'], model_id, self._input_path(model_id))
+            job['status'] = 'Submitted'
+            self._save_manifest()
+        return {model_id: job['job_id'] for model_id, job in self.manifest['jobs'].items()}
+
+    def wait(self, poll_interval: float = 60.0, timeout: Optional[float] = None) -> Dict[str, str]:
+        """Poll until every job reaches a terminal status; returns {model_id: status}"""
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            for job in self.manifest['jobs'].values():
+                if job['job_id'] and job['status'] not in TERMINAL_STATUSES:
+                    job['status'] = self.backend.status(job['job_id'])
+            self._save_manifest()
+
+            statuses = {model_id: job['status'] for model_id, job in self.manifest['jobs'].items()}
+            if all(status in TERMINAL_STATUSES for status in statuses.values()):
+                return statuses
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f'Batch jobs still running: {statuses}')
+            time.sleep(poll_interval)
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        """Stream finished records as the usual result dicts, one output line at a time"""
+
+        generations = {model_id: self.client.model_info.get(key, {}).get('generation')
+                       for key, model_id in self.client.models.items()}
+
+        for model_id, job in self.manifest['jobs'].items():
+            if job['status'] not in TERMINAL_STATUSES or job['status'] in ('Failed', 'Stopped', 'Expired'):
+                continue
+
+            output_path = self._input_path(model_id) + '.out'
+            if not os.path.exists(output_path):
+                # Only a complete download gets the final name, so a resume never reads a partial file
+                self.backend.fetch_output(job['job_id'], output_path + '.tmp')
+                os.replace(output_path + '.tmp', output_path)
+
+            with open(output_path, encoding='utf-8') as output:
+                for line in output:
+                    if not line.strip():
+                        continue
+                    yield self._result(loads(line), model_id, generations.get(model_id))
+
+    def _result(self, entry: Dict[str, Any], model_id: str, generation: Optional[str]) -> Dict[str, Any]:
+        output = entry.get('modelOutput')
+        if not output or 'error' in entry:
+            error = entry.get('error') or {}
+            return ClaudeResult.failure(error.get('errorMessage', str(error)) if isinstance(error, dict) else error,
+                                        record_id=entry.get('recordId'), model_used=model_id)
+        return ClaudeResult(output['content'][0]['text'], model_id, generation, output.get('usage', {}),
+                            record_id=entry.get('recordId'))
+
+    def run(self,
+            poll_interval: float = 60.0,
+            timeout: Optional[float] = None,
+            max_cost_usd: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """submit + wait + results; safe to call again after an interruption"""
+        self.submit(max_cost_usd)
+        self.wait(poll_interval=poll_interval, timeout=timeout)
+        yield from self.results()
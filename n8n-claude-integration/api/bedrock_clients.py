@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Process-wide registry of tuned bedrock-runtime clients
+One boto3 client (and connection pool) per region/profile, shared by every Claude client
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+DEFAULT_POOL_SIZE = 10
+
+_clients: Dict[Tuple[str, Optional[str]], object] = {}
+_pool_sizes: Dict[Tuple[str, Optional[str]], int] = {}
+_sessions: Dict[Optional[str], boto3.session.Session] = {}
+_lock = threading.Lock()
+
+
+def bedrock_config(max_pool_connections: int = DEFAULT_POOL_SIZE,
+                   connect_timeout: float = 5,
+                   read_timeout: float = 300,
+                   retry_attempts: int = 1) -> Config:
+    """
+    botocore Config for bedrock-runtime
+
+    The pool matches the caller's concurrency so threads don't queue for a
+    socket, TCP keep-alive keeps idle connections warm between n8n items, and
+    read_timeout covers long generations (8000 output tokens can take minutes).
+    Every call through these clients is wrapped by bedrock_resilience's
+    ResilientInvoker, which owns retries and rate limiting, so botocore makes a
+    single attempt: its own retries would multiply the invoker's and hide
+    throttles from the AIMD limiter and hedging failover.
+    """
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={'mode': 'standard', 'max_attempts': retry_attempts},
+    )
+
+
+def _session(profile: Optional[str]) -> boto3.session.Session:
+    # Sessions are not thread-safe, so they are only touched under _lock;
+    # the clients they create are.
+    if profile not in _sessions:
+        _sessions[profile] = boto3.session.Session(profile_name=profile)
+    return _sessions[profile]
+
+
+def get_bedrock_runtime(region: str = 'us-east-1',
+                        profile: Optional[str] = None,
+                        max_pool_connections: int = DEFAULT_POOL_SIZE):
+    """
+    Shared bedrock-runtime client for (region, profile)
+
+    Credentials, endpoint data and the connection pool are resolved once per
+    process. Asking for a bigger pool than the cached client has rebuilds it
+    with the larger size; smaller requests reuse the existing client.
+    """
+
+    key = (region, profile)
+    with _lock:
+        client = _clients.get(key)
+        if client is None or _pool_sizes[key] < max_pool_connections:
+            client = _session(profile).client(
+                'bedrock-runtime',
+                region_name=region,
+                config=bedrock_config(max_pool_connections=max_pool_connections)
+            )
+            _clients[key] = client
+            _pool_sizes[key] = max_pool_connections
+        return client
+
+
+def reset_clients():
+    """Drop every cached client (e.g. after rotating credentials)"""
+    with _lock:
+        _clients.clear()
+        _pool_sizes.clear()
+        _sessions.clear()
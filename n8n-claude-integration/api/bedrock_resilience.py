@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Retry, backoff and adaptive rate limiting for Bedrock calls
+Keeps throughput close to the account quota instead of failing on ThrottlingException
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Tuple, TypeVar
+
+try:
+    from botocore.exceptions import (
+        ConnectionError as BotoConnectionError,
+        ConnectTimeoutError,
+        ReadTimeoutError,
+        EndpointConnectionError,
+    )
+    NETWORK_ERRORS: Tuple[type, ...] = (BotoConnectionError, ConnectTimeoutError,
+                                        ReadTimeoutError, EndpointConnectionError)
+except ImportError:
+    NETWORK_ERRORS = ()
+
+T = TypeVar('T')
+
+THROTTLING_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceQuotaExceededException',
+}
+
+TRANSIENT_CODES = {
+    'ServiceUnavailableException',
+    'InternalServerException',
+    'ModelNotReadyException',
+    'ModelTimeoutException',
+    'ModelStreamErrorException',
+}
+
+
+def classify_error(error: Exception) -> str:
+    """'throttled', 'retryable' or 'fatal' for an exception raised by a Bedrock call"""
+
+    code = (getattr(error, 'response', None) or {}).get('Error', {}).get('Code')
+    if code in THROTTLING_CODES:
+        return 'throttled'
+    if code in TRANSIENT_CODES:
+        return 'retryable'
+    if isinstance(error, NETWORK_ERRORS) or isinstance(error, (ConnectionError, TimeoutError)):
+        return 'retryable'
+    return 'fatal'
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate follows observed throttling (AIMD)
+
+    It starts unlimited. The first throttle sets the rate to a fraction of the
+    send rate measured over (up to) the last ``window`` seconds; each further throttle
+    cuts it again (at most once per ``cooldown``) and each success adds
+    ``increase`` requests/second back.
+    """
+
+    def __init__(self,
+                 min_rate: float = 0.5,
+                 max_rate: Optional[float] = None,
+                 decrease: float = 0.7,
+                 increase: float = 0.2,
+                 window: float = 10.0,
+                 cooldown: float = 1.0):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.window = window
+        self.cooldown = cooldown
+        self.rate: Optional[float] = None
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+        self._sends: deque = deque()
+        self._last_cut = float('-inf')
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Wait for a send slot; returns the seconds spent waiting"""
+
+        with self._lock:
+            now = time.monotonic()
+            self._sends.append(now)
+            while self._sends and self._sends[0] < now - self.window:
+                self._sends.popleft()
+
+            if self.rate is None:
+                return 0.0
+
+            capacity = max(1.0, self.rate)
+            self._tokens = min(capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            # Reserve the token now (possibly going negative) and sleep off the debt
+            self._tokens -= 1.0
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_cut < self.cooldown:
+                # Requests already in flight when the first throttle landed
+                return
+            self._last_cut = now
+            if self._sends:
+                span = max(1.0, now - self._sends[0])
+                measured = len(self._sends) / span
+            else:
+                measured = self.min_rate
+            current = measured if self.rate is None else min(self.rate, measured)
+            self.rate = max(self.min_rate, current * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+
+    def on_success(self):
+        with self._lock:
+            if self.rate is None:
+                return
+            self.rate += self.increase
+            if self.max_rate is not None:
+                self.rate = min(self.rate, self.max_rate)
+
+
+class ResilientInvoker:
+    """
+    Runs Bedrock calls with per-model rate limiting and retries
+
+    Throttles and transient service/network errors are retried with
+    exponential backoff and full jitter; anything else (validation, access
+    denied, unknown model...) is raised immediately.
+    """
+
+    def __init__(self,
+                 max_attempts: int = 6,
+                 base_delay: float = 0.5,
+                 max_delay: float = 20.0,
+                 limiter_factory: Callable[[], AdaptiveRateLimiter] = AdaptiveRateLimiter):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter_factory = limiter_factory
+        self.limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self.counters = {
+            'calls': 0,
+            'retries': 0,
+            'throttles': 0,
+            'fatal_errors': 0,
+            'exhausted': 0,
+            'backoff_wait': 0.0,
+            'limiter_wait': 0.0,
+        }
+        self._lock = threading.Lock()
+
+    def limiter(self, model_id: str) -> AdaptiveRateLimiter:
+        with self._lock:
+            if model_id not in self.limiters:
+                self.limiters[model_id] = self.limiter_factory()
+            return self.limiters[model_id]
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential delay before retry number ``attempt`` (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, model_id: str, fn: Callable[[], T], outcome: Optional[Dict[str, int]] = None) -> Tuple[T, int]:
+        """
+        Run ``fn`` under the model's limiter; returns (result, retries used)
+
+        ``outcome``, when given, is filled with this call's ``retries`` and
+        ``throttles`` (attempts that failed with a throttling code), also when
+        the call ends up raising.
+        """
+
+        limiter = self.limiter(model_id)
+        self._count('calls')
+        outcome = outcome if outcome is not None else {}
+        outcome.update(retries=0, throttles=0)
+
+        for attempt in range(1, self.max_attempts + 1):
+            self._count('limiter_wait', limiter.acquire())
+            try:
+                result = fn()
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == 'fatal':
+                    self._count('fatal_errors')
+                    raise
+                if kind == 'throttled':
+                    self._count('throttles')
+                    outcome['throttles'] += 1
+                    limiter.on_throttle()
+                if attempt == self.max_attempts:
+                    self._count('exhausted')
+                    raise
+                delay = self.backoff(attempt)
+                self._count('retries')
+                outcome['retries'] += 1
+                self._count('backoff_wait', delay)
+                time.sleep(delay)
+            else:
+                limiter.on_success()
+                return result, attempt - 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **{k: round(v, 4) if isinstance(v, float) else v for k, v in self.counters.items()},
+                'rates': {model_id: limiter.rate for model_id, limiter in self.limiters.items()}
+            }
+
+
+_shared_invoker: Optional[ResilientInvoker] = None
+_shared_lock = threading.Lock()
+
+
+def shared_invoker() -> ResilientInvoker:
+    """Process-wide invoker, so every client sees the same per-model limits"""
+    global _shared_invoker
+    with _shared_lock:
+        if _shared_invoker is None:
+            _shared_invoker = ResilientInvoker()
+        return _shared_invoker
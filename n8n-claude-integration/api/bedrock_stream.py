@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Streaming helpers shared by the Claude clients
+Wraps Bedrock's invoke_model_with_response_stream so text arrives as it is generated
+"""
+
+import json
+import time
+import asyncio
+import contextlib
+from typing import Dict, Any, Optional, List
+
+from claude_result import ClaudeResult, loads
+
+
+class ChatStream:
+    """
+    Iterator over the text deltas of one streamed Claude response
+
+    Iterating yields text chunks as Bedrock sends them, ``usage`` fills in as
+    events arrive, and ``result()`` returns the same dict shape as ``chat``.
+    Like the non-streaming methods, errors are not raised: iteration stops and
+    ``result()`` carries an ``error`` key instead.
+    """
+
+    def __init__(self,
+                 bedrock_runtime,
+                 model_id: str,
+                 body: Dict[str, Any],
+                 fields: Dict[str, Any],
+                 error_fields: Dict[str, Any],
+                 text_key: str = 'response',
+                 invoker=None,
+                 telemetry=None,
+                 method: str = 'chat_stream',
+                 scheduler=None,
+                 hedge_slot=None):
+        self.bedrock_runtime = bedrock_runtime
+        self.model_id = model_id
+        self.body = body
+        self.fields = fields
+        self.error_fields = error_fields
+        self.text_key = text_key
+        self.invoker = invoker  # bedrock_resilience.ResilientInvoker, retries opening the stream
+        self.telemetry = telemetry  # bedrock_telemetry.Telemetry, gets one record per stream
+        self.method = method
+        # request_scheduler.RequestScheduler: one slot for the whole stream, created here so
+        # the caller's request_context applies even when another thread drains the stream
+        self._slot = scheduler.slot(method) if scheduler is not None else None
+        self.hedge_slot = hedge_slot  # slots for hedged duplicates (hedging.HedgedRuntime only)
+
+        self.usage: Dict[str, int] = {}
+        self.stop_reason: Optional[str] = None
+        self.error: Optional[str] = None
+        self.exception: Optional[BaseException] = None
+        self.timing: Dict[str, float] = {}
+        self._parts: List[str] = []
+        self._iterator = None
+        self._outcome: Dict[str, int] = {}  # retries/throttles opening the stream
+        self._start: Optional[float] = None
+        self._request_bytes = 0
+        self._finished = False
+
+    def __iter__(self):
+        if self._iterator is None:
+            self._iterator = self._deltas()
+        return self._iterator
+
+    def __enter__(self) -> 'ChatStream':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Stop the stream early: closes the HTTP body and frees the scheduler slot
+
+        A consumer that breaks out of the loop leaves the generator suspended,
+        holding both until it is garbage collected; ``close()`` (or ``with``)
+        releases them right away. ``result()`` afterwards carries an error.
+        """
+        if self._iterator is None:
+            self._iterator = iter(())
+        else:
+            self._iterator.close()
+        if not self._finished:
+            # Closed before the first delta was requested: the generator never
+            # ran, so GeneratorExit did not reach it
+            self.error = 'Stream closed before it finished'
+            self._finish()
+
+    def _deltas(self):
+        start = self._start = time.perf_counter()
+        payload = json.dumps(self.body)
+        self._request_bytes = len(payload)
+        response = None
+
+        try:
+            with self._slot or contextlib.nullcontext():
+                def open_stream():
+                    return self.bedrock_runtime.invoke_model_with_response_stream(
+                        modelId=self.model_id,
+                        body=payload,
+                        **({'hedge_slot': self.hedge_slot} if self.hedge_slot else {})
+                    )
+
+                try:
+                    if self.invoker is not None:
+                        # Only the request is retried; an error mid-stream ends the stream
+                        response, self.timing['retries'] = self.invoker.call(self.model_id, open_stream,
+                                                                             self._outcome)
+                    else:
+                        response = open_stream()
+                    self.timing.update({k: response[k] for k in ('region', 'hedged') if k in response})
+                    if response.get('model_id', self.model_id) != self.model_id:
+                        # A hedge fell back to another model: report and bill the one that answered
+                        self.timing['fallback_from'] = self.model_id
+                        self.model_id = self.fields['model_used'] = response['model_id']
+
+                    for event in response['body']:
+                        if 'time_to_first_byte' not in self.timing:
+                            self.timing['time_to_first_byte'] = round(time.perf_counter() - start, 4)
+
+                        chunk = event.get('chunk')
+                        if not chunk:
+                            continue
+
+                        data = loads(chunk['bytes'])
+                        event_type = data.get('type')
+
+                        if event_type == 'message_start':
+                            self.usage.update(data.get('message', {}).get('usage', {}))
+                        elif event_type == 'content_block_delta':
+                            text = data.get('delta', {}).get('text')
+                            if text:
+                                if 'time_to_first_token' not in self.timing:
+                                    self.timing['time_to_first_token'] = round(time.perf_counter() - start, 4)
+                                self._parts.append(text)
+                                yield text
+                        elif event_type == 'message_delta':
+                            self.usage.update(data.get('usage', {}))
+                            self.stop_reason = data.get('delta', {}).get('stop_reason')
+                finally:
+                    # Runs on exhaustion, errors and close(), before the slot is released
+                    body = response.get('body') if response is not None else None
+                    if body is not None and hasattr(body, 'close'):
+                        with contextlib.suppress(Exception):
+                            body.close()
+
+        except GeneratorExit:
+            self.error = 'Stream closed before it finished'
+        except Exception as e:
+            self.error = str(e)
+            self.exception = e
+
+        self._finish()
+
+    def _finish(self):
+        """Wall time and the telemetry record, once per stream however it ended"""
+        self._finished = True
+        self.timing['wall_time'] = round(time.perf_counter() - self._start, 4) if self._start is not None else 0.0
+
+        if self.telemetry is not None:
+            self.telemetry.record(
+                self.model_id, method=self.method, request_bytes=self._request_bytes,
+                usage=self.usage, wall_time=self.timing['wall_time'],
+                time_to_first_byte=self.timing.get('time_to_first_byte'),
+                retries=self._outcome.get('retries', 0), throttles=self._outcome.get('throttles', 0),
+                error=self.error
+            )
+
+    @property
+    def text(self) -> str:
+        """Text received so far"""
+        return ''.join(self._parts)
+
+    def result(self) -> Dict[str, Any]:
+        """Drain the stream and return the summary ClaudeResult (with ``error`` if it failed)"""
+
+        for _ in self:
+            pass
+
+        if self.error is not None:
+            return ClaudeResult.failure(self.exception or self.error, **self.error_fields, timing=dict(self.timing))
+
+        # The stream is finished, so usage and timing are handed over rather than copied
+        return ClaudeResult(self.text, usage=self.usage, timing=self.timing,
+                            stop_reason=self.stop_reason, text_key=self.text_key, **self.fields)
+
+
+class AsyncChatStream:
+    """
+    Async-iterator twin of ChatStream
+
+    The blocking event reads run on a worker thread and the deltas are handed
+    to the event loop, so ``async for`` never stalls other tasks.
+    """
+
+    def __init__(self, stream: ChatStream, executor=None):
+        self.stream = stream
+        self.executor = executor
+        self._closed = False
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        return self.stream.usage
+
+    def __aiter__(self):
+        return self._deltas()
+
+    async def _deltas(self):
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        def pump():
+            try:
+                for delta in self.stream:
+                    if self._closed:
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, delta)
+            finally:
+                # No-op when the stream finished; otherwise frees its body and slot
+                self.stream.close()
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+        reader = loop.run_in_executor(self.executor, pump)
+        try:
+            while True:
+                delta = await queue.get()
+                if delta is finished:
+                    break
+                yield delta
+        finally:
+            self._closed = True
+            await reader
+
+    async def result(self) -> Dict[str, Any]:
+        """Drain the stream and return the summary dict"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.stream.result)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Usage, latency and cost telemetry for the Claude clients
+Per-call records, rolling percentiles, numeric pricing and Prometheus/JSONL export
+"""
+
+import json
+import math
+import time
+import threading
+import contextvars
+import functools
+from collections import deque, defaultdict
+from typing import Dict, Any, Optional, List, Tuple
+
+from bedrock_resilience import THROTTLING_CODES
+
+# On-demand Bedrock prices in USD per million tokens (input, output)
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    'anthropic.claude-opus-4-1-20250805-v1:0': (15.00, 75.00),
+    'anthropic.claude-opus-4-20250514-v1:0': (15.00, 75.00),
+    'anthropic.claude-sonnet-4-20250514-v1:0': (3.00, 15.00),
+    'anthropic.claude-3-7-sonnet-20250219-v1:0': (3.00, 15.00),
+    'anthropic.claude-3-5-sonnet-20241022-v2:0': (3.00, 15.00),
+    'anthropic.claude-3-5-sonnet-20240620-v1:0': (3.00, 15.00),
+    'anthropic.claude-3-5-haiku-20241022-v1:0': (0.80, 4.00),
+    'anthropic.claude-3-opus-20240229-v1:0': (15.00, 75.00),
+    'anthropic.claude-3-sonnet-20240229-v1:0': (3.00, 15.00),
+    'anthropic.claude-3-haiku-20240307-v1:0': (0.25, 1.25),
+}
+
+# Prompt-cache token multipliers relative to the input price
+CACHE_READ_FACTOR = 0.1
+CACHE_WRITE_FACTOR = 1.25
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Name of the public client method currently running (outermost call wins)
+current_method: contextvars.ContextVar = contextvars.ContextVar('claude_method', default=None)
+
+
+def tracked(method_name: str):
+    """Decorator tagging Bedrock calls made inside a client method with its name"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current_method.get() is not None:
+                return fn(*args, **kwargs)
+            token = current_method.set(method_name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                current_method.reset(token)
+        return wrapper
+    return decorator
+
+
+def call_cost(model_id: str, usage: Dict[str, int], prices: Dict[str, Tuple[float, float]] = MODEL_PRICES) -> float:
+    """USD cost of one call from its usage dict (0.0 for unknown models)"""
+
+    input_price, output_price = prices.get(model_id, (0.0, 0.0))
+    return (
+        usage.get('input_tokens', 0) * input_price
+        + usage.get('cache_read_input_tokens', 0) * input_price * CACHE_READ_FACTOR
+        + usage.get('cache_creation_input_tokens', 0) * input_price * CACHE_WRITE_FACTOR
+        + usage.get('output_tokens', 0) * output_price
+    ) / 1_000_000
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Telemetry:
+    """
+    Collects one record per Bedrock call and aggregates them per (model, method)
+
+    Latency percentiles use the last ``window`` calls of each series; counts,
+    tokens and cost are running totals. With ``jsonl_path`` set, every record
+    is also appended to that file as it happens.
+    """
+
+    def __init__(self,
+                 window: int = 1000,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None,
+                 jsonl_path: Optional[str] = None,
+                 keep_records: int = 10000):
+        self.window = window
+        self.prices = prices or MODEL_PRICES
+        self.jsonl_path = jsonl_path
+        self.records: deque = deque(maxlen=keep_records)
+        self._latency: Dict[Tuple[str, str], deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._ttfb: Dict[Tuple[str, str], deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        # Recent upstream outcomes per model (all methods): (ts, wall_time, error, throttled, output_tokens)
+        self._health: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self,
+               model_id: str,
+               method: Optional[str] = None,
+               request_bytes: int = 0,
+               usage: Optional[Dict[str, int]] = None,
+               wall_time: Optional[float] = None,
+               time_to_first_byte: Optional[float] = None,
+               retries: int = 0,
+               throttles: int = 0,
+               cached: bool = False,
+               coalesced: bool = False,
+               error: Optional[str] = None):
+        """
+        Record one call; ``method`` defaults to the running client method
+
+        ``throttles`` counts the attempts that were throttled (see
+        ResilientInvoker.call's ``outcome``); other retries, after timeouts or
+        5xx errors, do not make a call count as throttled.
+        """
+
+        usage = usage or {}
+        method = method or current_method.get() or 'unknown'
+        cost = 0.0 if cached or coalesced else call_cost(model_id, usage, self.prices)
+        entry = {
+            'ts': time.time(),
+            'model': model_id,
+            'method': method,
+            'request_bytes': request_bytes,
+            'input_tokens': usage.get('input_tokens', 0),
+            'output_tokens': usage.get('output_tokens', 0),
+            'cache_read_tokens': usage.get('cache_read_input_tokens', 0),
+            'cache_write_tokens': usage.get('cache_creation_input_tokens', 0),
+            'wall_time': wall_time,
+            'time_to_first_byte': time_to_first_byte,
+            'retries': retries,
+            'cached': cached,
+            'coalesced': coalesced,
+            'error': error,
+            'cost_usd': round(cost, 8),
+        }
+
+        key = (model_id, method)
+        with self._lock:
+            self.records.append(entry)
+            totals = self._totals[key]
+            totals['requests'] += 1
+            totals['errors'] += 1 if error else 0
+            totals['cached'] += 1 if cached else 0
+            totals['coalesced'] += 1 if coalesced else 0
+            totals['retries'] += retries
+            totals['request_bytes'] += request_bytes
+            totals['input_tokens'] += entry['input_tokens']
+            totals['output_tokens'] += entry['output_tokens']
+            totals['cache_read_tokens'] += entry['cache_read_tokens']
+            totals['cache_write_tokens'] += entry['cache_write_tokens']
+            totals['cost_usd'] += cost
+            if wall_time is not None and not error:
+                self._latency[key].append(wall_time)
+                totals['latency_sum'] += wall_time
+                totals['latency_count'] += 1
+            if time_to_first_byte is not None:
+                self._ttfb[key].append(time_to_first_byte)
+            if not (cached or coalesced):
+                throttled = throttles > 0 or bool(error and any(code in error for code in THROTTLING_CODES))
+                self._health[model_id].append((entry['ts'], wall_time, bool(error), throttled, entry['output_tokens']))
+
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as jsonl:
+                    jsonl.write(json.dumps(entry) + '\n')
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals, latency percentiles and cost per model/method, plus cost per model"""
+
+        with self._lock:
+            series = {}
+            cost_by_model: Dict[str, float] = defaultdict(float)
+            for (model_id, method), totals in self._totals.items():
+                latency = sorted(self._latency[(model_id, method)])
+                ttfb = sorted(self._ttfb[(model_id, method)])
+                series[f'{model_id}/{method}'] = {
+                    'model': model_id,
+                    'method': method,
+                    **{k: round(v, 6) if k == 'cost_usd' else int(v)
+                       for k, v in totals.items() if not k.startswith('latency_')},
+                    'latency': {f'p{int(q * 100)}': percentile(latency, q) for q in QUANTILES},
+                    'time_to_first_byte': {f'p{int(q * 100)}': percentile(ttfb, q) for q in QUANTILES},
+                }
+                cost_by_model[model_id] += totals['cost_usd']
+
+        return {
+            'series': series,
+            'cost_by_model': {model_id: round(cost, 6) for model_id, cost in cost_by_model.items()},
+            'total_cost_usd': round(sum(cost_by_model.values()), 6),
+        }
+
+    def model_health(self, model_id: str, horizon: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Recent upstream calls of one model: p95 latency, error and throttle rates, mean output
+
+        Only calls from the last ``horizon`` seconds count when it is given, so
+        a model that stopped getting traffic after an outage is not judged on
+        stale failures forever.
+        """
+
+        since = time.time() - horizon if horizon else 0.0
+        with self._lock:
+            outcomes = [o for o in self._health.get(model_id, ()) if o[0] >= since]
+        if not outcomes:
+            return {'samples': 0, 'p95': None, 'error_rate': 0.0, 'throttle_rate': 0.0, 'mean_output_tokens': None}
+
+        latency = sorted(wall_time for _, wall_time, error, _, _ in outcomes if wall_time is not None and not error)
+        output = [tokens for _, _, error, _, tokens in outcomes if not error]
+        return {
+            'samples': len(outcomes),
+            'p95': percentile(latency, 0.95),
+            'error_rate': round(sum(1 for o in outcomes if o[2]) / len(outcomes), 4),
+            'throttle_rate': round(sum(1 for o in outcomes if o[3]) / len(outcomes), 4),
+            'mean_output_tokens': round(sum(output) / len(output)) if output else None,
+        }
+
+    def to_prometheus(self, prefix: str = 'claude') -> str:
+        """Prometheus text exposition format"""
+
+        counters = [
+            ('requests', 'requests_total', 'Bedrock calls'),
+            ('errors', 'errors_total', 'Failed Bedrock calls'),
+            ('cached', 'cache_hits_total', 'Calls served from the response cache'),
+            ('coalesced', 'coalesced_total', 'Calls that shared an identical in-flight request'),
+            ('retries', 'retries_total', 'Retries after throttling or transient errors'),
+            ('request_bytes', 'request_bytes_total', 'Request body bytes sent'),
+            ('input_tokens', 'input_tokens_total', 'Input tokens billed'),
+            ('output_tokens', 'output_tokens_total', 'Output tokens billed'),
+            ('cost_usd', 'cost_usd_total', 'Estimated on-demand cost in USD'),
+        ]
+
+        lines = []
+        with self._lock:
+            items = [(key, dict(totals)) for key, totals in self._totals.items()]
+            latencies = {key: sorted(values) for key, values in self._latency.items()}
+
+        for field, name, help_text in counters:
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            for (model_id, method), totals in items:
+                lines.append(f'{prefix}_{name}{{model="{model_id}",method="{method}"}} {totals.get(field, 0):g}')
+
+        lines.append(f'# HELP {prefix}_latency_seconds Wall time of successful calls (rolling window)')
+        lines.append(f'# TYPE {prefix}_latency_seconds summary')
+        for (model_id, method), totals in items:
+            labels = f'model="{model_id}",method="{method}"'
+            values = latencies.get((model_id, method), [])
+            for q in QUANTILES:
+                value = percentile(values, q)
+                if value is not None:
+                    lines.append(f'{prefix}_latency_seconds{{{labels},quantile="{q}"}} {value:g}')
+            lines.append(f'{prefix}_latency_seconds_sum{{{labels}}} {totals.get("latency_sum", 0):g}')
+            lines.append(f'{prefix}_latency_seconds_count{{{labels}}} {totals.get("latency_count", 0):g}')
+
+        return '\n'.join(lines) + '\n'
+
+    def export_jsonl(self, path: str) -> int:
+        """Write the retained records to ``path``; returns how many were written"""
+        with self._lock:
+            records = list(self.records)
+        with open(path, 'w', encoding='utf-8') as jsonl:
+            for entry in records:
+                jsonl.write(json.dumps(entry) + '\n')
+        return len(records)
+
+
+_shared_telemetry: Optional[Telemetry] = None
+_shared_lock = threading.Lock()
+
+
+def shared_telemetry() -> Telemetry:
+    """Process-wide Telemetry used by clients that are not given their own"""
+    global _shared_telemetry
+    with _shared_lock:
+        if _shared_telemetry is None:
+            _shared_telemetry = Telemetry()
+        return _shared_telemetry
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for Claude4Client
+Runs chat, batch, compare_models and analyze_image against fake_bedrock at several
+concurrency levels and reports throughput, latency percentiles and peak memory.
+No AWS credentials or network needed.
+
+    python benchmark-claude4.py --requests 200 --concurrency 1 4 16 --throttle-rate 0.05
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Callable
+
+from python_claude4_tools import Claude4Client, AsyncClaude4Client
+from fake_bedrock import FakeBedrockRuntime
+from bedrock_resilience import ResilientInvoker
+from bedrock_telemetry import Telemetry, percentile
+from image_cache import ImageCache
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+PROMPT = "Estimate the effort for a login screen with OAuth and password reset."
+
+
+def make_client(args, concurrency: int) -> Claude4Client:
+    """
+    Claude4Client wired to a fresh fake runtime, limiter and telemetry
+
+    Call coalescing is off and the image cache keeps nothing, so every call
+    pays its full cost and the figures are per call, not cache hits.
+    """
+    fake = FakeBedrockRuntime(
+        latency=args.latency,
+        per_token_latency=args.per_token_latency,
+        throttle_rate=args.throttle_rate,
+        output_tokens=args.output_tokens,
+        seed=args.seed
+    )
+    return Claude4Client(
+        bedrock_runtime=fake,
+        resilience=ResilientInvoker(base_delay=0.01, max_delay=0.2),
+        telemetry=Telemetry(),
+        image_cache=ImageCache(max_bytes=0),
+        coalesce=False,
+        max_pool_connections=concurrency
+    )
+
+
+def make_image(directory: str) -> str:
+    """A 2 MB stand-in image (PNG header + noise) for analyze_image runs"""
+    path = os.path.join(directory, 'benchmark.png')
+    with open(path, 'wb') as image_file:
+        image_file.write(b'\x89PNG\r\n\x1a\n' + os.urandom(2 * 1024 * 1024))
+    return path
+
+
+def run_threaded(call: Callable[[int], Dict[str, Any]], requests: int, concurrency: int) -> List[Dict[str, Any]]:
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(call, range(requests)))
+
+
+def measure(name: str, concurrency: int, run: Callable[[], List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Run one scenario and collect throughput, latency and memory figures"""
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = sorted(r['timing']['wall_time'] for r in results if 'timing' in r and not r.get('error'))
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': len(results),
+        'errors': sum(1 for r in results if r.get('error')),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else None,
+        'p50_s': percentile(latencies, 0.50),
+        'p95_s': percentile(latencies, 0.95),
+        'p99_s': percentile(latencies, 0.99),
+        'peak_traced_mb': round(peak / 1024 / 1024, 2),
+    }
+
+
+def bench_chat(args, concurrency: int) -> Dict[str, Any]:
+    client = make_client(args, concurrency)
+    return measure('chat', concurrency, lambda: run_threaded(
+        lambda i: client.chat(f"{PROMPT} #{i}", model='haiku3.5'), args.requests, concurrency))
+
+
+def bench_batch(args, concurrency: int) -> Dict[str, Any]:
+    client = make_client(args, concurrency)
+    prompts = [f"{PROMPT} #{i}" for i in range(args.requests)]
+
+    async def run():
+        async with AsyncClaude4Client(client=client, concurrency=concurrency) as async_client:
+            return await async_client.batch_chat(prompts, model='haiku3.5')
+
+    return measure('batch_chat', concurrency, lambda: asyncio.run(run()))
+
+
+def bench_compare(args, concurrency: int) -> Dict[str, Any]:
+    client = make_client(args, concurrency)
+    rounds = max(1, args.requests // 4)
+
+    def run():
+        results = []
+        for round_number in range(rounds):
+            comparison = client.compare_models(f"{PROMPT} #{round_number}", concurrent=True,
+                                               max_workers=concurrency)
+            # One latency sample per compare call: the slowest model decides it
+            results.append({'timing': {'wall_time': comparison['wall_time']},
+                            'error': next((c['error'] for c in comparison['comparisons'].values()
+                                           if c['error']), None)})
+        return results
+
+    return measure('compare_models', concurrency, run)
+
+
+def bench_analyze_image(args, concurrency: int, image_path: str) -> Dict[str, Any]:
+    client = make_client(args, concurrency)
+    return measure('analyze_image', concurrency, lambda: run_threaded(
+        lambda i: client.analyze_image(image_path, prompt=f"Describe this mockup #{i}", model='sonnet4'),
+        args.requests, concurrency))
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    columns = ['scenario', 'concurrency', 'requests', 'errors', 'throughput_rps',
+               'p50_s', 'p95_s', 'p99_s', 'peak_traced_mb']
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print('  '.join(c.ljust(widths[c]) for c in columns))
+    print('  '.join('-' * widths[c] for c in columns))
+    for row in rows:
+        print('  '.join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Offline Claude4Client benchmark against a fake Bedrock runtime')
+    parser.add_argument('--requests', type=int, default=100, help='Calls per scenario and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--scenarios', nargs='+', default=['chat', 'batch', 'compare', 'image'],
+                        choices=['chat', 'batch', 'compare', 'image'])
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds before the first byte')
+    parser.add_argument('--per-token-latency', type=float, default=0.0002)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Probability of a ThrottlingException')
+    parser.add_argument('--output-tokens', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args(argv)
+
+    print("🏁 Claude4Client offline benchmark")
+    print("=" * 60)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = make_image(tmp)
+        for concurrency in args.concurrency:
+            if 'chat' in args.scenarios:
+                rows.append(bench_chat(args, concurrency))
+            if 'batch' in args.scenarios:
+                rows.append(bench_batch(args, concurrency))
+            if 'compare' in args.scenarios:
+                rows.append(bench_compare(args, concurrency))
+            if 'image' in args.scenarios:
+                rows.append(bench_analyze_image(args, concurrency, image_path))
+
+    print_table(rows)
+    if resource is not None:
+        print(f"\n📈 Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump({'config': vars(args), 'results': rows}, output, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Vectorized budget engine for building-block catalogs
+Python port of processBudget (budget-processor.js and the n8n workflows) on NumPy arrays:
+one quote, or thousands of eficienciaIA / markup / tarifaIA scenarios in a single call.
+
+    python budget_engine.py ../../sample-building-blocks.json --config '{"markup": 45}'
+    python budget_engine.py ../../sample-building-blocks.json --sweep eficienciaIA=20:50:5 markup=30,40,50
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Sequence, Union
+
+import numpy as np
+
+# Quote tiers and the catalog hour keys they are priced from, in column order
+TIERS = ('basic', 'standard', 'enterprise')
+HOUR_KEYS = ('facil', 'intermedio', 'complejo')
+
+# Config keys (percentages, MXN/hour) and the defaults processBudget applies
+CONFIG_DEFAULTS = {
+    'eficienciaIA': 35,
+    'markup': 40,
+    'tarifaIA': 300,
+    'factorPM': 18,
+    'factorTesting': 12,
+    'factorContingencia': 20,
+}
+
+SWEEP_KEYS = tuple(CONFIG_DEFAULTS)
+
+
+def config_value(config: Optional[Dict[str, Any]], key: str) -> float:
+    """
+    ``config?.key || default`` as in processBudget
+
+    Like the JavaScript, a missing, null or zero value falls back to the
+    default, so ``eficienciaIA: 0`` prices at 35%.
+    """
+    value = (config or {}).get(key)
+    return float(value) if value else float(CONFIG_DEFAULTS[key])
+
+
+def block_hours(block: Dict[str, Any]) -> Optional[List[Any]]:
+    """
+    A block's facil / intermedio / complejo hours, or None if processBudget skips it
+
+    Mirrors ``if (block.hours)``: only a missing, null, false, 0, NaN or
+    empty ``hours`` leaves the block out; any object, even ``{}``, counts it
+    as an item, with missing keys as 0.
+    """
+    hours = block.get('hours')
+    if not isinstance(hours, (dict, list)) and (not hours or hours != hours):
+        return None
+    return [(hours.get(key) or 0) if isinstance(hours, dict) else 0 for key in HOUR_KEYS]
+
+
+class BudgetCatalog:
+    """
+    Building-block catalog as arrays (blocks x tiers)
+
+    ``hours`` holds facil/intermedio/complejo per block, ``category_index``
+    the category row of each block. Blocks without ``hours`` are left out,
+    as processBudget skips them. Categories keep catalog order and are named
+    ``category.name`` or their id.
+    """
+
+    def __init__(self,
+                 category_ids: List[str],
+                 category_names: List[str],
+                 block_ids: List[str],
+                 block_names: List[str],
+                 category_index: np.ndarray,
+                 hours: np.ndarray,
+                 metadata: Optional[Dict[str, Any]] = None):
+        self.category_ids = category_ids
+        self.category_names = category_names
+        self.block_ids = block_ids
+        self.block_names = block_names
+        self.category_index = category_index
+        self.hours = hours
+        self.metadata = metadata or {}
+        self._membership: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_dict(cls, catalog: Dict[str, Any]) -> 'BudgetCatalog':
+        """Catalog shaped like sample-building-blocks.json (``{'categories': {...}}``)"""
+
+        category_ids, category_names = [], []
+        block_ids, block_names, category_index, rows = [], [], [], []
+        for category_id, category in (catalog.get('categories') or {}).items():
+            position = len(category_ids)
+            category_ids.append(category_id)
+            category_names.append(category.get('name') or category_id)
+            for block_id, block in (category.get('building_blocks') or {}).items():
+                hours = block_hours(block)
+                if hours is None:
+                    continue
+                block_ids.append(block_id)
+                block_names.append(block.get('name') or block_id)
+                category_index.append(position)
+                rows.append(hours)
+
+        return cls(category_ids, category_names, block_ids, block_names,
+                   np.asarray(category_index, dtype=np.intp),
+                   np.asarray(rows, dtype=np.float64).reshape(-1, len(HOUR_KEYS)),
+                   catalog.get('metadata'))
+
+    @classmethod
+    def from_json(cls, path: str) -> 'BudgetCatalog':
+        with open(path, encoding='utf-8') as catalog_file:
+            return cls.from_dict(json.load(catalog_file))
+
+    @classmethod
+    def load(cls, path: str) -> 'BudgetCatalog':
+        """JSON catalog, or a compiled one (.bbcat, see catalog_store.py) mapped without parsing"""
+        if path.endswith('.bbcat'):
+            from catalog_store import CatalogStore
+            return CatalogStore(path).budget_catalog()
+        return cls.from_json(path)
+
+    def __len__(self) -> int:
+        return len(self.block_ids)
+
+    @property
+    def membership(self) -> np.ndarray:
+        """One-hot (categories x blocks) matrix; ``membership @ hours`` gives category sums"""
+        if self._membership is None:
+            membership = np.zeros((len(self.category_ids), len(self.block_ids)))
+            membership[self.category_index, np.arange(len(self.block_ids))] = 1.0
+            self._membership = membership
+        return self._membership
+
+    def category_hours(self) -> np.ndarray:
+        """Raw catalog hours per category and tier (categories x tiers)"""
+        return self.membership @ self.hours
+
+    def category_items(self) -> np.ndarray:
+        """Priced blocks per category"""
+        return np.bincount(self.category_index, minlength=len(self.category_ids))
+
+
+class BudgetEngine:
+    """
+    processBudget on arrays
+
+    Every quantity in processBudget is linear in the catalog hours, so block
+    hours are summed per category once. A quote, or a whole grid of
+    scenarios, then takes a few broadcasts over the (categories x tiers)
+    matrix:
+
+        hours  = catalog hours * (100 - eficienciaIA) / 100
+        cost   = hours * tarifaIA * (100 + markup) / 100
+        totals = sum(cost) * (1 + (factorPM + factorTesting + factorContingencia) / 100)
+
+    Category hours and costs are before the project factors and totals after
+    them, the same as the JavaScript.
+    """
+
+    def __init__(self, catalog: Union[BudgetCatalog, Dict[str, Any]]):
+        self.catalog = BudgetCatalog.from_dict(catalog) if isinstance(catalog, dict) else catalog
+        self.base_hours = self.catalog.category_hours()
+        self.items = self.catalog.category_items()
+
+    @staticmethod
+    def factors(config: Optional[Dict[str, Any]]) -> Dict[str, float]:
+        """Efficiency, rate x markup and project multipliers for one config"""
+        return {
+            'efficiency': (100 - config_value(config, 'eficienciaIA')) / 100,
+            'rate': config_value(config, 'tarifaIA') * (100 + config_value(config, 'markup')) / 100,
+            'project': 1 + (config_value(config, 'factorPM') + config_value(config, 'factorTesting')
+                            + config_value(config, 'factorContingencia')) / 100,
+        }
+
+    def price(self, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """One quote in processBudget's shape (project_name, categories, totals, config)"""
+
+        factors = self.factors(config)
+        hours = self.base_hours * factors['efficiency']
+        costs = hours * factors['rate']
+        totals = costs.sum(axis=0) * factors['project']
+
+        categories = {}
+        for position, name in enumerate(self.catalog.category_names):
+            categories[name] = {
+                'name': name,
+                'items': int(self.items[position]),
+                'hours': dict(zip(TIERS, hours[position].tolist())),
+                'costs': dict(zip(TIERS, costs[position].tolist())),
+            }
+
+        return {
+            'project_name': (config or {}).get('nombreProyecto') or 'Proyecto Sin Nombre',
+            'generated_at': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'categories': categories,
+            'totals': dict(zip(TIERS, totals.tolist())),
+            'config': config or {},
+        }
+
+    def sweep(self,
+              config: Optional[Dict[str, Any]] = None,
+              grid: bool = True,
+              per_category: bool = False,
+              **values: Sequence[float]) -> Dict[str, np.ndarray]:
+        """
+        Price many scenarios at once
+
+        Args:
+            config: Base config; keys not swept keep its values (or the defaults)
+            grid: Cartesian product of the swept values (else they are zipped
+                  and must have equal lengths)
+            per_category: Also return category costs (scenarios x categories x tiers)
+            **values: Sequences for any of eficienciaIA, markup, tarifaIA,
+                      factorPM, factorTesting, factorContingencia
+
+        Returns arrays: one column per config key (scenarios,), ``totals``
+        (scenarios x tiers) and ``hours`` (scenarios x tiers, before factors).
+        """
+
+        unknown = set(values) - set(SWEEP_KEYS)
+        if unknown:
+            raise ValueError(f"Cannot sweep {sorted(unknown)}; expected some of {SWEEP_KEYS}")
+
+        swept = {key: np.asarray(values[key], dtype=np.float64).ravel() for key in SWEEP_KEYS if key in values}
+        if grid and swept:
+            mesh = np.meshgrid(*swept.values(), indexing='ij')
+            swept = {key: axis.ravel() for key, axis in zip(swept, mesh)}
+        elif len({len(column) for column in swept.values()}) > 1:
+            raise ValueError('Zipped sweep values must all have the same length')
+
+        count = len(next(iter(swept.values()))) if swept else 1
+        columns = {}
+        for key in SWEEP_KEYS:
+            if key in swept:
+                # Same fallback as config_value: 0 means "use the default"
+                columns[key] = np.where(swept[key] == 0, CONFIG_DEFAULTS[key], swept[key])
+            else:
+                columns[key] = np.full(count, config_value(config, key))
+
+        efficiency = (100 - columns['eficienciaIA']) / 100
+        rate = columns['tarifaIA'] * (100 + columns['markup']) / 100
+        project = 1 + (columns['factorPM'] + columns['factorTesting'] + columns['factorContingencia']) / 100
+
+        base = self.base_hours.sum(axis=0)
+        result = dict(columns)
+        result['hours'] = efficiency[:, None] * base[None, :]
+        result['totals'] = result['hours'] * (rate * project)[:, None]
+        if per_category:
+            result['category_costs'] = (efficiency * rate)[:, None, None] * self.base_hours[None, :, :]
+        return result
+
+
+def process_budget(building_blocks: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Drop-in for processBudget(buildingBlocks, config)"""
+    return BudgetEngine(building_blocks or {}).price(config)
+
+
+def parse_sweep(spec: str) -> tuple:
+    """'markup=30,40,50' or 'eficienciaIA=20:50:5' (start:stop:step, stop included)"""
+    key, _, values = spec.partition('=')
+    if ':' in values:
+        start, stop, step = (float(part) for part in values.split(':'))
+        return key, np.arange(start, stop + step / 2, step)
+    return key, [float(value) for value in values.split(',')]
+
+
+def main(argv=None) -> int:
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Price a building-block catalog (processBudget in NumPy)')
+    parser.add_argument('catalog', help='JSON catalog shaped like sample-building-blocks.json, or a compiled .bbcat')
+    parser.add_argument('--config', default='{}', help='Config JSON (eficienciaIA, markup, tarifaIA, factor...)')
+    parser.add_argument('--sweep', nargs='*', default=[], metavar='KEY=VALUES',
+                        help='Sensitivity grid, e.g. eficienciaIA=20:50:5 markup=30,40,50')
+    args = parser.parse_args(argv)
+
+    engine = BudgetEngine(BudgetCatalog.load(args.catalog))
+    config = json.loads(args.config)
+
+    if not args.sweep:
+        print(json.dumps(engine.price(config), indent=2, ensure_ascii=False))
+        return 0
+
+    values = dict(parse_sweep(spec) for spec in args.sweep)
+    start = time.perf_counter()
+    result = engine.sweep(config, **values)
+    elapsed = time.perf_counter() - start
+
+    keys = list(values)
+    print(','.join(keys + [f'total_{tier}' for tier in TIERS]))
+    for row in range(len(result['totals'])):
+        cells = [f"{result[key][row]:g}" for key in keys] + [f"{total:.0f}" for total in result['totals'][row]]
+        print(','.join(cells))
+    print(f"⚡ {len(result['totals'])} scenarios in {elapsed * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Incremental quote sessions for the cotizador widget
+The catalog and config are sent once; later checkbox and slider changes arrive as small
+diffs, only the affected category subtotals and totals are recomputed, and only the
+numbers that changed are returned
+"""
+
+import math
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple
+
+from budget_engine import BudgetEngine, TIERS, config_value, block_hours
+
+# Config keys grouped by what they feed: category hours and costs, costs only,
+# or the project totals only
+EFFICIENCY_KEYS = ('eficienciaIA',)
+RATE_KEYS = ('markup', 'tarifaIA')
+PROJECT_KEYS = ('factorPM', 'factorTesting', 'factorContingencia')
+
+# Incremental sums are rebuilt from the blocks after this many updates, so
+# floating-point drift cannot accumulate over a long session
+RESYNC_EVERY = 1000
+
+
+class UnknownBlock(KeyError):
+    """A diff selects or deselects a block the session does not have"""
+
+
+class _Category:
+    """Raw (pre-factor) hours of one category's selected blocks"""
+
+    __slots__ = ('name', 'blocks', 'hours', 'items', 'updates')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.blocks: Dict[str, List] = {}  # block id -> [hours tuple, selected]
+        self.hours = [0.0] * len(TIERS)
+        self.items = 0
+        self.updates = 0
+
+    def add(self, hours: Tuple[float, ...], sign: int):
+        for tier, value in enumerate(hours):
+            self.hours[tier] += sign * value
+        self.items += sign
+        self.updates += 1
+        if self.items == 0:
+            # Nothing selected: exact zeros rather than the residue of the +/- updates
+            self.hours = [0.0] * len(TIERS)
+            self.updates = 0
+        elif self.updates >= RESYNC_EVERY:
+            self.resync()
+
+    def resync(self):
+        selected = [hours for hours, on in self.blocks.values() if on]
+        self.hours = [math.fsum(hours[tier] for hours in selected) for tier in range(len(TIERS))]
+        self.items = len(selected)
+        self.updates = 0
+
+
+class QuoteSession:
+    """
+    processBudget kept up to date under small changes
+
+    Each category keeps the raw hours of its selected blocks and a cached
+    subtotal (items, hours and costs per tier, the processBudget category
+    entry); the session keeps the sum of category costs. A change marks
+    what depends on it: selecting, deselecting or editing a block dirties
+    its category; eficienciaIA, markup or tarifaIA dirty every category's
+    costs (and hours, for eficienciaIA); factorPM / factorTesting /
+    factorContingencia only the totals. ``apply`` recomputes the dirty
+    entries and returns only the numbers that differ, so its cost and
+    payload depend on the change, not on the catalog size.
+
+    Diffs look like::
+
+        {"config": {"markup": 45},
+         "blocks": {"frontend": {"ui_components": false,            # deselect
+                                 "state_management": true,          # select again
+                                 "charts": {"name": "Charts",       # add or replace
+                                            "hours": {"facil": 8, "intermedio": 16, "complejo": 30}},
+                                 "legacy_widget": null}}}           # remove
+
+    Category ids are the catalog's; blocks added to an unknown category
+    create it, named after its id.
+    """
+
+    def __init__(self, building_blocks: Optional[Dict[str, Any]] = None, config: Optional[Dict[str, Any]] = None):
+        self.config: Dict[str, Any] = dict(config or {})
+        self.categories: Dict[str, _Category] = {}
+        for category_id, category in ((building_blocks or {}).get('categories') or {}).items():
+            entry = self.categories[category_id] = _Category(category.get('name') or category_id)
+            for block_id, block in (category.get('building_blocks') or {}).items():
+                self._put_block(entry, block_id, block)
+
+        self.version = 0
+        self.updated = time.monotonic()
+        self._factors = BudgetEngine.factors(self.config)
+        self._subtotals: Dict[str, Dict[str, Any]] = {}
+        self._cost_sum = [0.0] * len(TIERS)
+        self._totals: Dict[str, float] = {}
+        self._rebuild()
+
+    # ---- state -----------------------------------------------------------
+
+    @staticmethod
+    def _block_hours(block: Dict[str, Any]) -> Optional[Tuple[float, ...]]:
+        hours = block_hours(block)
+        if hours is None:
+            return None  # processBudget skips blocks without hours
+        return tuple(float(value) for value in hours)
+
+    def _put_block(self, category: _Category, block_id: str, block: Dict[str, Any]):
+        """Add or replace a block (selected); blocks without hours are dropped"""
+        self._drop_block(category, block_id)
+        if not isinstance(block, dict):
+            raise ValueError(f"Block '{block_id}' must be an object, true, false or null")
+        hours = self._block_hours(block)
+        if hours is not None:
+            category.blocks[block_id] = [hours, True]
+            category.add(hours, +1)
+
+    def _drop_block(self, category: _Category, block_id: str):
+        previous = category.blocks.pop(block_id, None)
+        if previous and previous[1]:
+            category.add(previous[0], -1)
+
+    def _select(self, category: _Category, block_id: str, selected: bool):
+        if block_id not in category.blocks:
+            raise UnknownBlock(f"Unknown block '{block_id}' in category '{category.name}'")
+        entry = category.blocks[block_id]
+        if entry[1] != selected:
+            entry[1] = selected
+            category.add(entry[0], +1 if selected else -1)
+
+    def _subtotal(self, category: _Category) -> Dict[str, Any]:
+        hours = [value * self._factors['efficiency'] for value in category.hours]
+        return {
+            'name': category.name,
+            'items': category.items,
+            'hours': dict(zip(TIERS, hours)),
+            'costs': {tier: value * self._factors['rate'] for tier, value in zip(TIERS, hours)},
+        }
+
+    def _rebuild(self):
+        """Recompute every subtotal and the cost sum from scratch"""
+        self._subtotals = {category_id: self._subtotal(category) for category_id, category in self.categories.items()}
+        self._cost_sum = [math.fsum(subtotal['costs'][tier] for subtotal in self._subtotals.values()) for tier in TIERS]
+        self._totals = self._project_totals()
+
+    def _project_totals(self) -> Dict[str, float]:
+        return {tier: value * self._factors['project'] for tier, value in zip(TIERS, self._cost_sum)}
+
+    # ---- views -----------------------------------------------------------
+
+    def _categories_view(self, category_ids) -> Dict[str, Dict[str, Any]]:
+        """processBudget's categories mapping (keyed by name; a later duplicate name wins)"""
+        return {self._subtotals[category_id]['name']: self._subtotals[category_id] for category_id in category_ids}
+
+    def quote(self) -> Dict[str, Any]:
+        """The full processBudget result for the current state"""
+        return {
+            'project_name': self.config.get('nombreProyecto') or 'Proyecto Sin Nombre',
+            'generated_at': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'categories': {name: {**subtotal, 'hours': dict(subtotal['hours']), 'costs': dict(subtotal['costs'])}
+                           for name, subtotal in self._categories_view(self.categories).items()},
+            'totals': dict(self._totals),
+            'config': dict(self.config),
+        }
+
+    # ---- updates ---------------------------------------------------------
+
+    def apply(self, diff: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Apply a diff and return what changed
+
+        The result holds only changed numbers: ``categories`` maps names to
+        the changed ``items`` and per-tier ``hours`` / ``costs``,
+        ``totals`` the changed tiers, and ``project_name`` / ``config`` when
+        they changed. Raises UnknownBlock (a KeyError) for unknown blocks and
+        ValueError for malformed diffs.
+        """
+
+        config_changes, block_changes = self._validate(diff)
+        previous_totals = self._totals
+        dirty = set()
+        rescale = False
+        changes: Dict[str, Any] = {}
+
+        if config_changes:
+            before = {key: config_value(self.config, key) for key in EFFICIENCY_KEYS + RATE_KEYS}
+            name_before = self.config.get('nombreProyecto') or 'Proyecto Sin Nombre'
+            for key, value in config_changes.items():
+                if value is None:
+                    self.config.pop(key, None)
+                else:
+                    self.config[key] = value
+            self._factors = BudgetEngine.factors(self.config)
+            rescale = any(config_value(self.config, key) != before[key] for key in EFFICIENCY_KEYS + RATE_KEYS)
+            changes['config'] = {key: self.config.get(key) for key in config_changes}
+            project_name = self.config.get('nombreProyecto') or 'Proyecto Sin Nombre'
+            if project_name != name_before:
+                changes['project_name'] = project_name
+
+        for category_id, blocks in block_changes.items():
+            category = self.categories.get(category_id)
+            if category is None:
+                category = self.categories[category_id] = _Category(category_id)
+            for block_id, change in blocks.items():
+                if change is True or change is False:
+                    self._select(category, block_id, change)
+                elif change is None:
+                    self._drop_block(category, block_id)
+                else:
+                    self._put_block(category, block_id, change)
+            dirty.add(category_id)
+
+        old = {category_id: self._subtotals.get(category_id) for category_id in (self.categories if rescale else dirty)}
+        if rescale:
+            self._rebuild()
+        else:
+            for category_id in dirty:
+                self._subtotals[category_id] = self._subtotal(self.categories[category_id])
+            # fsum over the category subtotals (few, unlike blocks): exact, and 0.0 when nothing is selected
+            self._cost_sum = [math.fsum(subtotal['costs'][tier] for subtotal in self._subtotals.values())
+                              for tier in TIERS]
+
+        category_changes = {}
+        for category_id, previous in old.items():
+            changed = self._changed(previous, self._subtotals[category_id])
+            if changed:
+                category_changes.setdefault(self._subtotals[category_id]['name'], {}).update(changed)
+        if category_changes:
+            changes['categories'] = category_changes
+
+        totals = self._project_totals()
+        changed_totals = {tier: value for tier, value in totals.items() if value != previous_totals.get(tier)}
+        self._totals = totals
+        if changed_totals:
+            changes['totals'] = changed_totals
+
+        self.version += 1
+        self.updated = time.monotonic()
+        return changes
+
+    def _validate(self, diff: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Check a whole diff before any of it is applied"""
+
+        if not isinstance(diff, dict):
+            raise ValueError('Diff must be a JSON object')
+        config_changes = diff.get('config') or {}
+        if not isinstance(config_changes, dict):
+            raise ValueError("'config' must be an object")
+        for key in EFFICIENCY_KEYS + RATE_KEYS + PROJECT_KEYS:
+            value = config_changes.get(key)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise ValueError(f"'{key}' must be a number")
+        block_changes = diff.get('blocks') or {}
+        if not isinstance(block_changes, dict):
+            raise ValueError("'blocks' must map category ids to block changes")
+
+        for category_id, blocks in block_changes.items():
+            if not isinstance(blocks, dict):
+                raise ValueError(f"Changes for category '{category_id}' must be an object")
+            known = self.categories[category_id].blocks if category_id in self.categories else {}
+            for block_id, change in blocks.items():
+                if change is True or change is False:
+                    if block_id not in known:
+                        raise UnknownBlock(f"Unknown block '{block_id}' in category '{category_id}'")
+                elif change is not None:
+                    if not isinstance(change, dict):
+                        raise ValueError(f"Block '{block_id}' must be an object, true, false or null")
+                    try:
+                        self._block_hours(change)
+                    except (TypeError, ValueError, AttributeError):
+                        raise ValueError(f"Block '{block_id}' has invalid hours")
+        return config_changes, block_changes
+
+    @staticmethod
+    def _changed(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+        if previous is None:
+            return {key: current[key] for key in ('items', 'hours', 'costs')}
+        changed: Dict[str, Any] = {}
+        if current['items'] != previous['items']:
+            changed['items'] = current['items']
+        for key in ('hours', 'costs'):
+            values = {tier: value for tier, value in current[key].items() if value != previous[key][tier]}
+            if values:
+                changed[key] = values
+        return changed
+
+
+class QuoteSessions:
+    """
+    Quote sessions by id, least recently used evicted first
+
+    ``handle`` takes the widget's JSON: a body with ``building_blocks``
+    opens a session and returns the full quote; a body with ``session_id``
+    (and optionally the ``version`` it last saw) applies the diff and
+    returns only ``changes``. If the version does not match, e.g. a reply
+    was lost, the full quote is returned instead. Unknown or expired
+    sessions raise KeyError; the client then sends the full catalog again.
+    Session ids start with ``id_prefix``, so a multi-process server can tell
+    which process owns a session.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 1800.0, id_prefix: str = ''):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.id_prefix = id_prefix
+        self._sessions: 'OrderedDict[str, QuoteSession]' = OrderedDict()
+        self.counters: Dict[str, int] = {'created': 0, 'updates': 0, 'resent': 0, 'expired': 0, 'evicted': 0}
+
+    def create(self, building_blocks: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Tuple[str, QuoteSession]:
+        self._expire()
+        session_id = self.id_prefix + uuid.uuid4().hex
+        session = QuoteSession(building_blocks, config)
+        self._sessions[session_id] = session
+        self.counters['created'] += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.counters['evicted'] += 1
+        return session_id, session
+
+    def get(self, session_id: str) -> QuoteSession:
+        session = self._sessions.get(session_id)
+        if session is None or time.monotonic() - session.updated > self.ttl:
+            if session is not None:
+                del self._sessions[session_id]
+                self.counters['expired'] += 1
+            raise KeyError(f"Unknown or expired quote session '{session_id}'")
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.updated <= self.ttl:
+                break
+            del self._sessions[session_id]
+            self.counters['expired'] += 1
+
+    def handle(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(payload, dict):
+            raise ValueError('Body must be a JSON object')
+
+        if payload.get('session_id') is None:
+            if not isinstance(payload.get('building_blocks'), dict):
+                raise ValueError("Send 'building_blocks' (and 'config') to open a session, or a 'session_id' with changes")
+            session_id, session = self.create(payload['building_blocks'], payload.get('config'))
+            return {'status': 'success', 'session_id': session_id, 'version': session.version, 'quote': session.quote()}
+
+        session_id = payload['session_id']
+        session = self.get(session_id)
+        known = payload.get('version')
+        changes = session.apply({'config': payload.get('config'), 'blocks': payload.get('blocks')})
+        self.counters['updates'] += 1
+        if known is not None and known != session.version - 1:
+            self.counters['resent'] += 1
+            return {'status': 'success', 'session_id': session_id, 'version': session.version, 'quote': session.quote()}
+        return {'status': 'success', 'session_id': session_id, 'version': session.version, 'changes': changes}
+
+    def close(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, 'sessions': len(self._sessions)}
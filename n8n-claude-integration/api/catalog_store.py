@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Compiled, memory-mapped building-block catalogs
+Converts catalog JSON (sample-building-blocks.json and friends) into one columnar file:
+fixed-width hours / function point arrays, string tables and on-disk hash indexes,
+opened with mmap so loading is near free and worker processes share the page cache
+
+    python catalog_store.py compile ../../sample-building-blocks.json -o catalog.bbcat
+    python catalog_store.py search catalog.bbcat "api"
+"""
+
+import os
+import json
+import mmap
+import zlib
+from collections.abc import Sequence
+from typing import Dict, Any, Optional, List, Union
+
+import numpy as np
+
+from budget_engine import BudgetCatalog, HOUR_KEYS, block_hours
+
+MAGIC = b'BBCAT1\n\x00'
+ALIGN = 64
+EXTENSION = '.bbcat'
+
+# Separates category and block ids in the qualified-id hash index
+KEY_SEPARATOR = '\x00'
+
+
+def _hash(key: bytes) -> int:
+    # crc32, not hash(): the index is written by one process and read by others
+    return zlib.crc32(key)
+
+
+def _slots(count: int) -> int:
+    size = 8
+    while size < 2 * count:
+        size *= 2
+    return size
+
+
+def _build_index(keys: List[bytes]) -> np.ndarray:
+    """Open-addressing table of row numbers (-1 = empty); the first of duplicate keys wins"""
+    table = np.full(_slots(len(keys)), -1, dtype=np.int32)
+    mask = len(table) - 1
+    seen = set()
+    for row, key in enumerate(keys):
+        if key in seen:
+            continue
+        seen.add(key)
+        slot = _hash(key) & mask
+        while table[slot] != -1:
+            slot = (slot + 1) & mask
+        table[slot] = row
+    return table
+
+
+def _string_table(values: List[str]) -> Dict[str, np.ndarray]:
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {'offsets': offsets, 'data': np.frombuffer(b''.join(encoded), dtype=np.uint8)}
+
+
+def compile_catalog(source: Union[str, Dict[str, Any]], path: str) -> str:
+    """
+    Write a catalog (JSON path or parsed dict) as a compiled store at ``path``
+
+    Blocks keep catalog order, grouped by category. The file is written to a
+    temporary name and renamed, so readers never see a partial store.
+    """
+
+    if isinstance(source, str):
+        with open(source, encoding='utf-8') as catalog_file:
+            catalog = json.load(catalog_file)
+    else:
+        catalog = source
+
+    columns: Dict[str, List] = {key: [] for key in (
+        'category_id', 'category_name', 'category_description', 'category_start',
+        'block_id', 'block_name', 'block_description', 'block_category', 'hours', 'function_points',
+        'has_hours', 'has_function_points')}
+    for position, (category_id, category) in enumerate((catalog.get('categories') or {}).items()):
+        columns['category_id'].append(category_id)
+        columns['category_name'].append(category.get('name') or category_id)
+        columns['category_description'].append(category.get('description') or '')
+        columns['category_start'].append(len(columns['block_id']))
+        for block_id, block in (category.get('building_blocks') or {}).items():
+            hours = block_hours(block)
+            points = block.get('function_points') or {}
+            columns['block_id'].append(block_id)
+            columns['block_name'].append(block.get('name') or block_id)
+            columns['block_description'].append(block.get('description') or '')
+            columns['block_category'].append(position)
+            columns['hours'].append(hours if hours is not None else [0] * len(HOUR_KEYS))
+            columns['function_points'].append([points.get(key) or 0 for key in HOUR_KEYS])
+            columns['has_hours'].append(hours is not None)
+            columns['has_function_points'].append('function_points' in block)
+    columns['category_start'].append(len(columns['block_id']))
+
+    names = [name.casefold() for name in columns['block_name']]
+    name_order = sorted(range(len(names)), key=lambda row: names[row].encode('utf-8'))
+    qualified = [f"{columns['category_id'][category]}{KEY_SEPARATOR}{block_id}".encode('utf-8')
+                 for category, block_id in zip(columns['block_category'], columns['block_id'])]
+
+    arrays: Dict[str, np.ndarray] = {
+        'hours': np.asarray(columns['hours'], dtype=np.float64).reshape(-1, len(HOUR_KEYS)),
+        'function_points': np.asarray(columns['function_points'], dtype=np.float64).reshape(-1, len(HOUR_KEYS)),
+        'has_hours': np.asarray(columns['has_hours'], dtype=np.bool_),
+        'has_function_points': np.asarray(columns['has_function_points'], dtype=np.bool_),
+        'block_category': np.asarray(columns['block_category'], dtype=np.int32),
+        'category_start': np.asarray(columns['category_start'], dtype=np.int32),
+        'name_order': np.asarray(name_order, dtype=np.int32),
+        'index_block': _build_index(qualified),
+        'index_block_id': _build_index([block_id.encode('utf-8') for block_id in columns['block_id']]),
+        'index_category': _build_index([category_id.encode('utf-8') for category_id in columns['category_id']]),
+    }
+    for table in ('category_id', 'category_name', 'category_description',
+                  'block_id', 'block_name', 'block_description'):
+        for part, array in _string_table(columns[table]).items():
+            arrays[f'{table}.{part}'] = array
+    for part, array in _string_table(names).items():
+        arrays[f'name_key.{part}'] = array
+    search = [f'{name}\n{description.casefold()}' for name, description in zip(names, columns['block_description'])]
+    for part, array in _string_table(search).items():
+        arrays[f'search.{part}'] = array
+
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps({'format': 1, 'metadata': catalog.get('metadata') or {},
+                         'blocks': len(columns['block_id']), 'categories': len(columns['category_id']),
+                         'arrays': layout}).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as store_file:
+        store_file.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+        for name, array in arrays.items():
+            store_file.seek(data_start + layout[name]['offset'])
+            store_file.write(np.ascontiguousarray(array).tobytes())
+        store_file.truncate(data_start + offset)
+    os.replace(temporary, path)
+    return path
+
+
+class StringTable(Sequence):
+    """Read-only sequence of the strings in a compiled table, decoded on access"""
+
+    def __init__(self, offsets: np.ndarray, data: memoryview, rows: Optional[np.ndarray] = None):
+        self._offsets = offsets
+        self._data = data
+        self._rows = rows
+
+    def raw(self, index: int) -> bytes:
+        row = int(self._rows[index]) if self._rows is not None else index
+        return bytes(self._data[int(self._offsets[row]):int(self._offsets[row + 1])])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.raw(index).decode('utf-8')
+
+    def __len__(self) -> int:
+        return len(self._rows) if self._rows is not None else len(self._offsets) - 1
+
+    def subset(self, rows: np.ndarray) -> 'StringTable':
+        return StringTable(self._offsets, self._data, rows)
+
+
+class CatalogStore:
+    """
+    A compiled catalog opened read-only through mmap
+
+    Opening reads the header only; columns are NumPy views onto the mapping
+    and strings are decoded when asked for, so the cost does not depend on
+    the catalog size, and every process that opens the same file shares one
+    copy in the page cache.
+
+    ``get`` finds a block by id (or category id + block id) through an
+    on-disk hash index, ``category`` a category by id. ``search_prefix``
+    bisects the names in case-insensitive order; ``search`` scans names and
+    descriptions for a case-insensitive substring. ``budget_catalog()``
+    hands the columns to BudgetEngine without copying them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as store_file:
+            self._mmap = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f'{path} is not a compiled catalog')
+        length = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 8], 'little')
+        header = json.loads(self._mmap[len(MAGIC) + 8:len(MAGIC) + 8 + length])
+        data_start = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+
+        self.metadata: Dict[str, Any] = header['metadata']
+        self._buffer = memoryview(self._mmap)
+        self._starts: Dict[str, int] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            self._starts[name] = data_start + spec['offset']
+            self._arrays[name] = np.frombuffer(self._buffer, dtype=dtype, count=count,
+                                               offset=self._starts[name]).reshape(spec['shape'])
+
+        self.hours = self._arrays['hours']
+        self.function_points = self._arrays['function_points']
+        self.has_hours = self._arrays['has_hours']
+        self.block_category = self._arrays['block_category']
+        self.category_ids = self._table('category_id')
+        self.category_names = self._table('category_name')
+        self.category_descriptions = self._table('category_description')
+        self.block_ids = self._table('block_id')
+        self.block_names = self._table('block_name')
+        self.block_descriptions = self._table('block_description')
+        self._name_keys = self._table('name_key')
+
+    def _table(self, name: str) -> StringTable:
+        start = self._starts[f'{name}.data']
+        return StringTable(self._arrays[f'{name}.offsets'],
+                           self._buffer[start:start + len(self._arrays[f'{name}.data'])])
+
+    def close(self):
+        """Unmap the file, unless arrays or strings handed out still use it"""
+        self._arrays.clear()
+        try:
+            self._buffer.release()
+            self._mmap.close()
+        except BufferError:
+            pass  # the mapping goes away with the last view
+
+    def __enter__(self) -> 'CatalogStore':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.block_ids)
+
+    # ---- lookup ----------------------------------------------------------
+
+    def _probe(self, index: str, key: bytes, table: StringTable, qualified: bool = False) -> int:
+        slots = self._arrays[index]
+        mask = len(slots) - 1
+        slot = _hash(key) & mask
+        while True:
+            row = int(slots[slot])
+            if row == -1:
+                return -1
+            found = table.raw(row) if not qualified else (
+                self.category_ids.raw(int(self.block_category[row])) + KEY_SEPARATOR.encode() + table.raw(row))
+            if found == key:
+                return row
+            slot = (slot + 1) & mask
+
+    def index_of(self, block_id: str, category_id: Optional[str] = None) -> int:
+        """Row of a block (-1 if missing); without category_id, the first block with that id"""
+        if category_id is None:
+            return self._probe('index_block_id', block_id.encode('utf-8'), self.block_ids)
+        key = f'{category_id}{KEY_SEPARATOR}{block_id}'.encode('utf-8')
+        return self._probe('index_block', key, self.block_ids, qualified=True)
+
+    def get(self, block_id: str, category_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        row = self.index_of(block_id, category_id)
+        return self.block(row) if row >= 0 else None
+
+    def block(self, row: int) -> Dict[str, Any]:
+        """A block as in the catalog JSON, plus its id, category id and row"""
+        block = {
+            'id': self.block_ids[row],
+            'category': self.category_ids[int(self.block_category[row])],
+            'row': row,
+            'name': self.block_names[row],
+            'description': self.block_descriptions[row],
+        }
+        if self.has_hours[row]:
+            block['hours'] = dict(zip(HOUR_KEYS, self.hours[row].tolist()))
+        if self._arrays['has_function_points'][row]:
+            block['function_points'] = dict(zip(HOUR_KEYS, self.function_points[row].tolist()))
+        return block
+
+    def category(self, category_id: str) -> Optional[Dict[str, Any]]:
+        """A category's id, name, description and block rows"""
+        row = self._probe('index_category', category_id.encode('utf-8'), self.category_ids)
+        if row < 0:
+            return None
+        starts = self._arrays['category_start']
+        return {
+            'id': category_id,
+            'name': self.category_names[row],
+            'description': self.category_descriptions[row],
+            'rows': range(int(starts[row]), int(starts[row + 1])),
+        }
+
+    # ---- search ----------------------------------------------------------
+
+    def search_prefix(self, prefix: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Blocks whose name starts with ``prefix`` (case-insensitive), by name"""
+
+        key = prefix.casefold().encode('utf-8')
+        order = self._arrays['name_order']
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._name_keys.raw(int(order[middle])) < key:
+                low = middle + 1
+            else:
+                high = middle
+        results = []
+        for position in range(low, min(len(order), low + limit)):
+            row = int(order[position])
+            if not self._name_keys.raw(row).startswith(key):
+                break
+            results.append(self.block(row))
+        return results
+
+    def search(self, text: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Blocks whose name or description contains ``text`` (case-insensitive), in catalog order"""
+
+        needle = text.casefold().encode('utf-8')
+        offsets = self._arrays['search.offsets']
+        data = self._arrays['search.data']
+        if not needle or not len(data):
+            return []
+        start = self._starts['search.data']
+        end = start + len(data)
+        results, position = [], start
+        while len(results) < limit:
+            hit = self._mmap.find(needle, position, end)
+            if hit < 0:
+                break
+            row = int(np.searchsorted(offsets, hit - start, side='right')) - 1
+            # A match spanning two blocks' text is not a match
+            if hit - start + len(needle) <= int(offsets[row + 1]):
+                results.append(self.block(row))
+            position = start + int(offsets[row + 1])
+        return results
+
+    # ---- conversion ------------------------------------------------------
+
+    def budget_catalog(self) -> BudgetCatalog:
+        """BudgetCatalog over the mapped columns (blocks without hours left out)"""
+        if self.has_hours.all():
+            return BudgetCatalog(self.category_ids, self.category_names, self.block_ids, self.block_names,
+                                 self.block_category, self.hours, self.metadata)
+        rows = np.flatnonzero(self.has_hours)
+        return BudgetCatalog(self.category_ids, self.category_names,
+                             self.block_ids.subset(rows), self.block_names.subset(rows),
+                             self.block_category[rows], self.hours[rows], self.metadata)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The catalog back in its JSON shape"""
+        starts = self._arrays['category_start']
+        categories = {}
+        for position, category_id in enumerate(self.category_ids):
+            blocks = {}
+            for row in range(int(starts[position]), int(starts[position + 1])):
+                block = self.block(row)
+                block_id = block.pop('id')
+                blocks[block_id] = {key: value for key, value in block.items() if key not in ('category', 'row')}
+            categories[category_id] = {'name': self.category_names[position],
+                                       'description': self.category_descriptions[position],
+                                       'building_blocks': blocks}
+        return {'metadata': self.metadata, 'categories': categories}
+
+
+def open_catalog(path: str, compiled: Optional[str] = None) -> CatalogStore:
+    """
+    Open a catalog, compiling JSON on first use
+
+    A ``.json`` path is compiled next to itself (or to ``compiled``) and the
+    compiled file is reused until the JSON is modified again.
+    """
+
+    if not path.endswith('.json'):
+        return CatalogStore(path)
+    compiled = compiled or os.path.splitext(path)[0] + EXTENSION
+    if not os.path.exists(compiled) or os.path.getmtime(compiled) < os.path.getmtime(path):
+        compile_catalog(path, compiled)
+    return CatalogStore(compiled)
+
+
+def main(argv=None) -> int:
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Compile and query building-block catalogs')
+    commands = parser.add_subparsers(dest='command', required=True)
+    compile_parser = commands.add_parser('compile', help='Convert catalog JSON to a compiled store')
+    compile_parser.add_argument('source')
+    compile_parser.add_argument('-o', '--output', help=f'Default: the source path with {EXTENSION}')
+    for name, description in (('search', 'Substring search over names and descriptions'),
+                              ('prefix', 'Blocks whose name starts with the text'),
+                              ('get', 'Block by id (category_id/block_id or block_id)')):
+        query_parser = commands.add_parser(name, help=description)
+        query_parser.add_argument('store')
+        query_parser.add_argument('text')
+    info_parser = commands.add_parser('info', help='Block and category counts')
+    info_parser.add_argument('store')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compile':
+        output = args.output or os.path.splitext(args.source)[0] + EXTENSION
+        start = time.perf_counter()
+        compile_catalog(args.source, output)
+        print(f"✅ {output} ({os.path.getsize(output):,} bytes) in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return 0
+
+    start = time.perf_counter()
+    store = open_catalog(args.store)
+    opened = time.perf_counter() - start
+    if args.command == 'info':
+        print(f"📦 {args.store}: {len(store)} blocks, {len(store.category_ids)} categories, "
+              f"opened in {opened * 1000:.2f} ms")
+        return 0
+    if args.command == 'get':
+        category_id, _, block_id = args.text.rpartition('/')
+        block = store.get(block_id, category_id or None)
+        print(json.dumps(block, indent=2, ensure_ascii=False) if block else f"❌ No block '{args.text}'")
+        return 0 if block else 1
+
+    results = store.search(args.text) if args.command == 'search' else store.search_prefix(args.text)
+    for block in results:
+        print(f"   {block['category']}/{block['id']}: {block['name']}")
+    print(f"🔍 {len(results)} match(es)")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
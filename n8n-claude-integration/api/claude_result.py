@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Result dicts and fast response parsing
+Bedrock bodies and stream events are decoded straight from bytes (orjson when installed)
+and results are built in one pass as ClaudeResult, a dict subclass
+"""
+
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+try:
+    import orjson  # Optional: 3-10x faster than json and decodes bytes without a str copy
+    loads = orjson.loads
+except ImportError:
+    orjson = None
+    loads = json.loads
+
+_MISSING = object()
+_stamp = (None, '')
+
+
+def timestamp(created: Optional[float] = None) -> str:
+    """
+    ISO timestamp to the second, formatted once per second: results built in
+    the same second share one string instead of each formatting its own
+    """
+    global _stamp
+    second = int(time.time() if created is None else created)
+    cached = _stamp
+    if cached[0] != second:
+        cached = _stamp = (second, datetime.fromtimestamp(second).isoformat())
+    return cached[1]
+
+
+class ClaudeResult(dict):
+    """
+    Result dict of chat, conversation, analyze_image, chat_stream and batch results
+
+    A plain ``dict`` subclass, so ``json.dumps``, ``isinstance(result, dict)``
+    and n8n's ``[{"json": result}]`` keep working. It adds no per-instance
+    ``__dict__``, builds the usual keys in one pass from already decoded
+    values (no intermediate dicts or copies of usage/timing) and shares the
+    per-second ``timestamp`` string. Failures use ``ClaudeResult.failure`` so
+    every path returns the same type; ``exception`` keeps the original error
+    for callers that map it (e.g. the HTTP gateway).
+    """
+
+    __slots__ = ('exception',)
+
+    def __init__(self,
+                 text: str,
+                 model_used: str,
+                 model_generation: Any = _MISSING,
+                 usage: Optional[Dict[str, int]] = None,
+                 timing: Any = _MISSING,
+                 stop_reason: Any = _MISSING,
+                 text_key: str = 'response',
+                 created: Optional[float] = None,
+                 **extra):
+        super().__init__()
+        self.exception = None
+        self[text_key] = text
+        self['model_used'] = model_used
+        if model_generation is not _MISSING:
+            self['model_generation'] = model_generation
+        self['usage'] = usage if usage is not None else {}
+        if stop_reason is not _MISSING:
+            self['stop_reason'] = stop_reason
+        if timing is not _MISSING:
+            self['timing'] = timing
+        if extra:
+            self.update(extra)
+        self['timestamp'] = timestamp(created)
+
+    @classmethod
+    def failure(cls, error: Any, **fields) -> 'ClaudeResult':
+        """Error result: ``{'error': str(error), **fields, 'timestamp'}``"""
+        result = dict.__new__(cls)
+        dict.__init__(result, error=str(error), **fields, timestamp=timestamp())
+        result.exception = error if isinstance(error, BaseException) else None
+        return result
+
+    def copy(self) -> 'ClaudeResult':
+        """A shallow copy that keeps ``exception`` (``dict.copy`` would return a plain dict)"""
+        result = _restore(self)
+        result.exception = self.exception
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """A plain dict copy"""
+        return dict(self)
+
+    def __reduce__(self):
+        # Rebuilt as a plain-dict payload so results pickle across processes (the exception stays behind)
+        return (_restore, (dict(self),))
+
+
+def _restore(items: Dict[str, Any]) -> 'ClaudeResult':
+    result = dict.__new__(ClaudeResult)
+    dict.__init__(result, items)
+    result.exception = None
+    return result
+
+
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Async HTTP gateway for Claude4Client
+One warm, concurrency-controlled service that n8n and the quote widget share instead
+of each calling Bedrock inline. Standard library only (asyncio streams).
+
+    python claude_service.py --port 8080 --workers 4 --concurrency 16 --max-queue 64
+
+    curl -X POST localhost:8080/chat -d '{"prompt": "Hello", "model": "haiku3.5"}'
+    curl -N -X POST localhost:8080/chat -d '{"prompt": "Hello", "stream": true}'
+
+Routes mirror the API Gateway ones in docs/CLAUDE4_READY.md: /chat,
+/advanced-reasoning, /generate-code, /analyze-image and /compare-models take the
+client method's arguments as a JSON body. POST /budget-quote serves incremental
+quote sessions for the cotizador widget (budget_session.py); with several
+workers, each session stays in the worker that opened it and the others forward
+its diffs there over a private Unix socket. GET /health and GET /metrics report
+readiness and Prometheus metrics.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import signal
+import socket
+import asyncio
+import tempfile
+from collections import deque
+from http import HTTPStatus
+from typing import Dict, Any, Optional, Tuple, List
+
+from python_claude4_tools import Claude4Client, AsyncClaude4Client
+from request_scheduler import RequestScheduler, request_context, PRIORITIES
+from context_window import ContextTooLarge
+
+ROUTES = {
+    '/chat': 'chat',
+    '/advanced-reasoning': 'advanced_reasoning',
+    '/generate-code': 'generate_code',
+    '/analyze-image': 'analyze_image',
+    '/compare-models': 'compare_models',
+}
+
+# Methods that can answer as a Server-Sent Events stream ("stream": true)
+STREAMABLE = {'chat', 'advanced_reasoning', 'generate_code', 'compare_models'}
+
+MAX_HEADER_LINES = 100
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ClaudeService:
+    """
+    HTTP/1.1 front-end with admission control, streaming and graceful drain
+
+    At most ``concurrency`` Bedrock calls run at once (a RequestScheduler,
+    so X-Priority / X-Tenant / X-Deadline headers apply), up to ``max_queue``
+    more wait for a slot, and anything beyond that is refused with 429 and a
+    Retry-After estimated from recent latency. On SIGTERM the listener
+    closes, new requests on open connections get 503, and in-flight ones get
+    ``drain_timeout`` seconds to finish.
+    """
+
+    def __init__(self,
+                 client: Optional[Claude4Client] = None,
+                 concurrency: int = 8,
+                 max_queue: int = 64,
+                 drain_timeout: float = 30.0,
+                 max_body: int = 1024 * 1024,
+                 image_root: Optional[str] = None,
+                 quote_sessions=None,
+                 worker_id: int = 0,
+                 peers: Optional[List[str]] = None):
+        self.client = client or Claude4Client(max_pool_connections=concurrency)
+        if self.client.scheduler is None:
+            self.client.scheduler = RequestScheduler(concurrency=concurrency)
+        self.scheduler = self.client.scheduler
+        # Waiting requests block in the scheduler, not in the executor queue,
+        # so priorities decide the order; the pool therefore covers the queue too.
+        self.async_client = AsyncClaude4Client(client=self.client, concurrency=concurrency + max_queue)
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self.max_body = max_body
+        self.image_root = os.path.realpath(image_root or os.getcwd())
+        # Quote sessions live in the worker that opened them (their ids start with
+        # "<worker_id>."); a diff for another worker's session is forwarded to
+        # peers[owner], that worker's Unix socket (peers[worker_id] is our own)
+        self._quotes = quote_sessions  # budget_session.QuoteSessions, created on first use
+        self.worker_id = worker_id
+        self.peers = peers or []
+        self._peer_server: Optional[asyncio.AbstractServer] = None
+
+        self.active = 0
+        self.draining = False
+        self.counters: Dict[str, int] = {'requests': 0, 'rejected': 0, 'streams': 0}
+        self._latency: deque = deque(maxlen=200)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+
+    @property
+    def quotes(self):
+        """The worker's quote sessions; budget_session (and numpy) load on the first /budget-quote"""
+        if self._quotes is None:
+            from budget_session import QuoteSessions
+            self._quotes = QuoteSessions(id_prefix=f'{self.worker_id}.' if self.peers else '')
+        return self._quotes
+
+    # ---- admission -------------------------------------------------------
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely free, from recent request latency"""
+        mean = sum(self._latency) / len(self._latency) if self._latency else 1.0
+        backlog = self.active - self.concurrency + 1
+        return max(1, math.ceil(mean * max(1, backlog) / self.concurrency))
+
+    def admit(self):
+        if self.draining:
+            raise HTTPError(503, 'Service is shutting down', {'Retry-After': '5', 'Connection': 'close'})
+        if self.active >= self.concurrency + self.max_queue:
+            self.counters['rejected'] += 1
+            raise HTTPError(429, 'Too many requests queued', {'Retry-After': str(self.retry_after())})
+
+    # ---- HTTP plumbing ---------------------------------------------------
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        try:
+            request_line = await reader.readline()
+        except ValueError:  # longer than the stream limit (LimitOverrunError)
+            raise HTTPError(414, 'Request line too long')
+        if not request_line:
+            return None
+        try:
+            method, target, _version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, 'Malformed request line')
+
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADER_LINES):
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HTTPError(431, 'Header line too long')
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(431, 'Too many headers')
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(411, 'Send the body with Content-Length')
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length < 0:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length > self.max_body:
+            raise HTTPError(413, f'Body larger than {self.max_body} bytes')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target.split('?', 1)[0], headers, body
+
+    @staticmethod
+    def _head(status: int, headers: Dict[str, str]) -> bytes:
+        lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: Any,
+                    headers: Optional[Dict[str, str]] = None, content_type: str = 'application/json'):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        writer.write(self._head(status, {'Content-Type': content_type,
+                                         'Content-Length': str(len(body)),
+                                         **(headers or {})}) + body)
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._send(writer, e.status, {'error': str(e)}, {'Connection': 'close'})
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close' and not self.draining
+                try:
+                    await self.dispatch(writer, method, path, headers, body)
+                except HTTPError as e:
+                    await self._send(writer, e.status, {'error': str(e)}, e.headers)
+                    if e.headers.get('Connection') == 'close':
+                        break
+                if not keep_alive or self.draining:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    # ---- routes ----------------------------------------------------------
+
+    async def dispatch(self, writer, method: str, path: str, headers: Dict[str, str], body: bytes):
+        if path == '/health' and method == 'GET':
+            status = 503 if self.draining else 200
+            await self._send(writer, status, {'status': 'draining' if self.draining else 'ok',
+                                              'pid': os.getpid(), 'active': self.active})
+            return
+        if path == '/metrics' and method == 'GET':
+            await self._send(writer, 200, self.metrics().encode('utf-8'),
+                             content_type='text/plain; version=0.0.4')
+            return
+        if path == '/budget-quote':
+            await self._budget_quote(writer, method, body)
+            return
+        if path not in ROUTES:
+            raise HTTPError(404, f'No route {path}')
+        if method != 'POST':
+            raise HTTPError(405, 'Use POST', {'Allow': 'POST'})
+
+        try:
+            kwargs = json.loads(body or b'{}')
+        except json.JSONDecodeError as e:
+            raise HTTPError(400, f'Invalid JSON: {e}')
+        if not isinstance(kwargs, dict):
+            raise HTTPError(400, 'Body must be a JSON object')
+
+        client_method = ROUTES[path]
+        stream = bool(kwargs.pop('stream', False)) or 'text/event-stream' in headers.get('accept', '')
+        if client_method == 'analyze_image':
+            kwargs['image_path'] = self._image_path(kwargs.get('image_path'))
+
+        self.admit()
+        self.active += 1
+        self.counters['requests'] += 1
+        start = time.perf_counter()
+        try:
+            with self._request_context(headers):
+                if stream and client_method in STREAMABLE:
+                    self.counters['streams'] += 1
+                    await self._stream(writer, client_method, kwargs)
+                else:
+                    result = await self._call(client_method, kwargs)
+                    await self._send(writer, self._status(result), result)
+        finally:
+            self.active -= 1
+            self._latency.append(time.perf_counter() - start)
+
+    async def _budget_quote(self, writer, method: str, body: bytes):
+        """Open a quote session or apply a diff to one; local CPU work, no Bedrock slot"""
+        if method != 'POST':
+            raise HTTPError(405, 'Use POST', {'Allow': 'POST'})
+        if self.draining:
+            raise HTTPError(503, 'Service is shutting down', {'Retry-After': '5', 'Connection': 'close'})
+        try:
+            payload = json.loads(body or b'{}')
+        except json.JSONDecodeError as e:
+            raise HTTPError(400, f'Invalid JSON: {e}')
+
+        owner = self._session_owner(payload)
+        if owner is not None:
+            status, response = await self._forward_quote(self.peers[owner], body)
+            await self._send(writer, status, response)
+            return
+
+        from budget_session import UnknownBlock
+        try:
+            response = self.quotes.handle(payload)
+        except UnknownBlock as e:
+            # The session is fine but the diff is not: re-sending the catalog would not help
+            raise HTTPError(422, e.args[0])
+        except KeyError as e:
+            raise HTTPError(404, e.args[0] if e.args else str(e))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        await self._send(writer, 200, response)
+
+    def _session_owner(self, payload: Any) -> Optional[int]:
+        """Index of the other worker that holds the payload's session, or None to handle it here"""
+        if not self.peers or not isinstance(payload, dict) or not isinstance(payload.get('session_id'), str):
+            return None
+        owner, dot, _ = payload['session_id'].partition('.')
+        if not (dot and owner.isdigit()) or int(owner) == self.worker_id or int(owner) >= len(self.peers):
+            return None  # not a worker-issued id: handled (and refused with 404) here
+        return int(owner)
+
+    async def _forward_quote(self, peer: str, body: bytes) -> Tuple[int, bytes]:
+        """POST the /budget-quote body to the worker owning the session; its status and JSON body"""
+        try:
+            reader, writer = await asyncio.open_unix_connection(peer)
+        except OSError:
+            # That worker is gone and its sessions with it: the widget re-sends the catalog
+            raise HTTPError(404, 'Quote session expired')
+        try:
+            writer.write((f'POST /budget-quote HTTP/1.1\r\nHost: worker\r\nContent-Type: application/json\r\n'
+                          f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            return int(status_line.split()[1]), await reader.readexactly(length)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError) as e:
+            raise HTTPError(502, f'Quote session worker failed: {e}')
+        finally:
+            writer.close()
+
+    def _request_context(self, headers: Dict[str, str]):
+        priority = headers.get('x-priority')
+        if priority is not None and priority not in PRIORITIES:
+            raise HTTPError(400, f'X-Priority must be one of {PRIORITIES}')
+        deadline = None
+        if headers.get('x-deadline'):
+            try:
+                deadline = float(headers['x-deadline'])
+            except ValueError:
+                deadline = math.nan
+            if not math.isfinite(deadline):
+                raise HTTPError(400, 'X-Deadline must be a number of seconds')
+        return request_context(priority=priority, tenant=headers.get('x-tenant'), deadline=deadline)
+
+    def _image_path(self, image_path: Optional[str]) -> str:
+        """Only files under image_root can be analyzed"""
+        if not image_path:
+            raise HTTPError(400, 'image_path is required')
+        resolved = os.path.realpath(os.path.join(self.image_root, image_path))
+        if os.path.commonpath([resolved, self.image_root]) != self.image_root:
+            raise HTTPError(403, 'image_path must be inside the service image root')
+        return resolved
+
+    async def _call(self, client_method: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            if client_method == 'compare_models':
+                # Always concurrent here; sequential compare would hold a slot per model in turn
+                kwargs.setdefault('concurrent', True)
+            return await self.async_client.acall(client_method, **kwargs)
+        except TypeError as e:
+            raise HTTPError(400, str(e))
+
+    @staticmethod
+    def _status(result: Dict[str, Any]) -> int:
+        """200, or the error status: 413 for requests too large for the model, else 502"""
+        if not result.get('error'):
+            return 200
+        # Client methods report errors in the result; ClaudeResult.failure keeps the exception
+        return 413 if isinstance(getattr(result, 'exception', None), ContextTooLarge) else 502
+
+    def _stream_prompt(self, client_method: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """chat_stream arguments equivalent to a chat / advanced_reasoning / generate_code call"""
+        try:
+            if client_method == 'advanced_reasoning':
+                return {'prompt': self.client.reasoning_prompt(kwargs['problem'], kwargs.get('reasoning_type', 'analytical')),
+                        'model': kwargs.get('model', 'opus4'), 'temperature': 0.3}
+            if client_method == 'generate_code':
+                return {'prompt': self.client.code_prompt(kwargs['description'], kwargs.get('language', 'python'),
+                                                          kwargs.get('complexity', 'advanced')),
+                        'model': kwargs.get('model', 'sonnet4'), 'temperature': 0.2}
+            allowed = {'prompt', 'model', 'max_tokens', 'temperature'}
+            if 'prompt' not in kwargs or set(kwargs) - allowed:
+                raise TypeError(f"chat stream takes {sorted(allowed)}")
+            return kwargs
+        except (KeyError, TypeError) as e:
+            raise HTTPError(400, f'Bad arguments: {e}')
+
+    async def _stream(self, writer, client_method: str, kwargs: Dict[str, Any]):
+        """Server-Sent Events over chunked transfer: delta/model events, then done"""
+
+        if client_method == 'compare_models':
+            allowed = {'prompt', 'models', 'max_workers', 'timeout', 'first_n'}
+            kwargs.pop('concurrent', None)
+            if 'prompt' not in kwargs or set(kwargs) - allowed:
+                raise HTTPError(400, f'compare_models stream takes {sorted(allowed)}')
+            events = self._compare_events(kwargs)
+        else:
+            try:
+                # Built before the 200 goes out, so oversized prompts still get a 413
+                stream = self.async_client.achat_stream(**self._stream_prompt(client_method, kwargs))
+            except ContextTooLarge as e:
+                raise HTTPError(413, str(e))
+            events = self._chat_events(stream)
+
+        writer.write(self._head(200, {'Content-Type': 'text/event-stream',
+                                      'Cache-Control': 'no-cache',
+                                      'Transfer-Encoding': 'chunked'}))
+        async for event, data in events:
+            frame = f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n'.encode('utf-8')
+            writer.write(f'{len(frame):x}\r\n'.encode('latin-1') + frame + b'\r\n')
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _chat_events(self, stream):
+        async for delta in stream:
+            yield 'delta', {'text': delta}
+        result = await stream.result()
+        result.pop('response', None)  # already sent as deltas
+        yield ('error' if result.get('error') else 'done'), result
+
+    async def _compare_events(self, kwargs: Dict[str, Any]):
+        async for model, entry in self.async_client.acompare_models_iter(**kwargs):
+            yield 'model', {'model': model, **entry}
+        yield 'done', {}
+
+    # ---- metrics and lifecycle --------------------------------------------
+
+    def metrics(self) -> str:
+        lines = [
+            '# HELP claude_http_requests_total Requests accepted by the gateway',
+            '# TYPE claude_http_requests_total counter',
+            f'claude_http_requests_total {self.counters["requests"]}',
+            '# HELP claude_http_rejected_total Requests refused with 429',
+            '# TYPE claude_http_rejected_total counter',
+            f'claude_http_rejected_total {self.counters["rejected"]}',
+            '# HELP claude_http_active Requests queued or running',
+            '# TYPE claude_http_active gauge',
+            f'claude_http_active {self.active}',
+            '# HELP claude_quote_sessions Open /budget-quote sessions',
+            '# TYPE claude_quote_sessions gauge',
+            f'claude_quote_sessions {self._quotes.stats()["sessions"] if self._quotes is not None else 0}',
+        ]
+        stats = self.scheduler.stats()
+        lines += ['# HELP claude_queue_depth Requests waiting for a Bedrock slot',
+                  '# TYPE claude_queue_depth gauge']
+        lines += [f'claude_queue_depth{{priority="{p}"}} {d}' for p, d in stats['queue_depth'].items()]
+        return '\n'.join(lines) + '\n' + self.client.telemetry.to_prometheus()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080, reuse_port: bool = False):
+        """Serve until SIGTERM/SIGINT, then drain"""
+
+        self._server = await asyncio.start_server(self.handle_connection, host, port,
+                                                  reuse_port=reuse_port or None)
+        if self.peers:
+            # Reached only by the other workers, forwarding diffs for our quote sessions
+            path = self.peers[self.worker_id]
+            if os.path.exists(path):
+                os.unlink(path)
+            self._peer_server = await asyncio.start_unix_server(self.handle_connection, path)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+
+        print(f"🟢 Claude service {os.getpid()} on http://{host}:{port} "
+              f"(concurrency {self.concurrency}, queue {self.max_queue})", flush=True)
+        try:
+            await stop.wait()
+        finally:
+            await self.drain()
+
+    async def drain(self):
+        """Stop accepting, let in-flight requests finish, then close idle connections"""
+
+        self.draining = True
+        for server in (self._server, self._peer_server):
+            if server is not None:
+                server.close()
+        deadline = time.monotonic() + self.drain_timeout
+        while self.active and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for writer in list(self._connections):
+            writer.close()
+        self.async_client.close()
+        print(f"🛑 Claude service {os.getpid()} drained ({self.active} request(s) cut off)", flush=True)
+
+
+def run_worker(host: str, port: int, concurrency: int, max_queue: int, drain_timeout: float,
+               reuse_port: bool, image_root: Optional[str], fake_bedrock: bool = False,
+               worker_id: int = 0, peers: Optional[List[str]] = None):
+    runtime = None
+    if fake_bedrock:
+        from fake_bedrock import FakeBedrockRuntime
+        runtime = FakeBedrockRuntime()
+    client = Claude4Client(max_pool_connections=concurrency, bedrock_runtime=runtime)
+    service = ClaudeService(client=client, concurrency=concurrency, max_queue=max_queue,
+                            drain_timeout=drain_timeout, image_root=image_root,
+                            worker_id=worker_id, peers=peers)
+    asyncio.run(service.serve(host, port, reuse_port=reuse_port))
+
+
+def main(argv=None) -> int:
+    import argparse
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description='Async HTTP gateway for Claude4Client')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=1, help='Processes sharing the port (SO_REUSEPORT)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Bedrock calls in flight per worker')
+    parser.add_argument('--max-queue', type=int, default=64, help='Waiting requests per worker before 429')
+    parser.add_argument('--drain-timeout', type=float, default=30.0)
+    parser.add_argument('--image-root', default=None, help='Directory analyze_image may read (default: cwd)')
+    parser.add_argument('--fake-bedrock', action='store_true', help='Answer from fake_bedrock (offline testing)')
+    args = parser.parse_args(argv)
+
+    reuse_port = args.workers > 1 and hasattr(socket, 'SO_REUSEPORT')
+    worker_args = (args.host, args.port, args.concurrency, args.max_queue, args.drain_timeout,
+                   reuse_port, args.image_root, args.fake_bedrock)
+
+    if args.workers > 1 and not reuse_port:
+        print("⚠️ SO_REUSEPORT is not available here; running a single worker", flush=True)
+    if not reuse_port:
+        run_worker(*worker_args)
+        return 0
+
+    # Owner-only directory for the sockets the workers forward quote-session diffs over
+    peers_dir = tempfile.mkdtemp(prefix='claude-service-')
+    peers = [os.path.join(peers_dir, f'worker-{i}.sock') for i in range(args.workers)]
+    workers = [multiprocessing.Process(target=run_worker, args=worker_args + (i, peers), name=f'claude-service-{i}')
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+
+    def forward(signum, _frame):
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        shutil.rmtree(peers_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
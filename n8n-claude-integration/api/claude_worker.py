@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Resident worker for the Claude clients
+A local daemon keeps warm Claude4Client instances (boto3 imported, credentials
+resolved, connections kept alive between calls) and answers newline-delimited JSON
+requests over a Unix socket. The client half of this module imports only the standard library, so
+n8n "Execute Command" nodes pay milliseconds per call instead of seconds.
+
+    python claude_worker.py serve                       # foreground daemon
+    python claude_worker.py call chat '{"prompt": "Hello", "model": "haiku3.5"}'
+    echo '{"description": "CSV parser"}' | python claude_worker.py call generate_code -
+
+``call`` starts the daemon in the background if none is running. A TCP
+address needs a shared secret in CLAUDE_WORKER_TOKEN on both sides, and
+``analyze_image`` over TCP only reads files under ``--image-root``.
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+from typing import Dict, Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, and the default address is TCP there anyway
+    fcntl = None
+
+# Client methods the worker will run (same names and arguments as Claude4Client)
+METHODS = {
+    'chat', 'conversation', 'advanced_reasoning', 'analyze_image', 'generate_code',
+    'creative_writing', 'compare_models', 'get_model_recommendations',
+}
+
+# Worker-level requests
+CONTROL = {'ping', 'stats', 'shutdown'}
+
+TCP_PREFIX = 'tcp://'
+
+
+def default_address() -> str:
+    """CLAUDE_WORKER_ADDRESS, else a per-user socket in the temp directory"""
+    if os.environ.get('CLAUDE_WORKER_ADDRESS'):
+        return os.environ['CLAUDE_WORKER_ADDRESS']
+    if not hasattr(socket, 'AF_UNIX'):
+        return f'{TCP_PREFIX}127.0.0.1:8765'
+    uid = os.getuid() if hasattr(os, 'getuid') else 'user'
+    return os.path.join(tempfile.gettempdir(), f'claude-worker-{uid}.sock')
+
+
+def _connect(address: str, timeout: Optional[float]) -> socket.socket:
+    if address.startswith(TCP_PREFIX):
+        host, port = address[len(TCP_PREFIX):].rsplit(':', 1)
+        return socket.create_connection((host, int(port)), timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(address)
+    return sock
+
+
+class WorkerClient:
+    """
+    Thin client for the worker daemon (standard library only)
+
+    Usage:
+        worker = WorkerClient()
+        result = worker.chat(prompt="Estimate a login screen", model='haiku3.5')
+
+    Any method in METHODS can be called by name with the client method's
+    keyword arguments; results are the same dicts Claude4Client returns. One
+    connection is kept open and reused. With ``autostart`` a daemon is
+    spawned on first use when nothing listens on ``address``.
+    """
+
+    def __init__(self,
+                 address: Optional[str] = None,
+                 autostart: bool = True,
+                 timeout: Optional[float] = 600.0,
+                 idle_timeout: float = 1800.0,
+                 token: Optional[str] = None):
+        self.address = address or default_address()
+        self.token = token or os.environ.get('CLAUDE_WORKER_TOKEN')  # required by TCP workers
+        self.autostart = autostart
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._next_id = 0
+
+    def _open(self):
+        try:
+            self._sock = _connect(self.address, self.timeout)
+        except OSError:
+            if not self.autostart:
+                raise
+            spawn_worker(self.address, idle_timeout=self.idle_timeout, token=self.token)
+            self._sock = _connect(self.address, self.timeout)
+        self._reader = self._sock.makefile('rb')
+
+    def request(self, method: str, **kwargs) -> Dict[str, Any]:
+        """Send one request and wait for its result"""
+
+        if self._sock is None:
+            self._open()
+        self._next_id += 1
+        request = {'id': self._next_id, 'method': method, 'kwargs': kwargs}
+        if self.token:
+            request['token'] = self.token
+        line = json.dumps(request) + '\n'
+        try:
+            self._sock.sendall(line.encode('utf-8'))
+            reply = self._reader.readline()
+        except OSError:
+            self.close()
+            raise
+        if not reply:
+            self.close()
+            raise ConnectionError('Worker closed the connection')
+        return json.loads(reply)['result']
+
+    def __getattr__(self, name: str):
+        if name in METHODS or name in CONTROL:
+            return lambda **kwargs: self.request(name, **kwargs)
+        raise AttributeError(name)
+
+    def close(self):
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def spawn_worker(address: str, idle_timeout: float = 1800.0, wait: float = 30.0, token: Optional[str] = None):
+    """
+    Start a detached daemon on ``address`` and wait until it accepts connections
+
+    Clients that autostart at the same moment may each spawn one; the daemon
+    that loses the race for the address lock exits and both clients connect
+    to the winner.
+    """
+
+    log_path = os.path.join(tempfile.gettempdir(), 'claude-worker.log')
+    env = dict(os.environ, CLAUDE_WORKER_TOKEN=token) if token else None  # never on the command line
+    with open(log_path, 'ab') as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'serve',
+             '--address', address, '--idle-timeout', str(idle_timeout)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, env=env,
+            start_new_session=True, close_fds=True
+        )
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        try:
+            _connect(address, 1.0).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f'Claude worker did not start on {address}; see {log_path}')
+
+
+class WorkerServer:
+    """
+    The daemon: warm clients per (region, profile), one thread per connection
+
+    Requests are ``{"id", "method", "kwargs", "client"?}`` lines, where the
+    optional ``client`` object picks region/profile. Replies are
+    ``{"id", "result"}`` lines. With ``idle_timeout`` the daemon exits after
+    that many seconds without a request, so auto-started workers do not
+    linger forever.
+
+    A Unix socket is created owner-only and guarded by ``<socket>.lock``, so
+    only one daemon serves an address. A TCP listener refuses to start
+    without ``token`` (default CLAUDE_WORKER_TOKEN), every request must carry
+    it, and image paths must resolve under ``image_root``.
+    """
+
+    def __init__(self,
+                 address: Optional[str] = None,
+                 concurrency: int = 16,
+                 idle_timeout: Optional[float] = None,
+                 fake_bedrock: bool = False,
+                 token: Optional[str] = None,
+                 image_root: Optional[str] = None):
+        self.address = address or default_address()
+        self.token = token or os.environ.get('CLAUDE_WORKER_TOKEN')
+        self.image_root = os.path.realpath(image_root) if image_root else None
+        self.concurrency = concurrency
+        self.fake_bedrock = fake_bedrock
+        self.idle_timeout = idle_timeout
+        self.started = time.time()
+        self.served = 0
+        self.last_request = time.monotonic()
+        self._clients: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._scheduler = None
+        self._listener: Optional[socket.socket] = None
+        self._address_lock = None
+
+    def client(self, region: str = 'us-east-1', profile: Optional[str] = None):
+        """Warm Claude4Client for (region, profile), created on first use"""
+
+        key = (region, profile)
+        with self._lock:
+            if key not in self._clients:
+                from python_claude4_tools import Claude4Client
+                from request_scheduler import RequestScheduler
+
+                if self._scheduler is None:
+                    # One concurrency budget across every connection and region
+                    self._scheduler = RequestScheduler(concurrency=self.concurrency)
+                runtime = None
+                if self.fake_bedrock:
+                    from fake_bedrock import FakeBedrockRuntime
+                    runtime = FakeBedrockRuntime()
+                self._clients[key] = Claude4Client(region=region, profile=profile,
+                                                   max_pool_connections=self.concurrency,
+                                                   scheduler=self._scheduler,
+                                                   bedrock_runtime=runtime)
+            return self._clients[key]
+
+    def handle(self, request: Dict[str, Any]) -> Any:
+        method = request.get('method')
+        kwargs = request.get('kwargs') or {}
+
+        if method == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+        if method == 'stats':
+            client = self.client(**(request.get('client') or {}))
+            return {
+                'uptime_s': round(time.time() - self.started, 1),
+                'served': self.served,
+                'clients': [list(key) for key in self._clients],
+                'scheduler': self._scheduler.stats() if self._scheduler else None,
+                'telemetry': client.telemetry.summary(),
+            }
+        if method == 'shutdown':
+            self._stop.set()
+            return {'ok': True}
+        if method not in METHODS:
+            return {'error': f"Unknown method '{method}'", 'methods': sorted(METHODS)}
+        if method == 'analyze_image' and not self._readable(kwargs.get('image_path')):
+            return {'error': 'image_path is outside the worker image root', 'image_path': kwargs.get('image_path')}
+
+        client = self.client(**(request.get('client') or {}))
+        try:
+            return getattr(client, method)(**kwargs)
+        except TypeError as e:
+            # Wrong argument names: report like the client methods report errors
+            return {'error': str(e)}
+
+    def _readable(self, path: Any) -> bool:
+        """Whether a requested image may be read: under image_root, or anywhere on a Unix socket without one"""
+        if self.image_root is None:
+            return not self.address.startswith(TCP_PREFIX)
+        if not isinstance(path, str):
+            return False
+        path = os.path.realpath(path)
+        return os.path.commonpath([path, self.image_root]) == self.image_root
+
+    def _authorized(self, request: Dict[str, Any]) -> bool:
+        if not self.token:
+            return True
+        return hmac.compare_digest(str(request.get('token', '')).encode(), self.token.encode())
+
+    def _serve_connection(self, conn: socket.socket):
+        with conn, conn.makefile('rb') as reader:
+            for line in reader:
+                if not line.strip():
+                    continue
+                self.last_request = time.monotonic()
+                try:
+                    request = json.loads(line)
+                    if self._authorized(request):
+                        result = self.handle(request)
+                    else:
+                        result = {'error': 'Invalid or missing worker token'}
+                except Exception as e:
+                    request, result = {}, {'error': f'{type(e).__name__}: {e}'}
+                with self._lock:
+                    self.served += 1
+                reply = json.dumps({'id': request.get('id'), 'result': result}, default=str) + '\n'
+                try:
+                    conn.sendall(reply.encode('utf-8'))
+                except OSError:
+                    return
+                if self._stop.is_set():
+                    return
+
+    def _lock_address(self):
+        """Hold ``<socket>.lock`` for the daemon's lifetime; fails if another daemon holds it"""
+        if fcntl is None:
+            return
+        lock_file = open(self.address + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(f'A Claude worker is already running on {self.address}')
+        self._address_lock = lock_file
+
+    def _bind(self) -> socket.socket:
+        if self.address.startswith(TCP_PREFIX):
+            if not self.token:
+                raise RuntimeError('A TCP worker needs a shared token: set CLAUDE_WORKER_TOKEN')
+            host, port = self.address[len(TCP_PREFIX):].rsplit(':', 1)
+            listener = socket.create_server((host, int(port)))
+        else:
+            self._lock_address()
+            if os.path.exists(self.address):
+                try:
+                    # Only a socket nothing answers on is stale (e.g. left by a worker without the lock)
+                    _connect(self.address, 1.0).close()
+                    raise RuntimeError(f'A Claude worker is already listening on {self.address}')
+                except (ConnectionRefusedError, FileNotFoundError):
+                    os.unlink(self.address)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # Owner-only from the moment it exists, instead of chmod after bind
+            umask = os.umask(0o177)
+            try:
+                listener.bind(self.address)
+            finally:
+                os.umask(umask)
+            listener.listen(128)
+        listener.settimeout(1.0)
+        return listener
+
+    def serve_forever(self):
+        self._listener = self._bind()
+        # Warm up before the first request: imports, credentials, connection pool
+        self.client()
+        print(f"🟢 Claude worker {os.getpid()} listening on {self.address}", flush=True)
+
+        try:
+            while not self._stop.is_set():
+                if self.idle_timeout and time.monotonic() - self.last_request > self.idle_timeout:
+                    print("💤 Idle timeout reached, shutting down", flush=True)
+                    break
+                try:
+                    conn, _ = self._listener.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self._listener.close()
+            if not self.address.startswith(TCP_PREFIX) and os.path.exists(self.address):
+                os.unlink(self.address)
+            if self._address_lock is not None:
+                self._address_lock.close()
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Resident Claude worker and its thin client')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help='Run the worker daemon in the foreground')
+    serve.add_argument('--address', default=None, help='Socket path or tcp://host:port')
+    serve.add_argument('--concurrency', type=int, default=16, help='Max Bedrock calls in flight')
+    serve.add_argument('--idle-timeout', type=float, default=None, help='Exit after this many idle seconds')
+    serve.add_argument('--fake-bedrock', action='store_true', help='Answer from fake_bedrock (offline testing)')
+    serve.add_argument('--image-root', default=None, help='Only read analyze_image files under this directory')
+
+    call = sub.add_parser('call', help='Send one request (starts the worker if needed)')
+    call.add_argument('method', help=f"One of: {', '.join(sorted(METHODS | CONTROL))}")
+    call.add_argument('kwargs', nargs='?', default='{}', help="JSON object of arguments, or '-' for stdin")
+    call.add_argument('--address', default=None)
+    call.add_argument('--no-autostart', action='store_true')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        WorkerServer(args.address, args.concurrency, args.idle_timeout, args.fake_bedrock,
+                     image_root=args.image_root).serve_forever()
+        return 0
+
+    kwargs = json.loads(sys.stdin.read() if args.kwargs == '-' else args.kwargs)
+    with WorkerClient(args.address, autostart=not args.no_autostart) as worker:
+        result = worker.request(args.method, **kwargs)
+    json.dump(result, sys.stdout, ensure_ascii=False)
+    sys.stdout.write('\n')
+    return 1 if isinstance(result, dict) and result.get('error') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Token estimation and context-window packing
+Estimates request size locally, trims (or summarizes) old turns so a request fits the
+model's context window, caps max_tokens to what is left, and rejects requests that
+cannot fit before they cost a round trip
+"""
+
+import json
+import math
+from collections import defaultdict
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable
+
+from bedrock_telemetry import MODEL_PRICES
+
+# (context window, max output tokens) per Bedrock model id
+MODEL_LIMITS: Dict[str, Tuple[int, int]] = {
+    'anthropic.claude-opus-4-1-20250805-v1:0': (200_000, 32_000),
+    'anthropic.claude-opus-4-20250514-v1:0': (200_000, 32_000),
+    'anthropic.claude-sonnet-4-20250514-v1:0': (200_000, 64_000),
+    'anthropic.claude-3-7-sonnet-20250219-v1:0': (200_000, 64_000),
+    'anthropic.claude-3-5-sonnet-20241022-v2:0': (200_000, 8_192),
+    'anthropic.claude-3-5-sonnet-20240620-v1:0': (200_000, 8_192),
+    'anthropic.claude-3-5-haiku-20241022-v1:0': (200_000, 8_192),
+    'anthropic.claude-3-opus-20240229-v1:0': (200_000, 4_096),
+    'anthropic.claude-3-sonnet-20240229-v1:0': (200_000, 4_096),
+    'anthropic.claude-3-haiku-20240307-v1:0': (200_000, 4_096),
+}
+
+# Used for model ids missing from MODEL_LIMITS
+DEFAULT_LIMITS = (200_000, 4_096)
+
+# Claude's tokenizer averages ~3.5-4 characters per token on English and code;
+# the lower figure errs towards overestimating
+CHARS_PER_TOKEN = 3.5
+
+# Per-message and per-request framing (role markers, separators)
+MESSAGE_OVERHEAD = 4
+REQUEST_OVERHEAD = 10
+
+# Claude bills images at ~(width * height) / 750 tokens after rescaling to a
+# 1568px long edge, which tops out around this many tokens
+IMAGE_TOKENS = 1600
+
+# Bedrock refuses images over 3.75 MB, i.e. ~5 MB once base64-encoded
+MAX_IMAGE_BASE64 = 5 * 1024 * 1024
+
+# Batch inference is billed at half the on-demand price
+BATCH_DISCOUNT = 0.5
+
+SUMMARY_HEADER = 'Summary of the earlier conversation:'
+
+
+class ContextTooLarge(ValueError):
+    """The request cannot fit the model's context window (or an image is too big)"""
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Upper-leaning token estimate for a string"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def estimate_content_tokens(content: Any) -> int:
+    """Tokens of a message's content: a string or a list of content blocks"""
+
+    if isinstance(content, str):
+        return estimate_text_tokens(content)
+
+    tokens = 0
+    for block in content or []:
+        kind = block.get('type')
+        if kind == 'text':
+            tokens += estimate_text_tokens(block.get('text', ''))
+        elif kind == 'image':
+            tokens += IMAGE_TOKENS
+        else:
+            # tool_use / tool_result / documents: count their JSON
+            tokens += estimate_text_tokens(json.dumps(block, default=str))
+    return tokens
+
+
+def estimate_request_tokens(body: Dict[str, Any]) -> int:
+    """Input tokens of a Messages request body (system prompt + messages)"""
+
+    tokens = REQUEST_OVERHEAD + estimate_content_tokens(body.get('system') or [])
+    for message in body.get('messages', []):
+        tokens += MESSAGE_OVERHEAD + estimate_content_tokens(message.get('content'))
+    return tokens
+
+
+def check_images(body: Dict[str, Any]):
+    """Raise ContextTooLarge for image blocks Bedrock would refuse"""
+
+    for message in body.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            continue
+        for block in content or []:
+            source = block.get('source') or {}
+            if block.get('type') == 'image' and len(source.get('data', '')) > MAX_IMAGE_BASE64:
+                raise ContextTooLarge(
+                    f"Image payload is {len(source['data']) / 1024 / 1024:.1f} MB base64, "
+                    f"over Bedrock's {MAX_IMAGE_BASE64 // 1024 // 1024} MB limit; downscale it first"
+                )
+
+
+def _starts_with_tool_result(message: Dict[str, Any]) -> bool:
+    content = message.get('content')
+    return isinstance(content, list) and bool(content) and content[0].get('type') == 'tool_result'
+
+
+class ContextPacker:
+    """
+    Fits request bodies to the model's context window
+
+    ``pack`` caps ``max_tokens`` at the model's output limit, and when the
+    estimated input leaves less than ``min_output`` tokens of room, drops the
+    oldest turns (whole user/assistant exchanges, never the latest user
+    message, never a tool_result cut off from its tool_use). With a
+    ``summarize`` callable the dropped turns are replaced by its summary,
+    prepended to the first kept user message. What is left for output becomes
+    the new ``max_tokens``. If even the latest turn alone does not fit,
+    ContextTooLarge is raised without calling Bedrock.
+    """
+
+    def __init__(self,
+                 limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                 min_output: int = 1024,
+                 margin: float = 0.02,
+                 summarize: Optional[Callable[[List[Dict[str, Any]]], Optional[str]]] = None,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.limits = limits or MODEL_LIMITS
+        self.min_output = min_output
+        self.margin = margin
+        self.summarize = summarize
+        self.prices = prices or MODEL_PRICES
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    def model_limits(self, model_id: str) -> Tuple[int, int]:
+        """(usable context tokens, max output tokens) for a model id"""
+        context, max_output = self.limits.get(model_id, DEFAULT_LIMITS)
+        return int(context * (1 - self.margin)), max_output
+
+    def pack(self, model_id: str, body: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Body that fits ``model_id`` and a report of what was changed
+
+        The caller's body and message list are not modified. The report has
+        input_tokens (estimate), max_tokens, capped (max_tokens was lowered),
+        dropped_messages and summarized.
+        """
+
+        check_images(body)
+        context, max_output = self.model_limits(model_id)
+        requested = body.get('max_tokens', max_output)
+        messages = body.get('messages', [])
+        report = {'input_tokens': estimate_request_tokens(body), 'max_tokens': requested,
+                  'capped': False, 'dropped_messages': 0, 'summarized': False}
+
+        wanted_output = min(requested, max_output, self.min_output)
+        if report['input_tokens'] + wanted_output > context:
+            messages, report = self._trim(body, messages, context - wanted_output, report)
+
+        max_tokens = min(requested, max_output, context - report['input_tokens'])
+        if max_tokens < requested:
+            report['capped'] = True
+            self.counters['capped'] += 1
+        report['max_tokens'] = max_tokens
+        if not report['capped'] and not report['dropped_messages']:
+            return body, report
+        return {**body, 'messages': messages, 'max_tokens': max_tokens}, report
+
+    def _trim(self, body, messages, budget: int, report) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Drop the oldest turns until the input fits ``budget`` tokens"""
+
+        fixed = REQUEST_OVERHEAD + estimate_content_tokens(body.get('system') or [])
+        sizes = [MESSAGE_OVERHEAD + estimate_content_tokens(m.get('content')) for m in messages]
+
+        # Cut points: user messages that can start a conversation, oldest first
+        cuts = [i for i, m in enumerate(messages)
+                if i > 0 and m.get('role') == 'user' and not _starts_with_tool_result(m)]
+        for cut in cuts:
+            kept = fixed + sum(sizes[cut:])
+            if kept > budget:
+                continue
+
+            kept_messages = list(messages[cut:])
+            summarized = False
+            if self.summarize is not None:
+                summary = self.summarize(messages[:cut])
+                if summary:
+                    with_summary = self._prepend(kept_messages[0], f'{SUMMARY_HEADER}\n{summary}')
+                    extra = estimate_content_tokens(with_summary['content']) - estimate_content_tokens(kept_messages[0]['content'])
+                    if kept + extra <= budget:
+                        kept_messages[0] = with_summary
+                        kept += extra
+                        summarized = True
+
+            self.counters['trimmed'] += 1
+            self.counters['dropped_messages'] += cut
+            return kept_messages, {**report, 'input_tokens': kept, 'dropped_messages': cut, 'summarized': summarized}
+
+        self.counters['rejected'] += 1
+        raise ContextTooLarge(
+            f"Request needs ~{report['input_tokens']} input tokens, but only {budget} fit "
+            f"while leaving room for output, even after dropping older turns"
+        )
+
+    @staticmethod
+    def _prepend(message: Dict[str, Any], text: str) -> Dict[str, Any]:
+        content = message['content']
+        blocks = [{'type': 'text', 'text': content}] if isinstance(content, str) else list(content)
+        return {**message, 'content': [{'type': 'text', 'text': text}] + blocks}
+
+    def estimate_cost(self,
+                      requests: Iterable[Tuple[str, Dict[str, Any]]],
+                      expected_output: Optional[Dict[str, float]] = None,
+                      discount: float = 1.0) -> Dict[str, Any]:
+        """
+        Cost estimate for (model_id, body) pairs before any is sent
+
+        Input tokens are estimated from the bodies. ``max_cost_usd`` assumes
+        every response uses its full max_tokens; ``expected_cost_usd`` uses
+        ``expected_output[model_id]`` (e.g. telemetry's mean output tokens)
+        when given, else the same worst case. Requests that cannot fit are
+        counted under ``rejected`` instead of priced. Pass
+        ``discount=BATCH_DISCOUNT`` for batch inference.
+        """
+
+        expected_output = expected_output or {}
+        per_model: Dict[str, Dict[str, Any]] = {}
+        rejected = 0
+        for model_id, body in requests:
+            try:
+                body, report = self.pack(model_id, body)
+            except ContextTooLarge:
+                rejected += 1
+                continue
+            input_price, output_price = self.prices.get(model_id, (0.0, 0.0))
+            output = min(report['max_tokens'], expected_output.get(model_id, report['max_tokens']))
+            entry = per_model.setdefault(model_id, defaultdict(float))
+            entry['requests'] += 1
+            entry['input_tokens'] += report['input_tokens']
+            entry['max_output_tokens'] += report['max_tokens']
+            entry['expected_cost_usd'] += (report['input_tokens'] * input_price + output * output_price) * discount / 1_000_000
+            entry['max_cost_usd'] += (report['input_tokens'] * input_price + report['max_tokens'] * output_price) * discount / 1_000_000
+
+        models = {model_id: {key: (round(value, 6) if 'cost' in key else int(value)) for key, value in entry.items()}
+                  for model_id, entry in per_model.items()}
+        return {
+            'requests': sum(entry['requests'] for entry in models.values()),
+            'rejected': rejected,
+            'input_tokens': sum(entry['input_tokens'] for entry in models.values()),
+            'expected_cost_usd': round(sum(entry['expected_cost_usd'] for entry in models.values()), 6),
+            'max_cost_usd': round(sum(entry['max_cost_usd'] for entry in models.values()), 6),
+            'models': models,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+
+def model_summarizer(client, model: str = 'haiku3.5', max_tokens: int = 400,
+                     max_chars: int = 200_000) -> Callable[[List[Dict[str, Any]]], Optional[str]]:
+    """
+    ``summarize`` callable for ContextPacker that asks a cheap model
+
+    Returns None (plain trimming) when the summary call fails.
+    """
+
+    def summarize(messages: List[Dict[str, Any]]) -> Optional[str]:
+        lines = []
+        for message in messages:
+            content = message.get('content')
+            text = content if isinstance(content, str) else ' '.join(
+                block.get('text', '') for block in content or [] if block.get('type') == 'text')
+            lines.append(f"{message.get('role', 'user')}: {text}")
+        transcript = '\n'.join(lines)[-max_chars:]
+        result = client.chat(
+            f"Summarize this conversation in a few sentences, keeping names, numbers and decisions:\n\n{transcript}",
+            model=model, max_tokens=max_tokens, temperature=0.0
+        )
+        return None if result.get('error') else result.get('response')
+
+    return summarize
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the bedrock-runtime client
+Answers invoke_model / invoke_model_with_response_stream with configurable latency,
+throttling and response size, so the Claude clients can be exercised offline
+"""
+
+import io
+import json
+import time
+import random
+import threading
+from typing import Dict, Any, Optional
+
+from botocore.exceptions import ClientError
+
+
+class FakeBedrockRuntime:
+    """
+    Drop-in replacement for ``boto3.client('bedrock-runtime')`` in benchmarks
+
+    Each call sleeps ``latency`` (+/- ``jitter`` as a fraction) before the
+    first byte and ``per_token_latency`` per generated token, raises a
+    ThrottlingException with probability ``throttle_rate`` (or when more than
+    ``max_concurrency`` calls are in flight), and returns ``output_tokens``
+    words of text.
+    """
+
+    def __init__(self,
+                 latency: float = 0.05,
+                 per_token_latency: float = 0.0002,
+                 jitter: float = 0.2,
+                 throttle_rate: float = 0.0,
+                 output_tokens: int = 200,
+                 max_concurrency: Optional[int] = None,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.per_token_latency = per_token_latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.output_tokens = output_tokens
+        self.max_concurrency = max_concurrency
+        self.calls = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _admit(self, operation: str):
+        with self._lock:
+            self.calls += 1
+            throttle = self._random.random() < self.throttle_rate
+            if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+                throttle = True
+            if throttle:
+                self.throttled += 1
+                raise ClientError(
+                    {'Error': {'Code': 'ThrottlingException', 'Message': 'Too many requests (fake)'}},
+                    operation
+                )
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return self._random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _usage(self, body: str) -> Dict[str, int]:
+        return {'input_tokens': max(1, len(body) // 4), 'output_tokens': self.output_tokens}
+
+    def _text(self) -> str:
+        return ' '.join(['lorem'] * self.output_tokens)
+
+    def invoke_model(self, modelId: str, body: str, **kwargs) -> Dict[str, Any]:
+        scale = self._admit('InvokeModel')
+        try:
+            time.sleep((self.latency + self.per_token_latency * self.output_tokens) * scale)
+            payload = {
+                'id': 'msg_fake',
+                'type': 'message',
+                'role': 'assistant',
+                'model': modelId,
+                'content': [{'type': 'text', 'text': self._text()}],
+                'stop_reason': 'end_turn',
+                'usage': self._usage(body),
+            }
+            return {'body': io.BytesIO(json.dumps(payload).encode('utf-8')), 'contentType': 'application/json'}
+        finally:
+            self._release()
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, **kwargs) -> Dict[str, Any]:
+        scale = self._admit('InvokeModelWithResponseStream')
+        usage = self._usage(body)
+
+        def events():
+            try:
+                time.sleep(self.latency * scale)
+                yield self._event({'type': 'message_start',
+                                   'message': {'usage': {'input_tokens': usage['input_tokens'], 'output_tokens': 1}}})
+                yield self._event({'type': 'content_block_start', 'index': 0,
+                                   'content_block': {'type': 'text', 'text': ''}})
+                for _ in range(self.output_tokens):
+                    time.sleep(self.per_token_latency * scale)
+                    yield self._event({'type': 'content_block_delta', 'index': 0,
+                                       'delta': {'type': 'text_delta', 'text': 'lorem '}})
+                yield self._event({'type': 'content_block_stop', 'index': 0})
+                yield self._event({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                                   'usage': {'output_tokens': usage['output_tokens']}})
+                yield self._event({'type': 'message_stop'})
+            finally:
+                self._release()
+
+        return {'body': events(), 'contentType': 'application/json'}
+
+    @staticmethod
+    def _event(data: Dict[str, Any]) -> Dict[str, Any]:
+        return {'chunk': {'bytes': json.dumps(data).encode('utf-8')}}
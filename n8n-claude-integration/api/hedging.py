@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Hedged requests and multi-region failover for bedrock-runtime
+When a call has produced no first byte after the observed p95, a duplicate goes to
+another region (or a compatible model) and whichever answers first wins
+"""
+
+import time
+import random
+import threading
+import itertools
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, List, Tuple
+
+from bedrock_clients import get_bedrock_runtime, DEFAULT_POOL_SIZE
+from bedrock_resilience import classify_error
+from bedrock_telemetry import percentile
+
+
+class RegionHealth:
+    """Exponentially weighted first-byte latency and failure rate of one region"""
+
+    def __init__(self, alpha: float = 0.2, initial_latency: float = 1.0):
+        self.alpha = alpha
+        self.latency = initial_latency
+        self.failure_rate = 0.0
+        self.attempts = 0
+
+    def observe(self, latency: Optional[float], failed: bool):
+        self.attempts += 1
+        self.failure_rate += self.alpha * ((1.0 if failed else 0.0) - self.failure_rate)
+        if latency is not None and not failed:
+            self.latency += self.alpha * (latency - self.latency)
+
+    @property
+    def weight(self) -> float:
+        # Squared success rate punishes a failing region harder than a slow one
+        return (1.0 - self.failure_rate) ** 2 / max(self.latency, 0.05)
+
+
+class HedgedRuntime:
+    """
+    bedrock-runtime facade that hedges and fails over across regions
+
+    Exposes ``invoke_model`` and ``invoke_model_with_response_stream`` like a
+    boto3 client, so Claude4Client, ChatStream and the batch backend use it
+    unchanged. The primary region is drawn by health weight (so a recovering
+    region still sees some traffic). If it has not answered after the
+    ``quantile`` of recent first-byte times for that model, a hedge is sent
+    to the healthiest other region, or to ``fallback_models[model_id]`` when
+    there is no other region. Throttling and transient errors fail over at
+    once instead of waiting. For streams the first event counts as the first
+    byte. Bedrock calls cannot be aborted mid-flight, so the losing attempt
+    is closed when it returns and its output discarded; a hedge costs one
+    extra request, which at the p95 threshold is about 5% of calls.
+
+    The hedge timer starts when an attempt actually runs, so calls queued
+    behind a busy pool are not hedged for waiting. Callers with a concurrency
+    budget pass ``hedge_slot`` (e.g. RequestScheduler.try_slot): every attempt
+    that would run alongside another needs a slot from it, and when none is
+    free the hedge is skipped rather than queued (counted as ``hedges_refused``).
+    """
+
+    def __init__(self,
+                 runtimes: Dict[str, Any],
+                 quantile: float = 0.95,
+                 initial_delay: float = 2.0,
+                 min_delay: float = 0.05,
+                 max_delay: float = 30.0,
+                 min_samples: int = 20,
+                 window: int = 500,
+                 max_hedges: int = 1,
+                 fallback_models: Optional[Dict[str, str]] = None,
+                 max_workers: int = 32,
+                 seed: Optional[int] = None):
+        if not runtimes:
+            raise ValueError('HedgedRuntime needs at least one region')
+        self.runtimes = dict(runtimes)
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+        self.fallback_models = fallback_models or {}
+        self.health = {region: RegionHealth() for region in self.runtimes}
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._first_byte: Dict[Tuple[str, str], deque] = defaultdict(lambda: deque(maxlen=window))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+
+    @classmethod
+    def for_regions(cls,
+                    regions: List[str],
+                    profile: Optional[str] = None,
+                    max_pool_connections: int = DEFAULT_POOL_SIZE,
+                    **kwargs) -> 'HedgedRuntime':
+        """HedgedRuntime over the shared bedrock-runtime clients of ``regions``"""
+        return cls({region: get_bedrock_runtime(region, profile, max_pool_connections) for region in regions},
+                   **kwargs)
+
+    def threshold(self, operation: str, model_id: str) -> float:
+        """Seconds to wait for a first byte before hedging"""
+        with self._lock:
+            samples = sorted(self._first_byte[(operation, model_id)])
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return min(self.max_delay, max(self.min_delay, percentile(samples, self.quantile)))
+
+    def _targets(self, model_id: str) -> List[Tuple[str, str]]:
+        """(region, model_id) attempts in order: weighted primary, then healthiest first"""
+
+        with self._lock:
+            weights = {region: health.weight for region, health in self.health.items()}
+            regions = list(weights)
+            primary = self._random.choices(regions, weights=[weights[r] for r in regions])[0]
+
+        others = sorted((r for r in regions if r != primary), key=lambda r: weights[r], reverse=True)
+        targets = [(primary, model_id)] + [(region, model_id) for region in others]
+        if model_id in self.fallback_models:
+            targets.append((others[0] if others else primary, self.fallback_models[model_id]))
+        return targets
+
+    def _observe(self, region: str, latency: Optional[float], failed: bool):
+        with self._lock:
+            self.health[region].observe(latency, failed)
+
+    def _call(self, operation: str, model_id: str, attempt, hedge_slot=None) -> Dict[str, Any]:
+        """Run ``attempt(runtime, model_id)`` with hedging; returns the winning response"""
+
+        targets = self._targets(model_id)
+        limit = min(len(targets), 1 + self.max_hedges)
+        threshold = self.threshold(operation, model_id)
+        futures = {}
+        started: Dict[int, float] = {}
+        errors: List[Exception] = []
+
+        def launch(index: int, slot=None):
+            """Start attempt ``index`` on the pool and return its future"""
+            region, target_model = targets[index]
+
+            def run():
+                launched = started[index] = time.perf_counter()
+                try:
+                    response = attempt(self.runtimes[region], target_model)
+                except Exception:
+                    self._observe(region, None, failed=True)
+                    raise
+                first_byte = time.perf_counter() - launched
+                self._observe(region, first_byte, failed=False)
+                return response, first_byte
+
+            if slot is not None:
+                slot.__enter__()
+            future = self._executor.submit(run)
+            if slot is not None:
+                # Released when the attempt ends, or when it is cancelled before it ran
+                future.add_done_callback(lambda _: slot.__exit__(None, None, None))
+            futures[future] = index
+            return future
+
+        def launch_next(counter: str):
+            slot = None
+            if pending and hedge_slot is not None:
+                # Runs alongside another attempt, so it needs its own slot
+                slot = hedge_slot()
+                if slot is None:
+                    with self._lock:
+                        self.counters['hedges_refused'] += 1
+                    return False
+            with self._lock:
+                self.counters[counter] += 1
+            pending.add(launch(len(futures), slot))
+            return True
+
+        with self._lock:
+            self.counters['calls'] += 1
+        pending = {launch(0)}
+        hedging = True
+
+        while pending:
+            last_start = started.get(len(futures) - 1)
+            if not (hedging and len(futures) < limit):
+                wait_for = None
+            elif last_start is None:
+                # Still queued in the pool: a hedge would queue behind it too
+                wait_for = threshold
+            else:
+                wait_for = max(0.0, last_start + threshold - time.perf_counter())
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # No first byte within the threshold of the latest attempt starting: hedge
+                if started.get(len(futures) - 1) is not None:
+                    hedging = launch_next('hedges')
+                continue
+
+            failover = False
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    return self._finish(operation, model_id, targets, futures, future, pending)
+                errors.append(error)
+                # Bad requests fail everywhere; only throttling/transient errors move on
+                failover = failover or classify_error(error) != 'fatal'
+
+            if failover and len(futures) < limit:
+                hedging = launch_next('failovers') and hedging
+
+        raise errors[0]
+
+    def _finish(self, operation, model_id, targets, futures, winner, pending) -> Dict[str, Any]:
+        response, first_byte = winner.result()
+        index = futures[winner]
+        region, target_model = targets[index]
+        self._discard(pending)
+
+        with self._lock:
+            if target_model == model_id:
+                self._first_byte[(operation, model_id)].append(first_byte)
+            if index > 0:
+                self.counters['hedge_wins'] += 1
+
+        response['region'] = region
+        response['hedged'] = len(futures) > 1
+        if target_model != model_id:
+            response['model_id'] = target_model
+        return response
+
+    @staticmethod
+    def _discard(pending):
+        """Close losing attempts as they return; their output is never read"""
+
+        def close(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            response, _ = future.result()
+            body = response.get('body')
+            if hasattr(body, 'close'):
+                body.close()
+
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(close)
+
+    def invoke_model(self, modelId: str, body: str, hedge_slot=None, **kwargs) -> Dict[str, Any]:
+        def attempt(runtime, model_id):
+            return runtime.invoke_model(modelId=model_id, body=body, **kwargs)
+        return self._call('invoke_model', modelId, attempt, hedge_slot)
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, hedge_slot=None,
+                                          **kwargs) -> Dict[str, Any]:
+        def attempt(runtime, model_id):
+            response = runtime.invoke_model_with_response_stream(modelId=model_id, body=body, **kwargs)
+            # Wait for the first event inside the attempt so it is what gets hedged
+            stream = response['body']
+            events = iter(stream)
+            first = next(events, None)
+            response['body'] = _PeekedStream(stream, itertools.chain([first] if first else [], events))
+            return response
+        return self._call('invoke_model_with_response_stream', modelId, attempt, hedge_slot)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **dict(self.counters),
+                'regions': {region: {'weight': round(health.weight, 4),
+                                     'first_byte_ewma': round(health.latency, 4),
+                                     'failure_rate': round(health.failure_rate, 4),
+                                     'attempts': health.attempts}
+                            for region, health in self.health.items()},
+                'thresholds': {f'{operation}/{model_id}': percentile(sorted(samples), self.quantile)
+                               for (operation, model_id), samples in self._first_byte.items()},
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _PeekedStream:
+    """Event stream whose first event was already read during hedging"""
+
+    def __init__(self, stream, events):
+        self._stream = stream
+        self._events = events
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        if hasattr(self._stream, 'close'):
+            self._stream.close()
+
+
+_hedged: Dict[Tuple[Tuple[str, ...], Optional[str]], HedgedRuntime] = {}
+_hedged_lock = threading.Lock()
+
+
+def get_hedged_runtime(regions: List[str],
+                       profile: Optional[str] = None,
+                       max_pool_connections: int = DEFAULT_POOL_SIZE) -> HedgedRuntime:
+    """Shared HedgedRuntime per region list/profile, so region health is learned once per process"""
+    key = (tuple(regions), profile)
+    with _hedged_lock:
+        if key not in _hedged:
+            _hedged[key] = HedgedRuntime.for_regions(list(regions), profile, max_pool_connections)
+        return _hedged[key]
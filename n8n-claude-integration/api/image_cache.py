@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Image preparation for Claude vision calls
+Content-addressed cache of base64 payloads, magic-byte media types and optional downscaling
+"""
+
+import io
+import os
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, NamedTuple, Tuple
+
+try:
+    from PIL import Image  # Optional: only needed for downscaling
+except ImportError:
+    Image = None
+
+
+MAGIC_NUMBERS = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+EXTENSION_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
+PIL_FORMATS = {'image/png': 'PNG', 'image/jpeg': 'JPEG', 'image/webp': 'WEBP'}
+
+# Claude rescales anything with a longer edge than this, so sending more is wasted bytes
+CLAUDE_MAX_EDGE = 1568
+
+
+def detect_media_type(header: bytes, image_path: str = '') -> str:
+    """Media type from the file's magic bytes, falling back to its extension"""
+
+    for magic, media_type in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return media_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+
+    return EXTENSION_TYPES.get(os.path.splitext(image_path)[1].lower(), 'image/jpeg')
+
+
+class PreparedImage(NamedTuple):
+    data: str          # base64 payload, ready for the request body
+    media_type: str
+    digest: str        # content hash of the original file
+    resized: bool
+
+
+class ImageCache:
+    """
+    LRU cache of base64 image payloads, capped at ``max_bytes``
+
+    Files are recognised by (path, size, mtime) so a repeat call skips the
+    read entirely, and by content hash so the same picture under two paths is
+    encoded once. With Pillow installed, images larger than ``max_edge`` are
+    downscaled before encoding.
+    """
+
+    def __init__(self,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 max_edge: Optional[int] = CLAUDE_MAX_EDGE,
+                 jpeg_quality: int = 85):
+        self.max_bytes = max_bytes
+        self.max_edge = max_edge
+        self.jpeg_quality = jpeg_quality
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'resized': 0}
+        self._entries: 'OrderedDict[str, PreparedImage]' = OrderedDict()
+        self._stat_index: Dict[Tuple, str] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, image_path: str) -> PreparedImage:
+        """Base64 payload and media type for an image file"""
+
+        st = os.stat(image_path)
+        stat_key = (os.path.abspath(image_path), st.st_size, st.st_mtime_ns)
+
+        with self._lock:
+            cached = self._lookup(self._stat_index.get(stat_key))
+            if cached is not None:
+                return cached
+
+        with open(image_path, 'rb') as image_file:
+            raw = image_file.read()
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+        with self._lock:
+            cached = self._lookup(digest)
+            if cached is not None:
+                self._stat_index[stat_key] = digest
+                return cached
+            self.counters['misses'] += 1
+
+        media_type = detect_media_type(raw[:16], image_path)
+        raw, media_type, resized = self._downscale(raw, media_type)
+        prepared = PreparedImage(base64.b64encode(raw).decode('ascii'), media_type, digest, resized)
+        del raw
+
+        with self._lock:
+            if resized:
+                self.counters['resized'] += 1
+            self._store(stat_key, prepared)
+
+        return prepared
+
+    def _lookup(self, digest: Optional[str]) -> Optional[PreparedImage]:
+        if digest is None or digest not in self._entries:
+            return None
+        self._entries.move_to_end(digest)
+        self.counters['hits'] += 1
+        return self._entries[digest]
+
+    def _store(self, stat_key: Tuple, prepared: PreparedImage):
+        size = len(prepared.data)
+        if size > self.max_bytes or prepared.digest in self._entries:
+            return
+
+        self._entries[prepared.digest] = prepared
+        self._stat_index[stat_key] = prepared.digest
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            digest, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.data)
+            self.counters['evictions'] += 1
+            for key in [k for k, d in self._stat_index.items() if d == digest]:
+                del self._stat_index[key]
+
+    def _downscale(self, raw: bytes, media_type: str):
+        """Shrink to ``max_edge`` on the longer side; returns (bytes, media_type, resized)"""
+
+        if Image is None or self.max_edge is None or media_type not in PIL_FORMATS:
+            return raw, media_type, False
+
+        try:
+            with Image.open(io.BytesIO(raw)) as image:
+                if max(image.size) <= self.max_edge:
+                    return raw, media_type, False
+
+                image.thumbnail((self.max_edge, self.max_edge))
+                output = io.BytesIO()
+                save_format = PIL_FORMATS[media_type]
+                if save_format == 'JPEG':
+                    image.convert('RGB').save(output, 'JPEG', quality=self.jpeg_quality, optimize=True)
+                elif save_format == 'WEBP':
+                    image.save(output, 'WEBP', quality=self.jpeg_quality)
+                else:
+                    image.save(output, 'PNG', optimize=True)
+        except (OSError, ValueError):
+            # Unreadable by Pillow: send the original and let Bedrock decide
+            return raw, media_type, False
+
+        return output.getvalue(), media_type, True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stat_index.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, 'entries': len(self._entries), 'bytes': self._bytes}
+
+
+_shared_cache: Optional[ImageCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_image_cache() -> ImageCache:
+    """Process-wide ImageCache used by clients that are not given their own"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ImageCache()
+        return _shared_cache
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Latency- and cost-aware model routing for model='auto'
+Picks the cheapest capable tier that currently meets the caller's latency SLO and
+per-call budget, using the live p95, error and throttle rates from telemetry
+"""
+
+import threading
+from typing import Dict, Any, Optional, List
+
+from bedrock_telemetry import MODEL_PRICES
+
+# Capability tiers, cheapest first; within a tier the first model is preferred
+MODEL_TIERS: List[List[str]] = [
+    ['haiku3.5', 'haiku'],
+    ['sonnet4', 'sonnet3.7', 'sonnet3.5v2', 'sonnet3.5', 'sonnet'],
+    ['opus4.1', 'opus4', 'opus'],
+]
+
+# Lowest tier each method is routed to unless the caller lowers it
+METHOD_MIN_TIER = {
+    'chat': 0,
+    'conversation': 0,
+    'generate_code': 1,
+    'advanced_reasoning': 1,
+    'creative_writing': 1,
+    'analyze_image': 1,
+}
+
+# Bedrock models without image input
+TEXT_ONLY_MODELS = {'anthropic.claude-3-5-haiku-20241022-v1:0'}
+
+# Output length assumed for the budget check until a model has history
+DEFAULT_OUTPUT_TOKENS = 1000
+
+
+class ModelRouter:
+    """
+    Chooses a model alias for ``model='auto'``
+
+    Starting at the method's minimum tier, the first model that is healthy
+    (error and throttle rates under the limits), whose p95 meets the SLO and
+    whose estimated cost fits the budget wins. A tier with no such model falls
+    back to the next one up, then to cheaper tiers, and as a last resort to
+    the least-failing model so a call is never refused. Models with fewer
+    than ``min_samples`` recent calls count as healthy and within the SLO,
+    which is also how a degraded model gets traffic again after ``horizon``.
+    """
+
+    def __init__(self,
+                 models: Dict[str, str],
+                 telemetry,
+                 slo_p95: Optional[float] = None,
+                 max_cost_per_call: Optional[float] = None,
+                 max_error_rate: float = 0.2,
+                 max_throttle_rate: float = 0.5,
+                 min_samples: int = 5,
+                 horizon: float = 300.0,
+                 tiers: Optional[List[List[str]]] = None,
+                 prices: Optional[Dict[str, Any]] = None):
+        self.models = models
+        self.telemetry = telemetry
+        self.slo_p95 = slo_p95
+        self.max_cost_per_call = max_cost_per_call
+        self.max_error_rate = max_error_rate
+        self.max_throttle_rate = max_throttle_rate
+        self.min_samples = min_samples
+        self.horizon = horizon
+        self.tiers = [[alias for alias in tier if alias in models] for tier in (tiers or MODEL_TIERS)]
+        self.prices = prices or MODEL_PRICES
+        self.method_limits: Dict[str, Dict[str, Any]] = {}
+        self.decisions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def set_limits(self,
+                   method: str,
+                   slo_p95: Optional[float] = None,
+                   max_cost_per_call: Optional[float] = None,
+                   min_tier: Optional[int] = None):
+        """Per-method SLO (seconds), budget (USD per call) and minimum tier"""
+        limits = {'slo_p95': slo_p95, 'max_cost_per_call': max_cost_per_call, 'min_tier': min_tier}
+        self.method_limits[method] = {k: v for k, v in limits.items() if v is not None}
+
+    def estimate_cost(self, alias: str, input_tokens: int, output_tokens: int) -> float:
+        input_price, output_price = self.prices.get(self.models[alias], (0.0, 0.0))
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def _candidate(self, alias: str, input_tokens: int, max_tokens: int,
+                   slo_p95: Optional[float], budget: Optional[float]) -> Dict[str, Any]:
+        health = self.telemetry.model_health(self.models[alias], horizon=self.horizon)
+        output_tokens = min(max_tokens, health['mean_output_tokens'] or DEFAULT_OUTPUT_TOKENS)
+        cost = self.estimate_cost(alias, input_tokens, output_tokens)
+
+        known = health['samples'] >= self.min_samples
+        problems = []
+        if known and health['error_rate'] > self.max_error_rate:
+            problems.append('errors')
+        if known and health['throttle_rate'] > self.max_throttle_rate:
+            problems.append('throttled')
+        if known and slo_p95 is not None and health['p95'] is not None and health['p95'] > slo_p95:
+            problems.append('slow')
+        if budget is not None and cost > budget:
+            problems.append('over_budget')
+
+        return {
+            'model': alias,
+            'p95': health['p95'],
+            'error_rate': health['error_rate'],
+            'throttle_rate': health['throttle_rate'],
+            'samples': health['samples'],
+            'estimated_cost_usd': round(cost, 6),
+            'problems': problems,
+        }
+
+    def route(self,
+              method: Optional[str] = None,
+              input_chars: int = 0,
+              max_tokens: int = 8000,
+              vision: bool = False) -> Dict[str, Any]:
+        """
+        Pick a model for one call; returns the decision with the numbers behind it
+
+        Args:
+            method: Client method being routed (selects limits and minimum tier)
+            input_chars: Prompt size, for the cost estimate (~4 chars per token)
+            max_tokens: Output cap of the call
+            vision: The request carries an image
+        """
+
+        limits = self.method_limits.get(method, {})
+        slo_p95 = limits.get('slo_p95', self.slo_p95)
+        budget = limits.get('max_cost_per_call', self.max_cost_per_call)
+        min_tier = min(limits.get('min_tier', METHOD_MIN_TIER.get(method, 0)), len(self.tiers) - 1)
+        input_tokens = max(1, input_chars // 4)
+
+        # Tiers from the minimum up, then the cheaper ones nearest first
+        order = list(range(min_tier, len(self.tiers))) + list(range(min_tier - 1, -1, -1))
+        considered = []
+        for tier in order:
+            for alias in self.tiers[tier]:
+                if vision and self.models[alias] in TEXT_ONLY_MODELS:
+                    continue
+                candidate = self._candidate(alias, input_tokens, max_tokens, slo_p95, budget)
+                candidate['tier'] = tier
+                if not candidate['problems']:
+                    reason = 'preferred' if not considered else 'fallback'
+                    return self._decide(candidate, reason)
+                considered.append(candidate)
+
+        if not considered:
+            raise ValueError('No model available for routing')
+
+        # Nothing fits: least-failing model, then fewest broken limits, then the cheapest
+        best = min(considered, key=lambda c: (c['error_rate'] + c['throttle_rate'],
+                                              len(c['problems']),
+                                              c['estimated_cost_usd']))
+        return self._decide(best, 'best_effort')
+
+    def _decide(self, candidate: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        with self._lock:
+            self.decisions[candidate['model']] = self.decisions.get(candidate['model'], 0) + 1
+        return {**candidate, 'reason': reason}
+
+    def stats(self) -> Dict[str, Any]:
+        """How often each model was picked, plus its live health"""
+        with self._lock:
+            decisions = dict(self.decisions)
+        return {
+            'decisions': decisions,
+            'health': {alias: self.telemetry.model_health(model_id, horizon=self.horizon)
+                       for alias, model_id in self.models.items()},
+        }
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Bedrock prompt caching for long-lived prefixes
+Marks the system prompt and earlier conversation turns with cache_control so each
+new turn only pays full price for the text that changed
+"""
+
+import copy
+from collections import defaultdict
+from typing import Dict, Any, Optional, List, Union
+
+# Bedrock models that accept cache_control checkpoints
+PROMPT_CACHE_MODELS = {
+    'anthropic.claude-opus-4-1-20250805-v1:0',
+    'anthropic.claude-opus-4-20250514-v1:0',
+    'anthropic.claude-sonnet-4-20250514-v1:0',
+    'anthropic.claude-3-7-sonnet-20250219-v1:0',
+    'anthropic.claude-3-5-haiku-20241022-v1:0',
+}
+
+# Bedrock allows at most four checkpoints per request
+MAX_CHECKPOINTS = 4
+
+EPHEMERAL = {'type': 'ephemeral'}
+
+
+def supports_prompt_cache(model_id: str) -> bool:
+    return model_id in PROMPT_CACHE_MODELS
+
+
+def as_blocks(content: Union[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Content as a list of blocks, so the same turn always serializes the same way"""
+    if isinstance(content, str):
+        return [{'type': 'text', 'text': content}]
+    return content
+
+
+def with_cache_checkpoints(body: Dict[str, Any], recent_user_turns: int = 2) -> Dict[str, Any]:
+    """
+    Copy of ``body`` with cache checkpoints on the stable prefix
+
+    One checkpoint goes on the last system block and one on each of the last
+    ``recent_user_turns`` user messages: the newest writes the cache for the
+    next turn, the one before it reads what the previous turn wrote. The
+    original body and its message list are left untouched.
+    """
+
+    body = dict(body)
+    checkpoints = 0
+
+    if body.get('system'):
+        system = copy.deepcopy(as_blocks(body['system']))
+        system[-1]['cache_control'] = dict(EPHEMERAL)
+        body['system'] = system
+        checkpoints += 1
+
+    messages = [{**message, 'content': as_blocks(message['content'])} for message in body['messages']]
+    user_indexes = [i for i, message in enumerate(messages) if message['role'] == 'user']
+    marked = min(recent_user_turns, MAX_CHECKPOINTS - checkpoints)
+    for index in (user_indexes[-marked:] if marked > 0 else []):
+        blocks = copy.deepcopy(messages[index]['content'])
+        blocks[-1]['cache_control'] = dict(EPHEMERAL)
+        messages[index] = {**messages[index], 'content': blocks}
+    body['messages'] = messages
+
+    return body
+
+
+class ConversationSession:
+    """
+    Multi-turn conversation that keeps its prefix cacheable
+
+    History is stored as content blocks exactly as sent and received, so the
+    prefix is byte-identical from one turn to the next and keeps hitting the
+    cache. Works with any client exposing ``conversation(messages, model=...,
+    system=..., cache_prefix=True)``. Bedrock only caches prefixes of at least
+    ~1024 tokens (2048 on Haiku), so short chats see no cache reads until the
+    system prompt plus history grows past that.
+    """
+
+    def __init__(self,
+                 client,
+                 model: str = 'sonnet4',
+                 system: Optional[Union[str, List[Dict[str, Any]]]] = None,
+                 max_tokens: int = 4000,
+                 temperature: float = 0.7):
+        self.client = client
+        self.model = model
+        self.system = as_blocks(system) if system else None
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.messages: List[Dict[str, Any]] = []
+        self.totals: Dict[str, int] = defaultdict(int)
+        self.turns = 0
+
+    def send(self, text: Union[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Add a user turn, get Claude's reply and keep both in the history"""
+
+        self.messages.append({'role': 'user', 'content': as_blocks(text)})
+        result = self.client.conversation(
+            self.messages,
+            model=self.model,
+            system=self.system,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            cache_prefix=True
+        )
+
+        if 'error' in result:
+            # Drop the failed turn so a retry sends the same prefix again
+            self.messages.pop()
+            return result
+
+        self.messages.append({'role': 'assistant', 'content': as_blocks(result['response'])})
+        self.turns += 1
+        for key, value in result.get('usage', {}).items():
+            if isinstance(value, int):
+                self.totals[key] += value
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Token totals and the share of input tokens served from the prompt cache"""
+        read = self.totals.get('cache_read_input_tokens', 0)
+        written = self.totals.get('cache_creation_input_tokens', 0)
+        fresh = self.totals.get('input_tokens', 0)
+        total_input = read + written + fresh
+        return {
+            'turns': self.turns,
+            **self.totals,
+            'cache_read_ratio': round(read / total_input, 4) if total_input else 0.0
+        }
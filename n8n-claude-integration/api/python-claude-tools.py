@@ -4,24 +4,40 @@ Python Development Tools for Claude 3 Haiku & 3.5 Sonnet
 Optimized for your Python 3.12.2 environment
 """
 
-import boto3
 import json
-import base64
+import time
 from typing import Dict, Any, Optional, List
-import requests
 from datetime import datetime
 
+from bedrock_stream import ChatStream, AsyncChatStream
+from image_cache import ImageCache, shared_image_cache
+from bedrock_resilience import ResilientInvoker, shared_invoker
+from bedrock_clients import get_bedrock_runtime, DEFAULT_POOL_SIZE
+from bedrock_telemetry import Telemetry, shared_telemetry, tracked, current_method
+from prompt_cache import supports_prompt_cache, with_cache_checkpoints
+
 class ClaudeClient:
     """Optimized Claude client for Haiku and Sonnet models"""
     
-    def __init__(self, region: str = 'us-east-1'):
-        self.bedrock_runtime = boto3.client('bedrock-runtime', region_name=region)
+    def __init__(self,
+                 region: str = 'us-east-1',
+                 image_cache: Optional[ImageCache] = None,
+                 resilience: Optional[ResilientInvoker] = None,
+                 profile: Optional[str] = None,
+                 max_pool_connections: int = DEFAULT_POOL_SIZE,
+                 telemetry: Optional[Telemetry] = None):
+        # Shared per region/profile: credentials and sockets are reused across instances
+        self.bedrock_runtime = get_bedrock_runtime(region, profile, max_pool_connections)
+        self.image_cache = image_cache or shared_image_cache()
+        self.resilience = resilience or shared_invoker()  # retries + per-model rate limits
+        self.telemetry = telemetry or shared_telemetry()  # usage, latency and cost per call
         self.models = {
             'haiku': 'anthropic.claude-3-haiku-20240307-v1:0',
             'sonnet': 'anthropic.claude-3-5-sonnet-20240620-v1:0',
             'sonnet_v2': 'anthropic.claude-3-5-sonnet-20241022-v2:0'
         }
     
+    @tracked('chat')
     def chat(self, 
              prompt: str, 
              model: str = 'haiku',
@@ -38,21 +54,10 @@ class ClaudeClient:
         """
         
         model_id = self.models.get(model, self.models['haiku'])
-        
-        body = {
-            'anthropic_version': 'bedrock-2023-05-31',
-            'max_tokens': max_tokens,
-            'messages': [{'role': 'user', 'content': prompt}],
-            'temperature': temperature
-        }
+        body = self._build_body([{'role': 'user', 'content': prompt}], max_tokens, temperature)
         
         try:
-            response = self.bedrock_runtime.invoke_model(
-                modelId=model_id,
-                body=json.dumps(body)
-            )
-            
-            result = json.loads(response['body'].read())
+            result = self._invoke(model_id, body)
             
             return {
                 'response': result['content'][0]['text'],
@@ -68,6 +73,72 @@ class ClaudeClient:
                 'timestamp': datetime.now().isoformat()
             }
     
+    def chat_stream(self,
+                    prompt: str,
+                    model: str = 'haiku',
+                    max_tokens: int = 4000,
+                    temperature: float = 0.7) -> ChatStream:
+        """
+        Streaming chat: iterate the result for text deltas as they arrive
+        
+        Same arguments as chat; ``stream.result()`` returns the dict chat would.
+        """
+        
+        model_id = self.models.get(model, self.models['haiku'])
+        body = self._build_body([{'role': 'user', 'content': prompt}], max_tokens, temperature)
+        
+        return ChatStream(self.bedrock_runtime, model_id, body,
+                          fields={'model_used': model_id},
+                          error_fields={'model_used': model_id},
+                          invoker=self.resilience,
+                          telemetry=self.telemetry,
+                          method=current_method.get() or 'chat_stream')
+    
+    def achat_stream(self, prompt: str, **kwargs) -> AsyncChatStream:
+        """Async-iterator twin of chat_stream (use with ``async for``)"""
+        return AsyncChatStream(self.chat_stream(prompt, **kwargs))
+    
+    def _invoke(self, model_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """invoke_model with retries and telemetry; returns the parsed body"""
+        
+        payload = json.dumps(body)
+        start = time.perf_counter()
+        
+        def send():
+            response = self.bedrock_runtime.invoke_model(
+                modelId=model_id,
+                body=payload
+            )
+            return json.loads(response['body'].read())
+        
+        outcome = {}
+        try:
+            result, retries = self.resilience.call(model_id, send, outcome)
+        except Exception as e:
+            self.telemetry.record(model_id, request_bytes=len(payload),
+                                  wall_time=round(time.perf_counter() - start, 4),
+                                  retries=outcome.get('retries', 0), throttles=outcome.get('throttles', 0),
+                                  error=str(e))
+            raise
+        
+        self.telemetry.record(model_id, request_bytes=len(payload), usage=result.get('usage'),
+                              wall_time=round(time.perf_counter() - start, 4), retries=retries,
+                              throttles=outcome['throttles'])
+        return result
+    
+    def _build_body(self,
+                    messages: List[Dict[str, Any]],
+                    max_tokens: int,
+                    temperature: float) -> Dict[str, Any]:
+        """Anthropic Messages request body for Bedrock"""
+        return {
+            'anthropic_version': 'bedrock-2023-05-31',
+            'max_tokens': max_tokens,
+            'messages': messages,
+            'temperature': temperature
+        }
+    
+    @tracked('analyze_image')
     def analyze_image(self, 
                      image_path: str, 
                      prompt: str = "Describe this image in detail.",
@@ -82,21 +153,8 @@ class ClaudeClient:
         """
         
         try:
-            # Read and encode image
-            with open(image_path, 'rb') as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            # Determine image type
-            if image_path.lower().endswith('.png'):
-                media_type = 'image/png'
-            elif image_path.lower().endswith('.jpg') or image_path.lower().endswith('.jpeg'):
-                media_type = 'image/jpeg'
-            elif image_path.lower().endswith('.gif'):
-                media_type = 'image/gif'
-            elif image_path.lower().endswith('.webp'):
-                media_type = 'image/webp'
-            else:
-                media_type = 'image/jpeg'  # Default
+            # Encoded payload and media type (cached by content, see image_cache.py)
+            image = self.image_cache.prepare(image_path)
             
             model_id = self.models.get(model, self.models['sonnet'])
             
@@ -108,26 +166,16 @@ class ClaudeClient:
                         'type': 'image',
                         'source': {
                             'type': 'base64',
-                            'media_type': media_type,
-                            'data': image_data
+                            'media_type': image.media_type,
+                            'data': image.data
                         }
                     }
                 ]
             }]
             
-            body = {
-                'anthropic_version': 'bedrock-2023-05-31',
-                'max_tokens': 4000,
-                'messages': messages,
-                'temperature': 0.7
-            }
+            body = self._build_body(messages, 4000, 0.7)
             
-            response = self.bedrock_runtime.invoke_model(
-                modelId=model_id,
-                body=json.dumps(body)
-            )
-            
-            result = json.loads(response['body'].read())
+            result = self._invoke(model_id, body)
             
             return {
                 'analysis': result['content'][0]['text'],
@@ -144,6 +192,7 @@ class ClaudeClient:
                 'timestamp': datetime.now().isoformat()
             }
     
+    @tracked('generate_code')
     def generate_code(self, 
                      description: str,
                      language: str = 'python',
@@ -172,33 +221,37 @@ Requirements:
         
         return self.chat(prompt, model=model, temperature=0.3)
     
+    @tracked('conversation')
     def conversation(self, 
                     messages: List[Dict[str, str]], 
-                    model: str = 'haiku') -> Dict[str, Any]:
+                    model: str = 'haiku',
+                    system: Optional[Any] = None,
+                    max_tokens: int = 4000,
+                    temperature: float = 0.7,
+                    cache_prefix: bool = False) -> Dict[str, Any]:
         """
         Multi-turn conversation with Claude
         
         Args:
             messages: List of {'role': 'user'/'assistant', 'content': 'text'}
             model: 'haiku' or 'sonnet'
+            system: Optional system prompt (string or content blocks)
+            max_tokens: Maximum response length
+            temperature: Creativity level (0.0-1.0)
+            cache_prefix: Mark system prompt and recent turns for Bedrock prompt
+                          caching (ignored on models without it); see
+                          prompt_cache.ConversationSession
         """
         
         model_id = self.models.get(model, self.models['haiku'])
-        
-        body = {
-            'anthropic_version': 'bedrock-2023-05-31',
-            'max_tokens': 4000,
-            'messages': messages,
-            'temperature': 0.7
-        }
+        body = self._build_body(messages, max_tokens, temperature)
+        if system:
+            body['system'] = system
+        if cache_prefix and supports_prompt_cache(model_id):
+            body = with_cache_checkpoints(body)
         
         try:
-            response = self.bedrock_runtime.invoke_model(
-                modelId=model_id,
-                body=json.dumps(body)
-            )
-            
-            result = json.loads(response['body'].read())
+            result = self._invoke(model_id, body)
             
             return {
                 'response': result['content'][0]['text'],
@@ -5,18 +5,69 @@ Plus all Claude 3.5+ and Claude 3 models
 Optimized for your Python 3.12.2 environment
 """
 
-import boto3
 import json
-import base64
-from typing import Dict, Any, Optional, List
-import requests
+import asyncio
+import time
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 
+from bedrock_stream import ChatStream, AsyncChatStream
+from response_cache import ResponseCache, request_key
+from image_cache import ImageCache, shared_image_cache
+from bedrock_resilience import ResilientInvoker, shared_invoker
+from bedrock_clients import get_bedrock_runtime, DEFAULT_POOL_SIZE
+from bedrock_telemetry import Telemetry, shared_telemetry, tracked, current_method
+from prompt_cache import supports_prompt_cache, with_cache_checkpoints
+from single_flight import SingleFlight, shared_single_flight
+from model_router import ModelRouter
+from hedging import HedgedRuntime, get_hedged_runtime
+from request_scheduler import RequestScheduler
+from context_window import ContextPacker
+from claude_result import ClaudeResult, loads
+from semantic_cache import SemanticCache, caller_input, current_input
+
 class Claude4Client:
     """Enhanced Claude client with full Claude 4 support"""
     
-    def __init__(self, region: str = 'us-east-1'):
-        self.bedrock_runtime = boto3.client('bedrock-runtime', region_name=region)
+    def __init__(self,
+                 region: str = 'us-east-1',
+                 cache: Optional[ResponseCache] = None,
+                 image_cache: Optional[ImageCache] = None,
+                 resilience: Optional[ResilientInvoker] = None,
+                 profile: Optional[str] = None,
+                 max_pool_connections: int = DEFAULT_POOL_SIZE,
+                 telemetry: Optional[Telemetry] = None,
+                 bedrock_runtime: Optional[Any] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 coalesce: bool = True,
+                 router: Optional[ModelRouter] = None,
+                 regions: Optional[List[str]] = None,
+                 scheduler: Optional[RequestScheduler] = None,
+                 packer: Optional[ContextPacker] = None,
+                 semantic_cache: Optional[SemanticCache] = None):
+        # Shared per region/profile: credentials and sockets are reused across instances.
+        # Pass bedrock_runtime to use another client (e.g. fake_bedrock for offline runs).
+        # With several regions, slow calls are hedged and failures fail over (see hedging.py).
+        if bedrock_runtime is None and regions and len(regions) > 1:
+            bedrock_runtime = get_hedged_runtime(regions, profile, max_pool_connections)
+        self.bedrock_runtime = bedrock_runtime or get_bedrock_runtime(
+            regions[0] if regions else region, profile, max_pool_connections)
+        self.cache = cache  # e.g. ResponseCache(path='claude-cache.sqlite')
+        self.semantic_cache = semantic_cache  # near-duplicate prompts, e.g. SemanticCache(path='semantic.npz')
+        self.image_cache = image_cache or shared_image_cache()
+        self.resilience = resilience or shared_invoker()  # retries + per-model rate limits
+        self.telemetry = telemetry or shared_telemetry()  # usage, latency and cost per call
+        # Priority classes, tenant fairness and deadlines; share one instance for a common budget
+        self.scheduler = scheduler
+        # Identical requests already in flight share one Bedrock call (any temperature).
+        # The table is process-wide, so keys carry the account/region/endpoint they are sent to.
+        self.single_flight = (single_flight or shared_single_flight()) if coalesce else None
+        self.flight_scope = self._flight_scope(region, regions, profile)
+        # Caps max_tokens per model, trims old turns and rejects oversized requests before sending
+        self.packer = packer or ContextPacker()
         self.models = {
             # Claude 4 Models (Latest & Greatest)
             'opus4.1': 'anthropic.claude-opus-4-1-20250805-v1:0',      # Most advanced
@@ -48,54 +99,308 @@ class Claude4Client:
             'sonnet': {'generation': 'Claude 3', 'cost': 'Low', 'best_for': 'General purpose'},
             'opus': {'generation': 'Claude 3', 'cost': 'Medium', 'best_for': 'Complex reasoning'},
         }
+        
+        # model='auto' picks per call from live latency/errors and price (see model_router.py)
+        self.router = router or ModelRouter(self.models, self.telemetry)
+    
+    def _flight_scope(self, region: str, regions: Optional[List[str]], profile: Optional[str]) -> str:
+        """Identity of the upstream this client calls; only calls with the same one coalesce"""
+        endpoint = getattr(getattr(self.bedrock_runtime, 'meta', None), 'endpoint_url', None)
+        if not isinstance(endpoint, str):
+            # Injected or hedged runtimes: only clients sharing the object share calls
+            endpoint = f'runtime-{id(self.bedrock_runtime):x}'
+        return f"{profile or 'default'}@{','.join(regions or [region])}@{endpoint}"
     
+    def _resolve_model(self,
+                       model: str,
+                       input_chars: int,
+                       max_tokens: int,
+                       vision: bool = False,
+                       method: Optional[str] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Alias to use and the routing decision (None unless model='auto')"""
+        if model != 'auto':
+            return model, None
+        method = method or current_method.get() or 'chat'
+        route = self.router.route(method, input_chars, max_tokens, vision)
+        return route['model'], route
+    
+    @tracked('chat')
     def chat(self, 
              prompt: str, 
              model: str = 'sonnet4',  # Default to Claude Sonnet 4
              max_tokens: int = 8000,
-             temperature: float = 0.7) -> Dict[str, Any]:
+             temperature: float = 0.7,
+             cache: Optional[bool] = None) -> Dict[str, Any]:
         """
         Chat with Claude 4 or any Claude model
         
         Args:
             prompt: Your message to Claude
-            model: Model to use (opus4.1, opus4, sonnet4, sonnet3.5, haiku, etc.)
+            model: Model to use (opus4.1, opus4, sonnet4, sonnet3.5, haiku, etc.),
+                   or 'auto' to let the router pick one
             max_tokens: Maximum response length (up to 8000 for Claude 4)
             temperature: Creativity level (0.0-1.0)
+            cache: Force the response cache on/off for this call (default: the
+                   cache decides, skipping temperature > 0)
         """
         
+        model, route = self._resolve_model(model, len(prompt), max_tokens)
         model_id = self.models.get(model, self.models['sonnet4'])
+        body = self._build_body([{'role': 'user', 'content': prompt}], max_tokens, temperature)
         
-        body = {
-            'anthropic_version': 'bedrock-2023-05-31',
-            'max_tokens': max_tokens,
-            'messages': [{'role': 'user', 'content': prompt}],
-            'temperature': temperature
-        }
+        start = time.perf_counter()
         
         try:
-            response = self.bedrock_runtime.invoke_model(
-                modelId=model_id,
-                body=json.dumps(body)
-            )
+            result, timing, cached, model_id = self._invoke(model_id, body, cache)
             
-            result = json.loads(response['body'].read())
+            response = ClaudeResult(result['content'][0]['text'], model_id,
+                                    self._generation(model_id, model), result.get('usage', {}), timing)
+            if cached:
+                response['cached'] = True
+            if route:
+                response['route'] = route
+            return response
+            
+        except Exception as e:
+            return ClaudeResult.failure(e, model_used=model_id,
+                                        timing={'wall_time': round(time.perf_counter() - start, 4)})
+    
+    def _invoke(self,
+                model_id: str,
+                body: Dict[str, Any],
+                cache: Optional[bool] = None):
+        """
+        invoke_model and parse the JSON body, going through the response cache
+        (then the semantic cache) when configured and retrying throttles/transient errors.
+        Concurrent calls with the same model and body share one request.
+        The body is first fitted to the model's context window; when turns
+        were dropped or max_tokens lowered, timing['context'] says so.
+        Returns (parsed response, timing, cached, model id that answered); the
+        last differs from ``model_id`` when a hedged call fell back to another
+        model, and telemetry and the response cache use the model that answered.
+        """
+        
+        start = time.perf_counter()
+        key = None
+        cache_key = None
+        body, packing = self.packer.pack(model_id, body)  # ContextTooLarge: no round trip
+        context = {'context': packing} if packing['capped'] or packing['dropped_messages'] else {}
+        payload = json.dumps(body)
+        
+        if self.single_flight is not None or self.cache is not None:
+            key = request_key(model_id, body)
+        
+        if self.cache is not None and self.cache.cacheable(body, cache):
+            cache_key = key
+            hit = self.cache.get(key)
+            if hit is not None:
+                timing = {'wall_time': round(time.perf_counter() - start, 6), **context}
+                self.telemetry.record(model_id, request_bytes=len(payload), usage=hit.get('usage'),
+                                      wall_time=timing['wall_time'], cached=True)
+                return hit, timing, True, model_id
+        
+        semantic = None
+        if self.semantic_cache is not None and self.semantic_cache.cacheable(body, cache):
+            semantic = self.semantic_cache.lookup(current_method.get() or 'chat', model_id, body, current_input.get())
+            if semantic is not None and semantic.hit:
+                timing = {'wall_time': round(time.perf_counter() - start, 6),
+                          'semantic_similarity': round(semantic.similarity, 4), **context}
+                self.telemetry.record(model_id, request_bytes=len(payload), usage=semantic.response.get('usage'),
+                                      wall_time=timing['wall_time'], cached=True)
+                return semantic.response, timing, True, model_id
+        
+        def send():
+            # Each attempt queues for a slot, so retries after the deadline are dropped too
+            hedge_slot = self._hedge_slot()
+            with self._slot():
+                attempt_start = time.perf_counter()
+                response = self.bedrock_runtime.invoke_model(
+                    modelId=model_id,
+                    body=payload,
+                    **({'hedge_slot': hedge_slot} if hedge_slot else {})
+                )
+                first_byte = time.perf_counter() - attempt_start
+            # Set by hedging.HedgedRuntime: which region (and fallback model) answered and whether a hedge was sent
+            placement = {k: response[k] for k in ('region', 'hedged', 'model_id') if k in response}
+            return loads(response['body'].read()), first_byte, placement
+        
+        def call():
+            outcome = {}
+            try:
+                (result, first_byte, placement), retries = self.resilience.call(model_id, send, outcome)
+            except Exception as e:
+                self.telemetry.record(model_id, request_bytes=len(payload),
+                                      wall_time=round(time.perf_counter() - start, 4),
+                                      retries=outcome.get('retries', 0), throttles=outcome.get('throttles', 0),
+                                      error=str(e))
+                raise
             
-            return {
-                'response': result['content'][0]['text'],
-                'model_used': model_id,
-                'model_generation': self.model_info[model]['generation'],
-                'usage': result.get('usage', {}),
-                'timestamp': datetime.now().isoformat()
+            answered_by = placement.pop('model_id', model_id)
+            if answered_by != model_id:
+                # A fallback model's answer is cached as that model's, never as the requested one's
+                placement['fallback_from'] = model_id
+                if cache_key is not None:
+                    self.cache.put(request_key(answered_by, body), result)
+            else:
+                if cache_key is not None:
+                    self.cache.put(cache_key, result)
+                if semantic is not None:
+                    # Audited near-duplicates also compare this answer with the cached one
+                    self.semantic_cache.store(semantic, result)
+            
+            timing = {
+                'time_to_first_byte': round(first_byte, 4),
+                'wall_time': round(time.perf_counter() - start, 4),
+                'retries': retries,
+                **placement,
+                **context
             }
+            self.telemetry.record(answered_by, request_bytes=len(payload), usage=result.get('usage'),
+                                  wall_time=timing['wall_time'], time_to_first_byte=timing['time_to_first_byte'],
+                                  retries=retries, throttles=outcome['throttles'])
+            return result, timing, answered_by
+        
+        if self.single_flight is None:
+            result, timing, answered_by = call()
+            return result, timing, False, answered_by
+        
+        # Followers re-raise the leader's error (counted in single_flight.stats())
+        (result, leader_timing, answered_by), shared = self.single_flight.do(f'{self.flight_scope}:{key}', call)
+        
+        if not shared:
+            return result, leader_timing, False, answered_by
+        
+        # Followers got the leader's response: their own wait, no tokens billed to them
+        timing = {
+            'time_to_first_byte': leader_timing.get('time_to_first_byte'),
+            'wall_time': round(time.perf_counter() - start, 4),
+            'retries': 0,
+            'coalesced': True,
+            **{k: leader_timing[k] for k in ('region', 'fallback_from') if k in leader_timing},
+            **context
+        }
+        self.telemetry.record(answered_by, request_bytes=0, wall_time=timing['wall_time'], coalesced=True)
+        return result, timing, False, answered_by
+    
+    def _slot(self):
+        """Scheduler slot for one Bedrock call (no-op without a scheduler)"""
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.slot(current_method.get())
+    
+    def _hedge_slot(self):
+        """Slot source for hedged duplicates, so they count against the scheduler (None without one)"""
+        if self.scheduler is None or not isinstance(self.bedrock_runtime, HedgedRuntime):
+            return None
+        return self.scheduler.try_slot
+    
+    def _generation(self, model_id: str, model: str) -> str:
+        """Generation of the model that answered, which a hedged call may have swapped for a fallback"""
+        alias = next((alias for alias, known in self.models.items() if known == model_id), model)
+        return self.model_info[alias]['generation']
+    
+    @tracked('conversation')
+    def conversation(self,
+                     messages: List[Dict[str, Any]],
+                     model: str = 'sonnet4',
+                     system: Optional[Any] = None,
+                     max_tokens: int = 4000,
+                     temperature: float = 0.7,
+                     cache_prefix: bool = False) -> Dict[str, Any]:
+        """
+        Multi-turn conversation with Claude 4 or any Claude model
+        
+        Args:
+            messages: List of {'role': 'user'/'assistant', 'content': text or blocks}
+            model: Model to use
+            system: Optional system prompt (string or content blocks)
+            max_tokens: Maximum response length
+            temperature: Creativity level (0.0-1.0)
+            cache_prefix: Mark system prompt and recent turns for Bedrock prompt
+                          caching (Claude 4, 3.7 Sonnet, 3.5 Haiku); usage then
+                          reports cache_read/cache_creation input tokens. See
+                          prompt_cache.ConversationSession.
+        """
+        
+        model, route = self._resolve_model(model, len(json.dumps(messages)) + len(str(system or '')), max_tokens)
+        model_id = self.models.get(model, self.models['sonnet4'])
+        body = self._build_body(messages, max_tokens, temperature)
+        if system:
+            body['system'] = system
+        if cache_prefix and supports_prompt_cache(model_id):
+            body = with_cache_checkpoints(body)
+        
+        start = time.perf_counter()
+        
+        try:
+            result, timing, cached, model_id = self._invoke(model_id, body)
+            
+            response = ClaudeResult(result['content'][0]['text'], model_id,
+                                    self._generation(model_id, model), result.get('usage', {}), timing,
+                                    conversation_length=len(messages))
+            if cached:
+                response['cached'] = True
+            if route:
+                response['route'] = route
+            return response
             
         except Exception as e:
-            return {
-                'error': str(e),
-                'model_used': model_id,
-                'timestamp': datetime.now().isoformat()
-            }
+            return ClaudeResult.failure(e, model_used=model_id,
+                                        timing={'wall_time': round(time.perf_counter() - start, 4)})
+    
+    def chat_stream(self,
+                    prompt: str,
+                    model: str = 'sonnet4',
+                    max_tokens: int = 8000,
+                    temperature: float = 0.7) -> ChatStream:
+        """
+        Streaming chat: iterate the result for text deltas as they arrive
+        
+        Takes the same arguments as chat. ``stream.usage`` updates while the
+        response is generated and ``stream.result()`` returns the dict chat
+        would have returned.
+        """
+        
+        model, route = self._resolve_model(model, len(prompt), max_tokens)
+        model_id = self.models.get(model, self.models['sonnet4'])
+        body = self._build_body([{'role': 'user', 'content': prompt}], max_tokens, temperature)
+        body, _ = self.packer.pack(model_id, body)
+        
+        fields = {
+            'model_used': model_id,
+            'model_generation': self.model_info.get(model, self.model_info['sonnet4'])['generation']
+        }
+        if route:
+            fields['route'] = route
+        
+        return ChatStream(
+            self.bedrock_runtime, model_id, body,
+            fields=fields,
+            error_fields={'model_used': model_id},
+            invoker=self.resilience,
+            telemetry=self.telemetry,
+            method=current_method.get() or 'chat_stream',
+            scheduler=self.scheduler,
+            hedge_slot=self._hedge_slot()
+        )
+    
+    def achat_stream(self, prompt: str, **kwargs) -> AsyncChatStream:
+        """Async-iterator twin of chat_stream (use with ``async for``)"""
+        return AsyncChatStream(self.chat_stream(prompt, **kwargs))
+    
+    def _build_body(self,
+                    messages: List[Dict[str, Any]],
+                    max_tokens: int,
+                    temperature: float) -> Dict[str, Any]:
+        """Anthropic Messages request body for Bedrock"""
+        return {
+            'anthropic_version': 'bedrock-2023-05-31',
+            'max_tokens': max_tokens,
+            'messages': messages,
+            'temperature': temperature
+        }
     
+    @tracked('advanced_reasoning')
     def advanced_reasoning(self,
                           problem: str,
                           reasoning_type: str = 'analytical',
@@ -109,6 +414,14 @@ class Claude4Client:
             model: Model to use (opus4.1 or opus4 recommended)
         """
         
+        prompt = self.reasoning_prompt(problem, reasoning_type)
+        
+        with caller_input(problem, reasoning_type=reasoning_type):
+            return self.chat(prompt, model=model, temperature=0.3)
+    
+    def reasoning_prompt(self, problem: str, reasoning_type: str = 'analytical') -> str:
+        """Prompt advanced_reasoning sends for this problem and reasoning type"""
+        
         reasoning_prompts = {
             'analytical': f"""
 Analyze this problem using advanced analytical reasoning:
@@ -145,10 +458,9 @@ Include hypothesis formation, evidence evaluation, and scientific conclusions.
 """
         }
         
-        prompt = reasoning_prompts.get(reasoning_type, reasoning_prompts['analytical'])
-        
-        return self.chat(prompt, model=model, temperature=0.3)
+        return reasoning_prompts.get(reasoning_type, reasoning_prompts['analytical'])
     
+    @tracked('analyze_image')
     def analyze_image(self, 
                      image_path: str, 
                      prompt: str = "Provide a comprehensive analysis of this image.",
@@ -165,21 +477,8 @@ Include hypothesis formation, evidence evaluation, and scientific conclusions.
         """
         
         try:
-            # Read and encode image
-            with open(image_path, 'rb') as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            # Determine image type
-            if image_path.lower().endswith('.png'):
-                media_type = 'image/png'
-            elif image_path.lower().endswith(('.jpg', '.jpeg')):
-                media_type = 'image/jpeg'
-            elif image_path.lower().endswith('.gif'):
-                media_type = 'image/gif'
-            elif image_path.lower().endswith('.webp'):
-                media_type = 'image/webp'
-            else:
-                media_type = 'image/jpeg'
+            # Encoded payload and media type (cached by content, see image_cache.py)
+            image = self.image_cache.prepare(image_path)
             
             # Enhanced prompts based on analysis depth
             depth_prompts = {
@@ -212,6 +511,8 @@ As an expert, analyze:
             }
             
             enhanced_prompt = depth_prompts.get(analysis_depth, depth_prompts['detailed'])
+            # An image up to 1568px costs about 1600 tokens, whatever its file size
+            model, route = self._resolve_model(model, len(enhanced_prompt) + 6400, 8000, vision=True)
             model_id = self.models.get(model, self.models['opus4'])
             
             messages = [{
@@ -222,44 +523,30 @@ As an expert, analyze:
                         'type': 'image',
                         'source': {
                             'type': 'base64',
-                            'media_type': media_type,
-                            'data': image_data
+                            'media_type': image.media_type,
+                            'data': image.data
                         }
                     }
                 ]
             }]
             
-            body = {
-                'anthropic_version': 'bedrock-2023-05-31',
-                'max_tokens': 8000,
-                'messages': messages,
-                'temperature': 0.7
-            }
+            body = self._build_body(messages, 8000, 0.7)
             
-            response = self.bedrock_runtime.invoke_model(
-                modelId=model_id,
-                body=json.dumps(body)
-            )
+            result, timing, cached, model_id = self._invoke(model_id, body)
             
-            result = json.loads(response['body'].read())
-            
-            return {
-                'analysis': result['content'][0]['text'],
-                'analysis_depth': analysis_depth,
-                'model_used': model_id,
-                'model_generation': self.model_info[model]['generation'],
-                'usage': result.get('usage', {}),
-                'image_path': image_path,
-                'timestamp': datetime.now().isoformat()
-            }
+            response = ClaudeResult(result['content'][0]['text'], model_id,
+                                    self._generation(model_id, model), result.get('usage', {}), timing,
+                                    text_key='analysis', analysis_depth=analysis_depth, image_path=image_path)
+            if cached:
+                response['cached'] = True
+            if route:
+                response['route'] = route
+            return response
             
         except Exception as e:
-            return {
-                'error': str(e),
-                'image_path': image_path,
-                'timestamp': datetime.now().isoformat()
-            }
+            return ClaudeResult.failure(e, image_path=image_path)
     
+    @tracked('generate_code')
     def generate_code(self, 
                      description: str,
                      language: str = 'python',
@@ -275,6 +562,14 @@ As an expert, analyze:
             model: Model to use (sonnet4 recommended for coding)
         """
         
+        prompt = self.code_prompt(description, language, complexity)
+        
+        with caller_input(description, language=language, complexity=complexity):
+            return self.chat(prompt, model=model, temperature=0.2)
+    
+    def code_prompt(self, description: str, language: str = 'python', complexity: str = 'advanced') -> str:
+        """Prompt generate_code sends for this description"""
+        
         complexity_prompts = {
             'simple': f"Generate clean {language} code: {description}",
             'standard': f"""
@@ -317,10 +612,9 @@ Requirements:
 """
         }
         
-        prompt = complexity_prompts.get(complexity, complexity_prompts['advanced'])
-        
-        return self.chat(prompt, model=model, temperature=0.2)
+        return complexity_prompts.get(complexity, complexity_prompts['advanced'])
     
+    @tracked('creative_writing')
     def creative_writing(self,
                         prompt: str,
                         style: str = 'narrative',
@@ -336,6 +630,15 @@ Requirements:
             model: Model to use (opus4.1 recommended for creativity)
         """
         
+        enhanced_prompt = self.creative_prompt(prompt, style)
+        max_tokens = self.creative_max_tokens(length)
+        
+        with caller_input(prompt, style=style):
+            return self.chat(enhanced_prompt, model=model, max_tokens=max_tokens, temperature=0.8)
+    
+    def creative_prompt(self, prompt: str, style: str = 'narrative') -> str:
+        """Prompt creative_writing sends for this style"""
+        
         style_prompts = {
             'narrative': f"Write a compelling narrative story: {prompt}",
             'poetry': f"Create beautiful, evocative poetry: {prompt}",
@@ -345,47 +648,265 @@ Requirements:
             'technical': f"Write clear technical documentation: {prompt}"
         }
         
+        return style_prompts.get(style, style_prompts['narrative'])
+    
+    def creative_max_tokens(self, length: str = 'medium') -> int:
+        """Output token budget creative_writing uses for a length"""
+        
         length_tokens = {
             'short': 2000,
             'medium': 4000,
             'long': 8000
         }
         
-        enhanced_prompt = style_prompts.get(style, style_prompts['narrative'])
-        max_tokens = length_tokens.get(length, 4000)
+        return length_tokens.get(length, 4000)
+    
+    def build_request(self, method: str, **kwargs) -> Tuple[str, Dict[str, Any]]:
+        """
+        Model id and request body that a text method would send, without sending it
+        
+        Args:
+            method: 'chat', 'advanced_reasoning', 'generate_code' or 'creative_writing'
+            **kwargs: That method's arguments (same names and defaults)
+        
+        The body is fitted to the model's limits like a live call would be;
+        raises context_window.ContextTooLarge if it cannot fit.
+        """
+        
+        model_id, body = self._request_body(method, **kwargs)
+        body, _ = self.packer.pack(model_id, body)
+        return model_id, body
+    
+    def _request_body(self, method: str, **kwargs) -> Tuple[str, Dict[str, Any]]:
+        """build_request before context packing"""
+        
+        if method == 'chat':
+            prompt = kwargs['prompt']
+            model = kwargs.get('model', 'sonnet4')
+            max_tokens = kwargs.get('max_tokens', 8000)
+            temperature = kwargs.get('temperature', 0.7)
+        elif method == 'advanced_reasoning':
+            prompt = self.reasoning_prompt(kwargs['problem'], kwargs.get('reasoning_type', 'analytical'))
+            model = kwargs.get('model', 'opus4')
+            max_tokens, temperature = 8000, 0.3
+        elif method == 'generate_code':
+            prompt = self.code_prompt(kwargs['description'], kwargs.get('language', 'python'),
+                                      kwargs.get('complexity', 'advanced'))
+            model = kwargs.get('model', 'sonnet4')
+            max_tokens, temperature = 8000, 0.2
+        elif method == 'creative_writing':
+            prompt = self.creative_prompt(kwargs['prompt'], kwargs.get('style', 'narrative'))
+            model = kwargs.get('model', 'opus4.1')
+            max_tokens, temperature = self.creative_max_tokens(kwargs.get('length', 'medium')), 0.8
+        else:
+            raise ValueError(f"build_request does not support method '{method}'")
+        
+        model, _ = self._resolve_model(model, len(prompt), max_tokens, method=method)
+        model_id = self.models.get(model, self.models['sonnet4'])
+        return model_id, self._build_body([{'role': 'user', 'content': prompt}], max_tokens, temperature)
+    
+    def estimate_batch(self,
+                       requests: List[Tuple[str, Dict[str, Any]]],
+                       discount: float = 1.0) -> Dict[str, Any]:
+        """
+        Token and cost estimate for many calls before running any of them
+        
+        Args:
+            requests: (method, kwargs) pairs as accepted by build_request
+            discount: Price multiplier (context_window.BATCH_DISCOUNT for batch jobs)
+        
+        Expected output per model is the recent mean from telemetry, falling
+        back to max_tokens; requests too large for their model are counted
+        under 'rejected'.
+        """
         
-        return self.chat(enhanced_prompt, model=model, max_tokens=max_tokens, temperature=0.8)
+        # Unpacked bodies: estimate_cost packs them and counts the ones that cannot fit
+        bodies = [self._request_body(method, **kwargs) for method, kwargs in requests]
+        expected = {}
+        for model_id in {model_id for model_id, _ in bodies}:
+            mean_output = self.telemetry.model_health(model_id)['mean_output_tokens']
+            if mean_output:
+                expected[model_id] = mean_output
+        return self.packer.estimate_cost(bodies, expected, discount)
     
-    def compare_models(self, prompt: str, models: List[str] = None) -> Dict[str, Any]:
+    @tracked('compare_models')
+    def compare_models(self,
+                       prompt: str,
+                       models: List[str] = None,
+                       concurrent: bool = False,
+                       max_workers: Optional[int] = None,
+                       timeout: Optional[float] = None,
+                       first_n: Optional[int] = None) -> Dict[str, Any]:
         """
         Compare responses from different Claude models
         
+        Each model is streamed and its entry in ``comparisons`` is a ClaudeResult
+        built from the stream (response, model_info, usage, error, status and latencies).
+        
         Args:
             prompt: The prompt to test
             models: List of models to compare (default: ['haiku', 'sonnet3.5', 'sonnet4', 'opus4'])
+            concurrent: Query all models at once instead of one after another
+            max_workers: Thread count for concurrent mode (default: one per model)
+            timeout: Per-model time limit in seconds (concurrent mode)
+            first_n: Stop once this many models have answered (concurrent mode)
         """
         
         if models is None:
             models = ['haiku', 'sonnet3.5', 'sonnet4', 'opus4']
         
+        start = time.perf_counter()
         results = {}
         
-        for model in models:
-            print(f"Testing {model}...")
-            result = self.chat(prompt, model=model)
-            results[model] = {
-                'response': result.get('response', result.get('error', 'No response')),
-                'model_info': self.model_info.get(model, {}),
-                'usage': result.get('usage', {}),
-                'error': result.get('error')
-            }
+        if concurrent:
+            for model, entry in self.compare_models_iter(prompt, models, max_workers=max_workers,
+                                                         timeout=timeout, first_n=first_n):
+                results[model] = entry
+        else:
+            for model in models:
+                print(f"Testing {model}...")
+                results[model] = self._compare_one(prompt, model)
         
         return {
             'prompt': prompt,
             'comparisons': results,
+            'wall_time': round(time.perf_counter() - start, 4),
             'timestamp': datetime.now().isoformat()
         }
     
+    def compare_models_iter(self,
+                            prompt: str,
+                            models: List[str] = None,
+                            max_workers: Optional[int] = None,
+                            timeout: Optional[float] = None,
+                            first_n: Optional[int] = None):
+        """
+        Query several models concurrently and yield (model, entry) as each finishes
+        
+        The total wait is the slowest model rather than the sum of all of them.
+        Models that exceed ``timeout`` are yielded with status 'timeout'; once
+        ``first_n`` models have answered the rest are yielded as 'cancelled'.
+        Each model is streamed so time to first token is measured. Requests
+        already on the wire cannot be interrupted, so their threads finish in
+        the background and the late results are discarded.
+        """
+        
+        if models is None:
+            models = ['haiku', 'sonnet3.5', 'sonnet4', 'opus4']
+        models = list(dict.fromkeys(models))
+        
+        started = {}
+        
+        def timed_chat(model: str) -> ClaudeResult:
+            started[model] = time.perf_counter()
+            return self._compare_one(prompt, model)
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers or len(models),
+                                      thread_name_prefix='compare')
+        # copy_context keeps the telemetry method tag inside the worker threads
+        futures = {executor.submit(contextvars.copy_context().run, timed_chat, model): model
+                   for model in models}
+        pending = set(futures)
+        answered = 0
+        
+        try:
+            while pending:
+                wait_for = None
+                if timeout is not None:
+                    deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+                    wait_for = max(0.0, min(deadlines) - time.perf_counter()) if deadlines else timeout
+                
+                done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    model = futures[future]
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        now = time.perf_counter()
+                        entry = self._comparison_entry(model, error=e,
+                                                       timing={'wall_time': round(now - started.get(model, now), 4)})
+                    yield model, entry
+                    answered += 1
+                
+                if first_n is not None and answered >= first_n:
+                    break
+                
+                if timeout is not None:
+                    now = time.perf_counter()
+                    expired = {f for f in pending
+                               if futures[f] in started and now - started[futures[f]] >= timeout}
+                    for future in expired:
+                        model = futures[future]
+                        yield model, self._comparison_entry(
+                            model,
+                            error=f'Timed out after {timeout}s',
+                            timing={'wall_time': round(now - started[model], 4)},
+                            status='timeout'
+                        )
+                    pending -= expired
+            
+            for future in pending:
+                future.cancel()
+                yield futures[future], self._comparison_entry(
+                    futures[future],
+                    error=f'Cancelled after first {first_n} models finished',
+                    status='cancelled'
+                )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _compare_one(self, prompt: str, model: str) -> ClaudeResult:
+        """Stream one model's answer and build its compare_models entry"""
+        
+        start = time.perf_counter()
+        try:
+            stream = self.chat_stream(prompt, model=model)
+        except Exception as e:
+            # e.g. ContextTooLarge: report it like chat does
+            return self._comparison_entry(model, error=e,
+                                          timing={'wall_time': round(time.perf_counter() - start, 4)})
+        
+        for _ in stream:
+            pass
+        if stream.error is not None:
+            return self._comparison_entry(model, error=stream.exception or stream.error,
+                                          timing=stream.timing, model_used=stream.model_id)
+        return self._comparison_entry(model, stream.text, stream.usage, stream.timing,
+                                      model_used=stream.model_id)
+    
+    def _comparison_entry(self,
+                          model: str,
+                          response: Optional[str] = None,
+                          usage: Optional[Dict[str, int]] = None,
+                          timing: Optional[Dict[str, Any]] = None,
+                          error: Any = None,
+                          status: Optional[str] = None,
+                          model_used: Optional[str] = None) -> ClaudeResult:
+        """
+        One compare_models entry, built once as a ClaudeResult from the stream's values
+        
+        There is no chat result in between to copy from, and with its ten keys an
+        entry stays within a small dict's first table. ``exception`` keeps the error.
+        """
+        
+        timing = timing or {}
+        message = None if error is None else str(error)
+        
+        entry = ClaudeResult(
+            response if message is None else message,
+            model_used or self.models.get(model, self.models['sonnet4']),
+            usage=usage if message is None else {},
+            model_info=self.model_info.get(model, {}),
+            error=message,
+            status=status or ('error' if message is not None else 'ok'),
+            wall_time=timing.get('wall_time'),
+            time_to_first_byte=timing.get('time_to_first_byte'),
+            time_to_first_token=timing.get('time_to_first_token')
+        )
+        entry.exception = error if isinstance(error, BaseException) else None
+        return entry
+    
     def get_model_recommendations(self, task_type: str) -> Dict[str, str]:
         """Get model recommendations for different task types"""
         
@@ -407,6 +928,124 @@ Requirements:
             'all_recommendations': recommendations
         }
 
+class AsyncClaude4Client:
+    """asyncio front-end for Claude4Client with bounded concurrency
+
+    Every call runs the blocking Bedrock request on a private thread pool, so
+    at most ``concurrency`` requests are in flight at once and a batch takes
+    roughly ``len(prompts) / concurrency`` round trips instead of one each.
+    """
+    
+    def __init__(self,
+                 region: str = 'us-east-1',
+                 concurrency: int = 8,
+                 client: Optional[Claude4Client] = None):
+        self.client = client or Claude4Client(region=region, max_pool_connections=concurrency)
+        self.models = self.client.models
+        self.model_info = self.client.model_info
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix='claude4')
+    
+    async def _run(self, method, *args, **kwargs) -> Dict[str, Any]:
+        # The pool has ``concurrency`` workers, so extra calls queue here
+        loop = asyncio.get_running_loop()
+        
+        # copy_context carries request_context (priority, tenant, deadline) into the worker
+        context = contextvars.copy_context()
+        
+        def submit():
+            return loop.run_in_executor(self._executor, lambda: context.run(method, *args, **kwargs))
+        
+        flight = self.client.single_flight
+        if flight is None:
+            return await submit()
+        
+        # Identical calls wait on the running one here instead of taking a worker each
+        key = request_key(f'async:{self.client.flight_scope}:{method.__name__}',
+                          {'args': list(args), 'kwargs': kwargs})
+        result, shared = await flight.ado(key, submit)
+        if not shared:
+            return result
+        # ClaudeResult.copy keeps ``exception``, which the gateway maps to a status code
+        follower = result.copy()
+        follower['timing'] = {**result.get('timing', {}), 'coalesced': True}
+        return follower
+    
+    async def achat(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """Async twin of Claude4Client.chat (same arguments, same result dict)"""
+        return await self._run(self.client.chat, prompt, **kwargs)
+    
+    def achat_stream(self, prompt: str, **kwargs) -> AsyncChatStream:
+        """Stream a chat response with ``async for``, reading on the client's pool"""
+        return AsyncChatStream(self.client.chat_stream(prompt, **kwargs), executor=self._executor)
+    
+    async def aadvanced_reasoning(self, problem: str, **kwargs) -> Dict[str, Any]:
+        """Async twin of Claude4Client.advanced_reasoning"""
+        return await self._run(self.client.advanced_reasoning, problem, **kwargs)
+    
+    async def aanalyze_image(self, image_path: str, **kwargs) -> Dict[str, Any]:
+        """Async twin of Claude4Client.analyze_image"""
+        return await self._run(self.client.analyze_image, image_path, **kwargs)
+    
+    async def agenerate_code(self, description: str, **kwargs) -> Dict[str, Any]:
+        """Async twin of Claude4Client.generate_code"""
+        return await self._run(self.client.generate_code, description, **kwargs)
+    
+    async def acall(self, method: str, **kwargs) -> Dict[str, Any]:
+        """Async twin of the Claude4Client method named ``method`` (e.g. picked from a route table)"""
+        return await self._run(getattr(self.client, method), **kwargs)
+    
+    async def acompare_models_iter(self, prompt: str, **kwargs):
+        """Async twin of Claude4Client.compare_models_iter: (model, entry) pairs as models answer"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        iterator = context.run(self.client.compare_models_iter, prompt, **kwargs)
+        finished = object()
+        while True:
+            item = await loop.run_in_executor(self._executor, lambda: context.run(next, iterator, finished))
+            if item is finished:
+                break
+            yield item
+    
+    async def batch_chat(self,
+                         prompts: List[str],
+                         concurrency: Optional[int] = None,
+                         **kwargs) -> List[Dict[str, Any]]:
+        """
+        Run many chat prompts concurrently, gather-style
+        
+        Args:
+            prompts: Prompts to send; results come back in the same order
+            concurrency: Max requests in flight for this batch (capped by the
+                         client's own ``concurrency``)
+            **kwargs: Passed to every chat call (model, max_tokens, temperature)
+        """
+        
+        limit = asyncio.Semaphore(min(concurrency or self.concurrency, self.concurrency))
+        
+        async def run_one(prompt: str) -> Dict[str, Any]:
+            async with limit:
+                return await self.achat(prompt, **kwargs)
+        
+        return await asyncio.gather(*(run_one(prompt) for prompt in prompts))
+    
+    def close(self):
+        """
+        Shut down the worker threads without waiting for them
+
+        Queued calls are cancelled; calls already talking to Bedrock finish in
+        the background, so a caller on the event loop is never blocked for up
+        to a read timeout.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
 def test_claude4_setup():
     """Test Claude 4 setup with all models"""
     print("🚀 Testing Claude 4 Enhanced Setup...")
@@ -485,7 +1124,8 @@ if __name__ == "__main__":
     print("\n🔄 Comparing Models:")
     comparison = client.compare_models(
         "Explain the concept of machine learning in one paragraph.",
-        models=['haiku', 'sonnet4', 'opus4']
+        models=['haiku', 'sonnet4', 'opus4'],
+        concurrent=True
     )
     
     for model, result in comparison['comparisons'].items():
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+Importable alias for python-claude4-tools.py
+The script's file name has dashes, so other modules load it through this name:
+``from python_claude4_tools import Claude4Client``
+"""
+
+from pathlib import Path
+
+_source = Path(__file__).with_name('python-claude4-tools.py')
+exec(compile(_source.read_text(encoding='utf-8'), str(_source), 'exec'))
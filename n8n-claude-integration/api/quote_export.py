@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+Streaming quote export (markdown, CSV, XLSX)
+Writes the generateFiles documents (budget-processor.js) and a Template v3.xlsx workbook row by row,
+one quote or a whole batch of them across worker processes, without holding a document in memory
+
+    python quote_export.py quote ../../sample-building-blocks.json --config '{"nombreProyecto": "Demo"}' -o out
+    python quote_export.py batch quotes.jsonl -o exports --workers 8
+"""
+
+import os
+import csv
+import json
+import math
+import time
+import uuid
+import contextlib
+from copy import copy
+from io import BytesIO
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from itertools import groupby
+from typing import Dict, Any, Optional, List, Iterator, Iterable, Tuple, Union
+
+from budget_engine import BudgetEngine, TIERS, CONFIG_DEFAULTS, config_value, block_hours
+
+try:
+    import openpyxl
+    from openpyxl.cell import Cell, WriteOnlyCell
+    from openpyxl.utils.indexed_list import IndexedList
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.cell_range import CellRange
+except ImportError:
+    openpyxl = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Template v3.xlsx')
+
+FORMATS = ('md', 'csv', 'detail', 'xlsx')
+DEFAULT_FORMATS = ('md', 'csv', 'xlsx')
+
+TIER_LABELS = {'basic': 'Básico', 'standard': 'Estándar', 'enterprise': 'Enterprise'}
+TIER_DESCRIPTIONS = {'basic': 'Implementación MVP', 'standard': 'Producción estable', 'enterprise': 'Escalamiento masivo'}
+
+# Template v3.xlsx rows each part of the quote is styled after
+TEMPLATE_SHEET = 'A'
+TEMPLATE_ROWS = {
+    'header': (1, 2, 3, 4),
+    'section': 5,
+    'columns': 6,
+    'item': 7,
+    'subtotal': 16,
+    'spacer': 17,
+    'total': 45,
+    'notes_title': 47,
+    'notes': 48,
+}
+TEMPLATE_COLUMNS = 15  # A:O
+LETTERS = 'ABCDEFGHIJKLMNO'
+
+# Workbook style tables the template's cell styles index into
+STYLE_COLLECTIONS = ('_fonts', '_fills', '_borders', '_alignments', '_protections', '_number_formats')
+NOTES_ROWS = 7         # A48:O54
+
+MONTHS = ('ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO', 'JULIO',
+          'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE')
+
+CSV_HEADER = 'Categoría,Items,Horas Básico,Costo Básico,Horas Estándar,Costo Estándar,Horas Enterprise,Costo Enterprise'
+DETAIL_HEADER = ['Categoría', 'Bloque', 'Descripción',
+                 'Horas Básico', 'Costo Básico', 'Horas Estándar', 'Costo Estándar',
+                 'Horas Enterprise', 'Costo Enterprise']
+
+
+def js_round(value: float) -> int:
+    """Math.round"""
+    return math.floor(value + 0.5)
+
+
+def js_fixed(value: float, digits: int = 1) -> str:
+    """Number.prototype.toFixed (half up on the exact binary value)"""
+    return str(Decimal(value).quantize(Decimal(1).scaleb(-digits), rounding=ROUND_HALF_UP))
+
+
+def js_money(value: float) -> str:
+    """Math.round(value).toLocaleString() in en-US"""
+    return f"{js_round(value):,}"
+
+
+def js_text(value: Any) -> str:
+    """A number interpolated into a template string (35, not 35.0)"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def quote_filename(project_name: str, when: Optional[datetime] = None) -> str:
+    """cotizacion_<project name with _ for whitespace>_<YYYY-MM-DD>, as generateFiles names it"""
+    when = when or datetime.now(timezone.utc)
+    return f"cotizacion_{'_'.join(project_name.split())}_{when.strftime('%Y-%m-%d')}"
+
+
+@lru_cache(maxsize=8)
+def load_catalog(path: str):
+    """
+    Catalog for a path, cached per process
+
+    ``.bbcat`` files are memory-mapped (catalog_store.py), so batch workers
+    quoting from the same catalog share one copy in the page cache.
+    """
+    if path.endswith('.bbcat'):
+        from catalog_store import CatalogStore
+        return CatalogStore(path)
+    with open(path, encoding='utf-8') as catalog_file:
+        return json.load(catalog_file)
+
+
+class QuoteDocument:
+    """
+    One quote, rendered lazily
+
+    Prices the catalog once with BudgetEngine; every document is then a
+    generator. ``iter_markdown`` and ``iter_csv`` yield generateFiles' markdown
+    and CSV chunk by chunk (byte for byte the same text), ``iter_detail`` a
+    CSV row per building block and ``write_xlsx`` fills Template v3.xlsx
+    through openpyxl's write-only mode, one sheet per tier. Block rows are
+    read from the catalog as they are written, so memory stays flat however
+    large the catalog is.
+
+    The catalog is a dict shaped like sample-building-blocks.json, a path
+    (JSON or compiled ``.bbcat``) or an open CatalogStore.
+    """
+
+    def __init__(self, catalog: Union[str, Dict[str, Any], Any], config: Optional[Dict[str, Any]] = None):
+        self.catalog = load_catalog(catalog) if isinstance(catalog, str) else catalog
+        self.config = config or {}
+        engine = BudgetEngine(self.catalog if isinstance(self.catalog, dict) else self.catalog.budget_catalog())
+        self.factors = engine.factors(self.config)
+        self.processed = engine.price(self.config)
+
+    @property
+    def project_name(self) -> str:
+        return self.processed['project_name']
+
+    @property
+    def filename(self) -> str:
+        return quote_filename(self.project_name)
+
+    def iter_blocks(self) -> Iterator[Tuple[str, str, str, Tuple[float, float, float]]]:
+        """(category name, block name, description, raw hours) for every priced block, in catalog order"""
+
+        if isinstance(self.catalog, dict):
+            for category_id, category in (self.catalog.get('categories') or {}).items():
+                category_name = category.get('name') or category_id
+                for block_id, block in (category.get('building_blocks') or {}).items():
+                    hours = block_hours(block)
+                    if hours is not None:
+                        yield (category_name, block.get('name') or block_id, block.get('description') or '',
+                               tuple(float(value) for value in hours))
+            return
+
+        store = self.catalog
+        for row in range(len(store)):
+            if store.has_hours[row]:
+                yield (store.category_names[int(store.block_category[row])], store.block_names[row],
+                       store.block_descriptions[row], tuple(store.hours[row].tolist()))
+
+    def iter_markdown(self) -> Iterator[str]:
+        processed = self.processed
+        config = processed['config']
+        yield f"# Cotización {processed['project_name']}\n\n*Generado el {processed['generated_at']}*\n\n"
+        yield '## Resumen Ejecutivo\n\n| Nivel | Costo Total | Descripción |\n|-------|-------------|-------------|\n'
+        for tier in TIERS:
+            yield f"| {TIER_LABELS[tier]} | ${js_money(processed['totals'][tier])} MXN | {TIER_DESCRIPTIONS[tier]} |\n"
+        yield '\n## Categorías\n\n'
+
+        separator = ''
+        for name, data in processed['categories'].items():
+            hours, costs = data['hours'], data['costs']
+            yield (f"{separator}### {name}\n"
+                   f"- Items: {data['items']}\n"
+                   f"- Horas (Básico/Estándar/Enterprise): {'/'.join(js_fixed(hours[tier]) for tier in TIERS)}\n"
+                   f"- Costos: {'/'.join('$' + js_money(costs[tier]) for tier in TIERS)} MXN")
+            separator = '\n\n'
+
+        value = lambda key: js_text(config.get(key) or CONFIG_DEFAULTS[key])
+        yield (f"\n\n## Configuración\n"
+               f"- Eficiencia IA: {value('eficienciaIA')}%\n"
+               f"- Markup: {value('markup')}%\n"
+               f"- Tarifa IA: ${value('tarifaIA')} MXN/hora\n"
+               f"- Factor PM: {value('factorPM')}%\n"
+               f"- Factor Testing: {value('factorTesting')}%\n"
+               f"- Factor Contingencia: {value('factorContingencia')}%")
+
+    def iter_csv(self) -> Iterator[str]:
+        """generateFiles' CSV: a row per category and the TOTAL row (no trailing newline, fields unquoted)"""
+        yield CSV_HEADER + '\n'
+        separator = ''
+        for name, data in self.processed['categories'].items():
+            cells = [name, str(data['items'])]
+            for tier in TIERS:
+                cells += [js_fixed(data['hours'][tier]), str(js_round(data['costs'][tier]))]
+            yield separator + ','.join(cells)
+            separator = '\n'
+        totals = self.processed['totals']
+        yield '\nTOTAL,-,-,' + ',-,'.join(str(js_round(totals[tier])) for tier in TIERS)
+
+    def iter_detail(self) -> Iterator[List[str]]:
+        """A row per building block: hours after eficienciaIA and cost after markup, per tier"""
+        efficiency, rate = self.factors['efficiency'], self.factors['rate']
+        yield DETAIL_HEADER
+        for category, name, description, hours in self.iter_blocks():
+            row = [category, name, description]
+            for raw in hours:
+                row += [js_fixed(raw * efficiency), str(js_round(raw * efficiency * rate))]
+            yield row
+
+    def write_xlsx(self, path: str, template: Optional[str] = None, tiers: Iterable[str] = TIERS) -> str:
+        if openpyxl is None:
+            raise RuntimeError('XLSX export requires openpyxl (pip install openpyxl)')
+        return QuoteTemplate.load(template or DEFAULT_TEMPLATE).write(self, path, tiers)
+
+    def write(self, directory: str, formats: Iterable[str] = DEFAULT_FORMATS,
+              name: Optional[str] = None, template: Optional[str] = None,
+              tiers: Iterable[str] = TIERS) -> Dict[str, str]:
+        """
+        Stream the requested formats into ``directory``
+
+        Returns {format: path}. Files are named after ``filename`` (or
+        ``name``); the block detail goes to ``<name>_detalle.csv``. ``tiers``
+        picks the workbook sheets; each one costs a pass over the catalog.
+        """
+
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown formats {sorted(unknown)}; expected some of {FORMATS}")
+        unknown = set(tiers) - set(TIERS)
+        if unknown:
+            raise ValueError(f"Unknown tiers {sorted(unknown)}; expected some of {TIERS}")
+
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, name or self.filename)
+        paths = {}
+        for fmt in formats:
+            paths[fmt] = base + {'md': '.md', 'csv': '.csv', 'detail': '_detalle.csv', 'xlsx': '.xlsx'}[fmt]
+            with _replacing(paths[fmt]) as partial:
+                if fmt == 'md':
+                    _write_chunks(partial, self.iter_markdown())
+                elif fmt == 'csv':
+                    _write_chunks(partial, self.iter_csv())
+                elif fmt == 'detail':
+                    with open(partial, 'w', encoding='utf-8', newline='') as detail_file:
+                        csv.writer(detail_file).writerows(self.iter_detail())
+                else:
+                    self.write_xlsx(partial, template, tiers)
+        return paths
+
+
+@contextlib.contextmanager
+def _replacing(path: str) -> Iterator[str]:
+    """A private temporary path that replaces ``path`` once fully written, so readers and
+    concurrent writers never see a half-written file"""
+    partial = f'{path}.{uuid.uuid4().hex[:12]}.tmp'
+    try:
+        yield partial
+        os.replace(partial, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(partial)
+        raise
+
+
+def _write_chunks(path: str, chunks: Iterable[str]) -> str:
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        for chunk in chunks:
+            output.write(chunk)
+    return path
+
+
+class QuoteTemplate:
+    """
+    Row styles, column widths and logo lifted from Template v3.xlsx
+
+    The template has one sample section; its rows (header, section title,
+    column headers, item, subtotal, total, notes) become prototypes that are
+    repeated for every category of a quote. Workbooks are written with
+    openpyxl's write-only mode, which streams rows to disk as they are
+    appended; only the shared-string table (one entry per distinct text)
+    is kept until the file is saved. Amounts are formulas, so the sheet
+    stays editable:
+
+        H (AI cost)   = CANTIDAD * tarifaIA * HRS (hours after eficienciaIA)
+        O (price)     = H * (1 + markup)
+        GRAN TOTAL    = subtotal * (1 + factorPM + factorTesting + factorContingencia)
+
+    The human columns (I:M) show the same hours at ``tarifaBase`` when the
+    config has one, for comparison; they do not enter the price.
+    """
+
+    def __init__(self, path: str):
+        sheet = openpyxl.load_workbook(path)[TEMPLATE_SHEET]
+        self.path = path
+        self.widths = {letter: dimension.width for letter, dimension in sheet.column_dimensions.items()
+                       if dimension.width}
+        self.rows: Dict[str, List[Any]] = {}
+        self.heights: Dict[str, float] = {}
+        self.styles: Dict[str, List[Any]] = {}
+
+        # Styles are registered once, in a scratch workbook, and every export
+        # starts from a copy of its style tables so the same indexes stay valid
+        scratch = openpyxl.Workbook(write_only=True)
+        scratch_sheet = scratch.create_sheet()
+        for role, rows in TEMPLATE_ROWS.items():
+            for offset, row in enumerate(rows if isinstance(rows, tuple) else (rows,)):
+                key = f'{role}{offset}' if isinstance(rows, tuple) else role
+                self.rows[key], self.styles[key] = [], []
+                for column in range(1, TEMPLATE_COLUMNS + 1):
+                    cell = sheet.cell(row, column)
+                    styled = WriteOnlyCell(scratch_sheet)
+                    if cell.has_style:
+                        styled.font, styled.fill, styled.border = copy(cell.font), copy(cell.fill), copy(cell.border)
+                        styled.alignment, styled.protection = copy(cell.alignment), copy(cell.protection)
+                        styled.number_format = cell.number_format
+                    self.rows[key].append(getattr(cell, 'value', None))
+                    self.styles[key].append(styled._style)
+                self.heights[key] = sheet.row_dimensions[row].height or sheet.sheet_format.defaultRowHeight
+        self.collections = {name: list(getattr(scratch, name)) for name in STYLE_COLLECTIONS}
+
+        self.logo = None
+        if sheet._images:
+            image = sheet._images[0]
+            marker = image.anchor._from
+            self.logo = (image._data(), get_column_letter(marker.col + 1) + str(marker.row + 1),
+                         image.width, image.height)
+
+    def _values(self, key: str) -> Dict[str, Any]:
+        """The template's text in a row, by column letter"""
+        return {letter: value for letter, value in zip(LETTERS, self.rows[key]) if value is not None}
+
+    @classmethod
+    @lru_cache(maxsize=4)
+    def load(cls, path: str) -> 'QuoteTemplate':
+        """Parsed once per process"""
+        return cls(os.path.abspath(path))
+
+    def write(self, document: QuoteDocument, path: str, tiers: Iterable[str] = TIERS) -> str:
+        workbook = openpyxl.Workbook(write_only=True)
+        for name, values in self.collections.items():
+            setattr(workbook, name, IndexedList(values))
+        for tier in tiers:
+            # One pass over the catalog per sheet keeps memory flat
+            self._write_sheet(workbook.create_sheet(TIER_LABELS[tier]), document, TIERS.index(tier),
+                              document.iter_blocks())
+        workbook.save(path)
+        return path
+
+    def _write_sheet(self, sheet, document: QuoteDocument, tier: int, blocks: Iterator) -> None:
+        config = document.config
+        # A styled cell per template row and column; rows are serialized as
+        # soon as they are appended, so the same cells are refilled every row
+        prototypes = {key: [Cell(sheet, 1, 1, style_array=style) for style in styles]
+                      for key, styles in self.styles.items()}
+
+        for letter, width in self.widths.items():
+            sheet.column_dimensions[letter].width = width
+        if self.logo and Image is not None:
+            from openpyxl.drawing.image import Image as SheetImage
+            data, anchor, width, height = self.logo
+            logo = SheetImage(BytesIO(data))
+            logo.anchor, logo.width, logo.height = anchor, width, height
+            sheet.add_image(logo)
+
+        row = 0
+
+        # Item rows take the sheet's default height, so only headers and totals
+        # get a row dimension and their number does not grow with the catalog
+        sheet.sheet_format.defaultRowHeight = self.heights['item']
+        sheet.sheet_format.customHeight = True
+
+        def emit(key: str, values: Dict[str, Any]) -> int:
+            nonlocal row
+            row += 1
+            cells = prototypes[key]
+            for letter, cell in zip(LETTERS, cells):
+                cell.value = values.get(letter)
+            # Write-only sheets read the row dimension when the row is appended
+            if self.heights[key] != self.heights['item']:
+                sheet.row_dimensions[row].height = self.heights[key]
+            sheet.append(cells)
+            return row
+
+        def merge(reference: str) -> None:
+            sheet.merged_cells.add(CellRange(reference))
+
+        today = datetime.now()
+        header = [self._values(f'header{offset}') for offset in range(len(TEMPLATE_ROWS['header']))]
+        city = str(header[0].get('O', '')).split('\n')[0]
+        header[0]['O'] = f"{city}\n{today.day} DE {MONTHS[today.month - 1]} {today.year}"
+        header[1]['O'] = config.get('cliente') or header[1].get('O')
+        header[2]['O'] = document.project_name.upper()
+        header[3]['O'] = config.get('ejecutivo') or header[3].get('O')
+        for offset, values in enumerate(header):
+            emit(f'header{offset}', values)
+
+        section, columns = self._values('section'), self._values('columns')
+        efficiency = document.factors['efficiency']
+        rate = config_value(config, 'tarifaIA')
+        markup = config_value(config, 'markup') / 100
+        human_rate = config.get('tarifaBase')
+
+        subtotals = []
+        for category, items in groupby(blocks, key=lambda block: block[0]):
+            title = emit('section', dict(section, B=category))
+            emit('columns', columns)
+            for cell_range in (f'D{title}:H{title}', f'I{title}:M{title}',
+                               f'N{title}:N{title + 1}', f'O{title}:O{title + 1}'):
+                merge(cell_range)
+
+            first = row + 1
+            for number, (_, name, description, hours) in enumerate(items, 1):
+                line = row + 1
+                values = {'A': number, 'B': name, 'C': description,
+                          'D': 1, 'E': rate, 'G': hours[tier] * efficiency, 'H': f'=D{line}*E{line}*G{line}',
+                          'K': hours[tier], 'N': markup, 'O': f'=H{line}*(1+N{line})'}
+                if human_rate:
+                    values.update({'I': 1, 'J': human_rate, 'M': f'=I{line}*J{line}*K{line}'})
+                emit('item', values)
+            subtotals.append(emit('subtotal', {'C': 'SUBTOTAL', 'O': f'=SUM(O{first}:O{row})' if row >= first else 0}))
+            emit('spacer', {})
+
+        project = emit('subtotal', {'C': 'SUBTOTAL PROYECTO',
+                                    'O': '=' + '+'.join(f'O{line}' for line in subtotals) if subtotals else 0})
+        for label, key in (('PM', 'factorPM'), ('TESTING', 'factorTesting'), ('CONTINGENCIA', 'factorContingencia')):
+            percent = config_value(config, key)
+            emit('subtotal', {'C': f'{label} ({js_text(percent)}%)', 'O': f'=O{project}*{js_text(percent)}/100'})
+        emit('total', {'C': 'GRAN TOTAL', 'O': f'=SUM(O{project}:O{row})'})
+        emit('spacer', {})
+
+        emit('notes_title', self._values('notes_title'))
+        notes = emit('notes', self._values('notes'))
+        for _ in range(NOTES_ROWS - 1):
+            emit('notes', {})
+        merge(f'A{notes}:O{row}')
+
+
+def export_quote(job: Dict[str, Any], directory: str, formats: Iterable[str] = DEFAULT_FORMATS,
+                 template: Optional[str] = None, tiers: Iterable[str] = TIERS) -> Dict[str, str]:
+    """
+    Export one batch job
+
+    A job is ``{'catalog': path}`` or ``{'building_blocks': {...}}``, plus
+    ``config`` and optionally a file ``name`` and workbook ``tiers`` that
+    override the batch's (the /budget-quote payload works as is).
+    """
+    catalog = job.get('catalog') or job.get('building_blocks')
+    if catalog is None:
+        raise ValueError("Job needs 'catalog' (path) or 'building_blocks'")
+    return QuoteDocument(catalog, job.get('config')).write(directory, formats, job.get('name'), template,
+                                                          job.get('tiers') or tiers)
+
+
+def iter_jobs(source: Union[str, Iterable[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """Jobs from an iterable or a JSONL file, read a line at a time"""
+    if not isinstance(source, str):
+        yield from source
+        return
+    with open(source, encoding='utf-8') as jobs_file:
+        for line in jobs_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _unique_names(jobs: Iterable[Dict[str, Any]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Number the jobs; one whose file name an earlier job already took gets a ``_<index>`` suffix"""
+    used = set()
+    for index, job in enumerate(jobs):
+        if isinstance(job, dict):
+            project_name = (job.get('config') or {}).get('nombreProyecto') or 'Proyecto Sin Nombre'
+            name = job.get('name') or quote_filename(project_name)
+            if name in used:
+                while name in used:
+                    name = f'{name}_{index}'
+                job = {**job, 'name': name}
+            used.add(name)
+        yield index, job
+
+
+def _export_job(task: Tuple[int, Dict[str, Any], str, Tuple[str, ...], Optional[str], Tuple[str, ...]]
+                ) -> Dict[str, Any]:
+    index, job, directory, formats, template, tiers = task
+    start = time.perf_counter()
+    result = {'index': index, 'name': job.get('name') or (job.get('config') or {}).get('nombreProyecto')}
+    try:
+        result['files'] = export_quote(job, directory, formats, template, tiers)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def export_batch(jobs: Union[str, Iterable[Dict[str, Any]]],
+                 directory: str,
+                 formats: Iterable[str] = DEFAULT_FORMATS,
+                 workers: Optional[int] = None,
+                 template: Optional[str] = None,
+                 tiers: Iterable[str] = TIERS,
+                 chunksize: int = 4) -> Iterator[Dict[str, Any]]:
+    """
+    Export many quotes across worker processes
+
+    Jobs are read lazily and results yielded as they finish (not in input
+    order): ``{'index', 'name', 'files' | 'error', 'seconds'}``. A failing
+    job is reported and does not stop the batch. Each worker parses the
+    template and every catalog path once; ``workers=1`` runs in-process.
+    Files are named like generateFiles' unless a job has a ``name``; a job
+    whose name an earlier job in the batch already used (the same project
+    on the same day, say) gets its index appended, e.g.
+    ``cotizacion_Demo_2024-05-01_7``, and its ``files`` show the final paths.
+    """
+
+    formats, tiers = tuple(formats), tuple(tiers)
+    tasks = ((index, job, directory, formats, template, tiers) for index, job in _unique_names(iter_jobs(jobs)))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(_export_job, tasks)
+        return
+
+    from multiprocessing import Pool
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(_export_job, tasks, chunksize)
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export quotes as markdown, CSV and XLSX (Template v3.xlsx)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    quote = commands.add_parser('quote', help='Export one quote')
+    quote.add_argument('catalog', help='JSON catalog shaped like sample-building-blocks.json, or a compiled .bbcat')
+    quote.add_argument('--config', default='{}', help='Config JSON (nombreProyecto, eficienciaIA, markup, ...)')
+    quote.add_argument('--name', help='File name without extension (default cotizacion_<project>_<date>)')
+
+    batch = commands.add_parser('batch', help='Export every job in a JSONL file')
+    batch.add_argument('jobs', help='One JSON job per line: {"catalog" | "building_blocks", "config", "name"}')
+    batch.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+
+    for command in (quote, batch):
+        command.add_argument('-o', '--output', default='.', help='Output directory')
+        command.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                             help=f"Comma-separated, from {','.join(FORMATS)}")
+        command.add_argument('--template', help='XLSX template (default Template v3.xlsx)')
+        command.add_argument('--tiers', default=','.join(TIERS), help='Workbook sheets, from basic,standard,enterprise')
+
+    args = parser.parse_args(argv)
+    formats = [fmt for fmt in args.formats.split(',') if fmt]
+    tiers = [tier for tier in args.tiers.split(',') if tier]
+    if set(formats) - set(FORMATS) or set(tiers) - set(TIERS):
+        parser.error(f"--formats takes {','.join(FORMATS)} and --tiers {','.join(TIERS)}")
+
+    if args.command == 'quote':
+        paths = QuoteDocument(args.catalog, json.loads(args.config)).write(args.output, formats, args.name,
+                                                                           args.template, tiers)
+        for path in paths.values():
+            print(f"📄 {path}")
+        return 0
+
+    start = time.perf_counter()
+    done = failed = 0
+    for result in export_batch(args.jobs, args.output, formats, args.workers, args.template, tiers):
+        if 'error' in result:
+            failed += 1
+            print(f"❌ #{result['index']} {result['name']}: {result['error']}")
+        else:
+            done += 1
+    elapsed = time.perf_counter() - start
+    print(f"✅ {done} quotes exported to {args.output} in {elapsed:.1f}s" + (f" ({failed} failed)" if failed else ''))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
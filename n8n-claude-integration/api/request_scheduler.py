@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Priority scheduling of Bedrock calls
+Interactive requests go ahead of bulk ones, tenants share each class fairly, every
+call waits for a slot in one concurrency budget, and requests whose deadline has
+passed are dropped before they are sent
+"""
+
+import time
+import heapq
+import itertools
+import threading
+import contextlib
+import contextvars
+from collections import deque, defaultdict
+from typing import Dict, Any, Optional, List
+
+from bedrock_telemetry import percentile
+
+# Served strictly in this order
+PRIORITIES = ('interactive', 'default', 'bulk')
+
+# Priority used when the caller sets none
+METHOD_PRIORITY = {
+    'compare_models': 'bulk',
+}
+
+# Request attributes set by request_context (priority, tenant, deadline)
+current_request: contextvars.ContextVar = contextvars.ContextVar('claude_request', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before it could be sent"""
+
+
+@contextlib.contextmanager
+def request_context(priority: Optional[str] = None,
+                    tenant: Optional[str] = None,
+                    deadline: Optional[float] = None):
+    """
+    Tag the Bedrock calls made inside the block for the scheduler
+
+    Args:
+        priority: 'interactive', 'default' or 'bulk'
+        tenant: Fair-queuing key (workflow, customer, widget...)
+        deadline: Seconds from now after which the calls are not worth sending
+    """
+
+    if priority is not None and priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITIES}")
+
+    outer = current_request.get() or {}
+    attributes = dict(outer)
+    if priority is not None:
+        attributes['priority'] = priority
+    if tenant is not None:
+        attributes['tenant'] = tenant
+    if deadline is not None:
+        # Nested blocks can only tighten the deadline
+        absolute = time.monotonic() + deadline
+        attributes['deadline'] = min(absolute, outer['deadline']) if outer.get('deadline') else absolute
+
+    token = current_request.set(attributes)
+    try:
+        yield attributes
+    finally:
+        current_request.reset(token)
+
+
+class _Ticket:
+    __slots__ = ('priority', 'tenant', 'deadline', 'start_tag', 'seq', 'enqueued', 'state')
+
+    def __init__(self, priority, tenant, deadline, start_tag, seq):
+        self.priority = priority
+        self.tenant = tenant
+        self.deadline = deadline
+        self.start_tag = start_tag
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.state = 'queued'  # queued -> granted | expired
+
+    def __lt__(self, other):
+        return (self.start_tag, self.seq) < (other.start_tag, other.seq)
+
+
+class RequestScheduler:
+    """
+    Shared concurrency budget with priority classes and per-tenant fairness
+
+    At most ``concurrency`` calls run at once across every client using the
+    scheduler. A free slot goes to the highest priority class with waiters;
+    within a class, tenants are served by start-time fair queuing, so a tenant
+    with weight 2 gets twice the slots of a weight-1 tenant while both have
+    requests queued, however many each one enqueues. Waiting requests whose
+    deadline passes are removed from the queue and raise DeadlineExceeded
+    without reaching Bedrock.
+    """
+
+    def __init__(self,
+                 concurrency: int = 8,
+                 tenant_weights: Optional[Dict[str, float]] = None,
+                 window: int = 1000):
+        self.concurrency = concurrency
+        self.tenant_weights = tenant_weights or {}
+        self.in_flight = 0
+        self._queues: Dict[str, List[_Ticket]] = {priority: [] for priority in PRIORITIES}
+        self._depth: Dict[str, int] = defaultdict(int)
+        self._virtual_time: Dict[str, float] = defaultdict(float)
+        self._tenant_finish: Dict[tuple, float] = defaultdict(float)
+        self._waits: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _enqueue(self, priority: str, tenant: str, deadline: Optional[float], cost: float) -> _Ticket:
+        start = max(self._virtual_time[priority], self._tenant_finish[(priority, tenant)])
+        self._tenant_finish[(priority, tenant)] = start + cost / self.tenant_weights.get(tenant, 1.0)
+        ticket = _Ticket(priority, tenant, deadline, start, next(self._seq))
+        heapq.heappush(self._queues[priority], ticket)
+        self._depth[priority] += 1
+        return ticket
+
+    def _dispatch(self):
+        """Grant free slots to the best waiters, expiring overdue ones on the way"""
+
+        now = time.monotonic()
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self.in_flight < self.concurrency:
+                ticket = heapq.heappop(queue)
+                if ticket.state != 'queued':
+                    continue
+                self._depth[priority] -= 1
+                if ticket.deadline is not None and now >= ticket.deadline:
+                    ticket.state = 'expired'
+                    self.counters['expired'] += 1
+                    continue
+                ticket.state = 'granted'
+                self._virtual_time[priority] = ticket.start_tag
+                self.in_flight += 1
+                self.counters['admitted'] += 1
+                self._waits[priority].append(now - ticket.enqueued)
+        self._cond.notify_all()
+
+    def acquire(self,
+                priority: str = 'default',
+                tenant: str = 'default',
+                deadline: Optional[float] = None,
+                cost: float = 1.0):
+        """Block until a slot is granted; ``deadline`` is a time.monotonic() value"""
+
+        with self._cond:
+            if deadline is not None and time.monotonic() >= deadline:
+                self.counters['expired'] += 1
+                raise DeadlineExceeded('Deadline passed before the request was queued')
+
+            ticket = self._enqueue(priority, tenant, deadline, cost)
+            self._dispatch()
+            while ticket.state == 'queued':
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    ticket.state = 'expired'
+                    self._depth[priority] -= 1
+                    self.counters['expired'] += 1
+                    break
+                self._cond.wait(timeout)
+
+            if ticket.state == 'expired':
+                waited = time.monotonic() - ticket.enqueued
+                raise DeadlineExceeded(f'Deadline passed after {waited:.2f}s in the {priority} queue')
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def slot(self, method: Optional[str] = None, cost: float = 1.0):
+        """
+        Context manager holding one slot for the duration of the block
+
+        Priority, tenant and deadline are read from the request_context active
+        when slot() is called, so a slot created up front (as ChatStream does)
+        keeps them even if the block later runs on another thread. Without a
+        request_context, ``method`` picks the default priority (compare_models
+        runs as bulk, everything else as default).
+        """
+
+        attributes = current_request.get() or {}
+        priority = attributes.get('priority') or METHOD_PRIORITY.get(method, 'default')
+        return self._held(priority, attributes.get('tenant', 'default'), attributes.get('deadline'), cost)
+
+    def try_slot(self):
+        """
+        A slot held from now on if one is free and nobody is queued, else None
+
+        Never waits or jumps the queue: for optional extra work such as a
+        hedged duplicate, which is better skipped than delayed. The returned
+        context manager only releases the slot.
+        """
+
+        with self._cond:
+            if self.in_flight >= self.concurrency or any(self._depth.values()):
+                self.counters['refused'] += 1
+                return None
+            self.in_flight += 1
+            self.counters['admitted'] += 1
+        return self._granted()
+
+    @contextlib.contextmanager
+    def _granted(self):
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.contextmanager
+    def _held(self, priority: str, tenant: str, deadline: Optional[float], cost: float):
+        self.acquire(priority, tenant, deadline, cost)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and wait-time percentiles per priority, plus admitted/expired counts"""
+        with self._cond:
+            waits = {priority: sorted(round(v, 4) for v in values) for priority, values in self._waits.items()}
+            return {
+                'concurrency': self.concurrency,
+                'in_flight': self.in_flight,
+                **dict(self.counters),
+                'queue_depth': {priority: self._depth[priority] for priority in PRIORITIES},
+                'wait_seconds': {priority: {'p50': percentile(values, 0.5),
+                                            'p95': percentile(values, 0.95),
+                                            'max': values[-1] if values else None}
+                                 for priority, values in waits.items()},
+            }
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Response cache for the Claude clients
+In-memory LRU tier in front of an optional SQLite tier, keyed on the request body
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+
+from claude_result import loads
+
+
+def request_key(model_id: str, body: Dict[str, Any]) -> str:
+    """Stable hash of the model id and the full request body (messages, max_tokens, temperature...)"""
+    canonical = json.dumps({'model_id': model_id, 'body': body},
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class MemoryTier:
+    """Thread-safe LRU of parsed responses with a TTL"""
+
+    def __init__(self, max_items: int = 256, ttl: Optional[float] = 86400):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """On-disk tier: TTL on read, least-recently-used eviction above ``max_bytes``"""
+
+    def __init__(self, path: str, ttl: Optional[float] = 7 * 86400, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)')
+        # Running total of the stored sizes, so put() needs no full-table SUM. It is
+        # re-read from the table once it crosses max_bytes, which also accounts for
+        # rows other processes sharing the file have written
+        self._bytes = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT value, created, size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value, created, size = row
+            if self.ttl and created + self.ttl < now:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._bytes -= size
+                return None
+            self._db.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+        return loads(value)
+
+    def put(self, key: str, value: Dict[str, Any]):
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(payload), now, now)
+            )
+            self._bytes += len(payload) - (previous[0] if previous else 0)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop expired rows, then the least recently used ones until under max_bytes"""
+        if self.ttl:
+            expired = self._db.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+            self.evictions += max(expired.rowcount, 0)
+
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total > self.max_bytes:
+            for key, size in self._db.execute('SELECT key, size FROM responses ORDER BY last_access').fetchall():
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.evictions += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self._bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Two-tier response cache (memory LRU, then optional SQLite file)
+
+    Sampled requests (temperature > 0) are passed through uncached unless
+    ``cache_sampled=True``, because a cached answer would hide the variation
+    the caller asked for. Any object with ``get``/``put``/``clear`` can be
+    passed in ``tiers`` to plug in another backend.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 memory_items: int = 256,
+                 ttl: Optional[float] = 86400,
+                 max_disk_bytes: int = 256 * 1024 * 1024,
+                 cache_sampled: bool = False,
+                 tiers: Optional[List[Any]] = None):
+        if tiers is None:
+            tiers = [MemoryTier(max_items=memory_items, ttl=ttl)]
+            if path:
+                tiers.append(SQLiteTier(path, ttl=ttl, max_bytes=max_disk_bytes))
+        self.tiers = tiers
+        self.cache_sampled = cache_sampled
+        self.counters = {'hits': 0, 'misses': 0, 'bypassed': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def cacheable(self, body: Dict[str, Any], force: Optional[bool] = None) -> bool:
+        """Whether this request may be served from / stored in the cache"""
+        if force is not None:
+            allowed = force
+        else:
+            allowed = self.cache_sampled or body.get('temperature', 1.0) == 0
+        if not allowed:
+            self._count('bypassed')
+        return allowed
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        for depth, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                # Promote to the faster tiers so the next hit is cheaper
+                for faster in self.tiers[:depth]:
+                    faster.put(key, value)
+                self._count('hits')
+                return value
+        self._count('misses')
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        for tier in self.tiers:
+            tier.put(key, value)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/bypass counters plus evictions and size per tier"""
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            **self.counters,
+            'hit_rate': round(self.counters['hits'] / lookups, 4) if lookups else 0.0,
+            'evictions': sum(getattr(tier, 'evictions', 0) for tier in self.tiers),
+            'tiers': [
+                {
+                    'tier': type(tier).__name__,
+                    'entries': len(tier) if hasattr(tier, '__len__') else None,
+                    'evictions': getattr(tier, 'evictions', 0)
+                }
+                for tier in self.tiers
+            ]
+        }
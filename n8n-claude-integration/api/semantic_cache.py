@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Semantic cache for near-duplicate prompts
+Prompts are embedded locally as hashed word and character n-gram vectors, indexed with
+random-hyperplane LSH, and a stored answer is reused when a new prompt is similar enough.
+Templated methods embed only the caller's own text, with the template parameters in the scope.
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import random
+import hashlib
+import threading
+import contextlib
+import contextvars
+from collections import Counter, defaultdict, deque
+from typing import Dict, Any, Optional, List, Tuple
+
+try:
+    import numpy as np  # Required for SemanticCache (vector math and the index)
+except ImportError:
+    np = None
+
+# Similarity a cached prompt needs for its answer to be reused, per client method.
+# Measured on caller text alone: one-word changes score 0.6-0.91 ("Create a CSV parser" /
+# "... JSON parser" 0.64, "sort users by age" / "... by name" 0.91), while case, spacing and
+# final punctuation changes score 1.0, so nothing below 0.95 is safe.
+DEFAULT_THRESHOLDS = {
+    'chat': 0.95,
+    'conversation': 0.97,
+    'generate_code': 0.95,
+    'advanced_reasoning': 0.95,
+    'creative_writing': 0.97,
+}
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)*')
+
+# What the caller asked when the prompt was built from a template (see caller_input)
+current_input: contextvars.ContextVar = contextvars.ContextVar('semantic_input', default=None)
+
+
+@contextlib.contextmanager
+def caller_input(text: str, **params):
+    """
+    Mark ``text`` as the caller's own input for the calls made inside the block
+
+    Methods that wrap the input in a fixed template (generate_code,
+    advanced_reasoning, creative_writing) use this so the cache compares
+    inputs, not templates that are mostly identical; ``params`` (language,
+    style...) become part of the scope instead. The outermost block wins.
+    """
+
+    if current_input.get() is not None:
+        yield
+        return
+    token = current_input.set((text, params))
+    try:
+        yield
+    finally:
+        current_input.reset(token)
+
+
+def _features(text: str, char_ngrams: Tuple[int, int]) -> Counter:
+    """Word unigrams and bigrams plus character n-grams of the normalized text"""
+
+    # Case, spacing and sentence-final punctuation do not change the question
+    text = ' '.join(text.lower().split()).rstrip('.?!;:, ')
+    words = _WORD.findall(text)
+    grams = Counter(f'w:{word}' for word in words)
+    grams.update(f'b:{a} {b}' for a, b in zip(words, words[1:]))
+    low, high = char_ngrams
+    padded = f' {text} '
+    for n in range(low, high + 1):
+        grams.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def embed(text: str, dim: int = 2048, char_ngrams: Tuple[int, int] = (3, 5)) -> 'np.ndarray':
+    """
+    Unit-length hashed n-gram vector of ``text``
+
+    Feature hashing with crc32 (stable across processes, unlike ``hash``),
+    a sign bit against collisions, and sublinear term frequency (1 + log tf)
+    so repeated boilerplate does not dominate.
+    """
+
+    grams = _features(text, char_ngrams)
+    vector = np.zeros(dim, dtype=np.float32)
+    if not grams:
+        return vector
+    hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+    weights = 1.0 + np.log(np.fromiter(grams.values(), dtype=np.float32, count=len(grams)))
+    signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, (hashes % np.uint64(dim)).astype(np.intp), weights * signs)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def prompt_text(body: Dict[str, Any]) -> Optional[str]:
+    """Text of the last user turn, or None if it carries anything but text"""
+
+    messages = body.get('messages') or []
+    if not messages or messages[-1].get('role') != 'user':
+        return None
+    content = messages[-1].get('content')
+    if isinstance(content, str):
+        return content
+    if any(block.get('type') != 'text' for block in content or []):
+        return None
+    return '\n'.join(block.get('text', '') for block in content)
+
+
+def scope_key(method: str, model_id: str, body: Dict[str, Any], text: str = '',
+              params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Everything but the compared text: only prompts with the same scope can match
+
+    That is the method, model, system prompt, max_tokens, earlier turns,
+    template parameters and the numbers in ``text`` ("Is 91 prime?" and
+    "Is 97 prime?" differ in one token but never share an answer).
+    """
+    scope = {'method': method, 'model_id': model_id, 'system': body.get('system'),
+             'max_tokens': body.get('max_tokens'), 'history': (body.get('messages') or [])[:-1],
+             'params': params or {}, 'numbers': sorted(set(_NUMBER.findall(text)))}
+    canonical = json.dumps(scope, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+
+class SemanticLookup:
+    """Outcome of SemanticCache.lookup, handed back to store/audit after a live call"""
+
+    __slots__ = ('method', 'scope', 'text', 'vector', 'row', 'similarity', 'response', 'audit')
+
+    def __init__(self, method, scope, text, vector):
+        self.method = method
+        self.scope = scope
+        self.text = text
+        self.vector = vector
+        self.row: Optional[int] = None
+        self.similarity = 0.0
+        self.response: Optional[Dict[str, Any]] = None
+        self.audit = False
+
+    @property
+    def hit(self) -> bool:
+        return self.response is not None and not self.audit
+
+
+class SemanticCache:
+    """
+    Opt-in near-duplicate response cache with a persistent LSH index
+
+    ``lookup`` embeds the last user turn (or the caller's input for templated
+    methods, see caller_input) and searches prompts stored under the same
+    scope (method, model, system prompt, max_tokens, earlier turns, template
+    parameters and the numbers in the text). The best match at or above the method's threshold is returned
+    as a hit. Small caches are scanned exactly; past ``exact_below`` entries,
+    ``tables`` x ``bits`` random-hyperplane LSH narrows the candidates first
+    (~99% recall at 0.95 similarity with the defaults).
+
+    A fraction ``audit_rate`` of would-be hits is sent to Bedrock anyway.
+    The fresh answer is returned, and if its embedding is less similar than
+    ``audit_threshold`` to the cached answer, the hit is counted as false.
+    ``stats()`` reports hit rate, false-hit rate and recent audits, which is
+    how a threshold gets tuned.
+
+    Sampled requests are cached by default (``cache_sampled=True``). Reusing
+    a close neighbour's answer already trades exactness for cost, so the
+    temperature of the original call adds little. The index is written to
+    ``path`` (numpy .npz) every ``autosave`` stores and on ``save()``.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 thresholds: Optional[Dict[str, float]] = None,
+                 default_threshold: float = 0.95,
+                 dim: int = 2048,
+                 char_ngrams: Tuple[int, int] = (3, 5),
+                 tables: int = 12,
+                 bits: int = 10,
+                 exact_below: int = 500,
+                 max_entries: int = 50_000,
+                 ttl: Optional[float] = 7 * 86400,
+                 audit_rate: float = 0.05,
+                 audit_threshold: float = 0.8,
+                 cache_sampled: bool = True,
+                 autosave: int = 100,
+                 seed: int = 0):
+        if np is None:
+            raise ImportError('SemanticCache needs numpy (pip install numpy)')
+        self.path = path
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.default_threshold = default_threshold
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.tables = tables
+        self.bits = bits
+        self.exact_below = exact_below
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.audit_rate = audit_rate
+        self.audit_threshold = audit_threshold
+        self.cache_sampled = cache_sampled
+        self.autosave = autosave
+
+        self.counters = {key: 0 for key in ('lookups', 'hits', 'misses', 'bypassed',
+                                            'audited', 'false_hits', 'evictions')}
+        self.by_method: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.audits: deque = deque(maxlen=50)
+        self._random = random.Random(seed)
+        self._planes = np.random.default_rng(seed).standard_normal((dim, tables * bits)).astype(np.float32)
+        self._powers = (1 << np.arange(bits, dtype=np.int64))
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._entries: List[Optional[Dict[str, Any]]] = []
+        self._buckets: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(tables)]
+        self._by_scope: Dict[str, List[int]] = defaultdict(list)
+        self._live = 0
+        self._unsaved = 0
+        self._lock = threading.RLock()
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    # ---- index -----------------------------------------------------------
+
+    def threshold(self, method: str) -> float:
+        return self.thresholds.get(method, self.default_threshold)
+
+    def _codes(self, vectors: 'np.ndarray') -> 'np.ndarray':
+        """LSH bucket code per table for each row: shape (rows, tables)"""
+        signs = (vectors @ self._planes > 0).reshape(len(vectors), self.tables, self.bits)
+        return signs.astype(np.int64) @ self._powers
+
+    def _index_rows(self, rows: range):
+        codes = self._codes(self._vectors[rows.start:rows.stop])
+        for row, row_codes in zip(rows, codes):
+            for table, code in enumerate(row_codes):
+                self._buckets[table][int(code)].append(row)
+
+    def _append(self, vector: 'np.ndarray', entry: Dict[str, Any]) -> int:
+        row = len(self._entries)
+        if row == len(self._vectors):
+            grown = np.zeros((max(64, row * 2), self.dim), dtype=np.float32)
+            grown[:row] = self._vectors[:row]
+            self._vectors = grown
+        self._vectors[row] = vector
+        self._entries.append(entry)
+        self._by_scope[entry['scope']].append(row)
+        self._index_rows(range(row, row + 1))
+        self._live += 1
+        return row
+
+    def _drop(self, row: int):
+        if self._entries[row] is not None:
+            self._entries[row] = None
+            self._live -= 1
+            self.counters['evictions'] += 1
+
+    def _compact(self):
+        """Rebuild the arrays and buckets without dropped rows"""
+        keep = [row for row, entry in enumerate(self._entries) if entry is not None]
+        self._vectors = self._vectors[keep].copy() if keep else np.zeros((0, self.dim), dtype=np.float32)
+        self._entries = [self._entries[row] for row in keep]
+        self._buckets = [defaultdict(list) for _ in range(self.tables)]
+        self._by_scope = defaultdict(list)
+        for row, entry in enumerate(self._entries):
+            self._by_scope[entry['scope']].append(row)
+        if self._entries:
+            self._index_rows(range(len(self._entries)))
+
+    def _candidates(self, scope: str, vector: 'np.ndarray') -> List[int]:
+        rows = self._by_scope.get(scope, [])
+        if len(rows) <= self.exact_below:
+            return rows
+        in_scope = set(rows)
+        found = set()
+        for table, code in enumerate(self._codes(vector[None, :])[0]):
+            found.update(row for row in self._buckets[table].get(int(code), ()) if row in in_scope)
+        return list(found)
+
+    # ---- cache API ---------------------------------------------------------
+
+    def cacheable(self, body: Dict[str, Any], force: Optional[bool] = None) -> bool:
+        if force is not None:
+            return force
+        return self.cache_sampled or body.get('temperature', 1.0) == 0
+
+    def lookup(self,
+               method: str,
+               model_id: str,
+               body: Dict[str, Any],
+               caller: Optional[Tuple[str, Dict[str, Any]]] = None) -> Optional[SemanticLookup]:
+        """
+        Nearest stored prompt for this request; None when the request is not cacheable (images)
+
+        ``caller`` is the (text, template parameters) pair set by caller_input;
+        without it the last user turn is compared.
+        """
+
+        text, params = caller if caller is not None else (prompt_text(body), None)
+        if not text:
+            self.counters['bypassed'] += 1
+            return None
+
+        lookup = SemanticLookup(method, scope_key(method, model_id, body, text, params), text,
+                                embed(text, self.dim, self.char_ngrams))
+        now = time.time()
+        with self._lock:
+            self.counters['lookups'] += 1
+            self.by_method[method]['lookups'] += 1
+            rows = [row for row in self._candidates(lookup.scope, lookup.vector) if self._entries[row] is not None]
+            if rows:
+                similarities = self._vectors[rows] @ lookup.vector
+                best = int(np.argmax(similarities))
+                row, similarity = rows[best], float(similarities[best])
+                entry = self._entries[row]
+                if self.ttl and entry['created'] + self.ttl < now:
+                    self._drop(row)
+                elif similarity >= self.threshold(method):
+                    lookup.row, lookup.similarity, lookup.response = row, similarity, entry['response']
+                    lookup.audit = self._random.random() < self.audit_rate
+
+            if lookup.hit:
+                self.counters['hits'] += 1
+                self.by_method[method]['hits'] += 1
+            else:
+                self.counters['misses'] += 1
+        return lookup
+
+    def store(self, lookup: SemanticLookup, response: Dict[str, Any]):
+        """Remember the live answer for a missed (or audited) lookup"""
+
+        with self._lock:
+            if lookup.audit:
+                self._audit(lookup, response)
+            self._append(lookup.vector, {'scope': lookup.scope, 'method': lookup.method,
+                                         'prompt': lookup.text[:200], 'created': time.time(),
+                                         'response': response})
+            while self._live > self.max_entries:
+                oldest = next(row for row, entry in enumerate(self._entries) if entry is not None)
+                self._drop(oldest)
+            if len(self._entries) > 2 * max(self._live, 1) and len(self._entries) > 64:
+                self._compact()
+            self._unsaved += 1
+            if self.path and self._unsaved >= self.autosave:
+                self.save()
+
+    def _audit(self, lookup: SemanticLookup, fresh: Dict[str, Any]):
+        cached_text = _response_text(lookup.response)
+        fresh_text = _response_text(fresh)
+        agreement = float(embed(cached_text, self.dim, self.char_ngrams) @ embed(fresh_text, self.dim, self.char_ngrams))
+        false_hit = agreement < self.audit_threshold
+        self.counters['audited'] += 1
+        self.by_method[lookup.method]['audited'] += 1
+        if false_hit:
+            self.counters['false_hits'] += 1
+            self.by_method[lookup.method]['false_hits'] += 1
+        self.audits.append({
+            'method': lookup.method,
+            'prompt': lookup.text[:120],
+            'matched_prompt': (self._entries[lookup.row] or {}).get('prompt', '')[:120],
+            'prompt_similarity': round(lookup.similarity, 4),
+            'answer_similarity': round(agreement, 4),
+            'false_hit': false_hit,
+        })
+
+    # ---- persistence -------------------------------------------------------
+
+    def save(self, path: Optional[str] = None):
+        """Write live entries and their vectors to ``path`` (atomic replace)"""
+
+        path = path or self.path
+        if not path:
+            raise ValueError('No path to save the semantic cache to')
+        with self._lock:
+            rows = [row for row, entry in enumerate(self._entries) if entry is not None]
+            entries = json.dumps([self._entries[row] for row in rows], ensure_ascii=False, default=str)
+            tmp_path = path + '.tmp.npz'
+            np.savez(tmp_path, vectors=self._vectors[rows], planes=self._planes,
+                     entries=np.array(entries), dim=np.array(self.dim))
+            os.replace(tmp_path, path)
+            self._unsaved = 0
+
+    def load(self, path: str):
+        """Replace the contents with a file written by ``save``"""
+
+        with np.load(path, allow_pickle=False) as saved:
+            if int(saved['dim']) != self.dim or saved['planes'].shape != self._planes.shape:
+                raise ValueError(f'{path} was built with other dim/tables/bits settings')
+            vectors = saved['vectors'].astype(np.float32)
+            planes = saved['planes']
+            entries = json.loads(str(saved['entries']))
+        with self._lock:
+            self._planes = planes
+            self._vectors = vectors
+            self._entries = entries
+            self._live = len(entries)
+            self._compact()
+
+    def clear(self):
+        with self._lock:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._entries = []
+            self._live = 0
+            self._compact()
+
+    def __len__(self) -> int:
+        return self._live
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate, audit results (false-hit rate) and per-method counts"""
+        with self._lock:
+            lookups = self.counters['lookups']
+            audited = self.counters['audited']
+            return {
+                **self.counters,
+                'entries': self._live,
+                'hit_rate': round(self.counters['hits'] / lookups, 4) if lookups else 0.0,
+                'false_hit_rate': round(self.counters['false_hits'] / audited, 4) if audited else None,
+                'methods': {method: {**counts, 'threshold': self.threshold(method)}
+                            for method, counts in self.by_method.items()},
+                'recent_audits': list(self.audits),
+            }
+
+
+def _response_text(response: Dict[str, Any]) -> str:
+    return ''.join(block.get('text', '') for block in response.get('content', []) if block.get('type') == 'text')
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing of identical in-flight requests
+Concurrent callers asking for the same key share one upstream call and all get its
+result (or its exception). A leader that is cancelled hands the call over to a
+follower instead of failing it. Nothing is stored once the call finishes, so it is safe
+for sampled requests where a response cache is not.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+
+class _LeaderGone(Exception):
+    """Set on a call whose leader was cancelled; its followers join again"""
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key, for threads and asyncio alike
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running (followers) wait for the same outcome instead
+    of making their own call. Threads block on ``do``; coroutines await
+    ``ado`` without holding a thread. Both share one table, so a coroutine can
+    follow a call led by a thread and vice versa.
+
+    Only an ``Exception`` is an outcome of the call. When the leader itself is
+    interrupted (CancelledError from a disconnected client, KeyboardInterrupt)
+    its followers are not failed: the first of them to rejoin leads a new call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_errors = 0
+        self.handovers = 0
+        self.max_waiters = 0
+        self._waiters: Dict[str, int] = {}
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """Future for ``key`` and whether this caller leads it"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                self._waiters[key] += 1
+                self.max_waiters = max(self.max_waiters, self._waiters[key])
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._waiters[key] = 0
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, value: Any = None, error: Optional[BaseException] = None):
+        if error is not None and not isinstance(error, Exception):
+            error = _LeaderGone()
+        with self._lock:
+            self._calls.pop(key, None)
+            if self._waiters.get(key):
+                if isinstance(error, _LeaderGone):
+                    # The followers rejoin, so they are counted again then
+                    self.handovers += 1
+                    self.coalesced -= self._waiters[key]
+                elif error is not None:
+                    self.shared_errors += self._waiters[key]
+            self._waiters.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` once per in-flight ``key``; returns (value, shared)
+
+        ``shared`` is True for followers, which receive the leader's value or
+        have the leader's exception raised in their own thread.
+        """
+
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result(), True
+            except _LeaderGone:
+                continue
+
+        try:
+            value = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, value)
+        return value, False
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Coroutine twin of ``do``: ``fn`` returns an awaitable (e.g. run_in_executor)"""
+
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                # Shielded: a follower that is cancelled must not cancel the shared future
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except _LeaderGone:
+                continue
+
+        try:
+            value = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, value)
+        return value, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        """Upstream calls made, calls that piggybacked on one, and the saving"""
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                'upstream_calls': self.leaders,
+                'coalesced': self.coalesced,
+                'coalesced_ratio': round(self.coalesced / total, 4) if total else 0.0,
+                'shared_errors': self.shared_errors,
+                'handovers': self.handovers,
+                'max_waiters': self.max_waiters,
+                'in_flight': len(self._calls),
+            }
+
+
+_shared_single_flight: Optional[SingleFlight] = None
+_shared_lock = threading.Lock()
+
+
+def shared_single_flight() -> SingleFlight:
+    """Process-wide SingleFlight used by clients that are not given their own"""
+    global _shared_single_flight
+    with _shared_lock:
+        if _shared_single_flight is None:
+            _shared_single_flight = SingleFlight()
+        return _shared_single_flight